@@ -0,0 +1,241 @@
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.orm import Session
+
+from .models import User, Like, Favorite, ReadProgress
+from .schemas import Profile
+from .serialization import dumps, loads
+from .settings import settings
+from .trending import record_event
+
+# The account returned by /api/me is assembled from several places:
+#   likes        -> `likes` rows (see backend/likes.py)
+#   favorites    -> `favorites` rows, ordered by position
+#   readProgress -> `read_progress` rows, one per series
+#   everything else (username, prefs, stats, ...) -> users.data_json
+# Small changes therefore touch single rows instead of rewriting one blob.
+
+NORMALIZED_KEYS = ("likes", "favorites", "readProgress")
+# users.version, returned with the account but never stored in the blob
+VERSION_KEY = "version"
+
+def favorite_key(item: Any) -> str:
+    if isinstance(item, dict):
+        sid = str(item.get("sid") or item.get("seriesId") or item.get("series_id") or item.get("id") or "")
+        slug = str(item.get("slug") or "")
+        if sid:
+            return f"{sid}-{slug}" if slug else sid
+        return dumps(item, sort_keys=True)
+    return str(item)
+
+def decode_profile(user: User) -> Dict[str, Any]:
+    try:
+        data = loads(user.data_json or "{}")
+    except Exception:
+        data = {}
+    return data if isinstance(data, dict) else {}
+
+def encode_profile(account: Dict[str, Any]) -> str:
+    """Validate the profile part of an account against schemas.Profile and encode it.
+
+    Raises pydantic.ValidationError for malformed values (e.g. non-numeric stats).
+    """
+    profile = {k: v for k, v in account.items() if k not in NORMALIZED_KEYS and k != VERSION_KEY}
+    return Profile.model_validate(profile).model_dump_json(exclude_none=True)
+
+def repair_profile(profile: Dict[str, Any]) -> bool:
+    """Drop the stored values schemas.Profile rejects (legacy blobs), in place.
+
+    Whatever is dropped falls back to the schema default. Returns whether
+    anything was removed.
+    """
+    changed = False
+    while True:
+        try:
+            Profile.model_validate(profile)
+            return changed
+        except ValidationError as e:
+            paths = [err["loc"] for err in e.errors()]
+        for path in paths:
+            parent: Any = profile
+            try:
+                for part in path[:-1]:
+                    parent = parent[part]
+                del parent[path[-1]]
+            except (KeyError, IndexError, TypeError):
+                continue
+            changed = True
+            break  # list indexes shift; validate again
+        else:
+            return changed
+
+def load_account(db: Session, user: User) -> Dict[str, Any]:
+    account = decode_profile(user)
+    account[VERSION_KEY] = int(user.version or 0)
+    tg_id = str(user.tg_id)
+    account["favorites"] = [
+        loads(raw) for raw in db.execute(
+            select(Favorite.item_json).where(Favorite.tg_id == tg_id).order_by(Favorite.position)
+        ).scalars()
+    ]
+    account["likes"] = {
+        key: True for key in db.execute(select(Like.series_key).where(Like.tg_id == tg_id)).scalars()
+    }
+    account["readProgress"] = {
+        key: loads(raw) for key, raw in db.execute(
+            select(ReadProgress.series_key, ReadProgress.value_json).where(ReadProgress.tg_id == tg_id)
+        ).all()
+    }
+    return account
+
+def set_favorites(db: Session, tg_id: str, items: Iterable[Any]) -> List[Any]:
+    """Replace the favorites list, touching only rows whose key or position changed."""
+    tg_id = str(tg_id)
+    wanted: Dict[str, tuple[int, Any]] = {}
+    for item in items:
+        key = favorite_key(item)
+        if key not in wanted:
+            wanted[key] = (len(wanted), item)
+    current = {
+        f.series_key: f for f in db.execute(select(Favorite).where(Favorite.tg_id == tg_id)).scalars()
+    }
+    stale = [key for key in current if key not in wanted]
+    if stale:
+        db.execute(delete(Favorite).where(Favorite.tg_id == tg_id, Favorite.series_key.in_(stale)))
+    for key, (pos, item) in wanted.items():
+        raw = dumps(item)
+        row = current.get(key)
+        if row is None:
+            db.add(Favorite(tg_id=tg_id, series_key=key, position=pos, item_json=raw))
+        elif row.position != pos or row.item_json != raw:
+            row.position = pos
+            row.item_json = raw
+    db.flush()
+    return [item for _, item in wanted.values()]
+
+def add_favorite(db: Session, tg_id: str, item: Any, position: Optional[int] = None) -> None:
+    """Insert or update one favorite; appended unless `position` is given (later entries shift down)."""
+    tg_id = str(tg_id)
+    key = favorite_key(item)
+    raw = dumps(item)
+    row = db.execute(select(Favorite).where(Favorite.tg_id == tg_id, Favorite.series_key == key)).scalar_one_or_none()
+    if position is None:
+        if row is not None:
+            row.item_json = raw
+            db.flush()
+            return
+        last = db.execute(select(func.max(Favorite.position)).where(Favorite.tg_id == tg_id)).scalar()
+        position = 0 if last is None else last + 1
+    else:
+        position = max(0, position)
+        if row is not None:
+            db.delete(row)
+            db.flush()
+        db.execute(
+            update(Favorite).where(Favorite.tg_id == tg_id, Favorite.position >= position)
+            .values(position=Favorite.position + 1)
+        )
+    db.add(Favorite(tg_id=tg_id, series_key=key, position=position, item_json=raw))
+    db.flush()
+
+def remove_favorite(db: Session, tg_id: str, key: str) -> bool:
+    res = db.execute(delete(Favorite).where(Favorite.tg_id == str(tg_id), Favorite.series_key == key))
+    return res.rowcount > 0
+
+def bump_version(db: Session, tg_id: str, expected: Optional[int] = None) -> Optional[int]:
+    """users.version += 1, optionally only if it still equals `expected` (compare-and-swap).
+
+    Returns the new version, or None when the expectation failed. Being an
+    UPDATE, it also takes SQLite's write lock for the rest of the transaction.
+    """
+    q = update(User).where(User.tg_id == str(tg_id))
+    if expected is not None:
+        q = q.where(User.version == expected)
+    res = db.execute(q.values(version=User.version + 1).execution_options(synchronize_session=False))
+    if res.rowcount == 0:
+        return None
+    return db.execute(select(User.version).where(User.tg_id == str(tg_id))).scalar_one()
+
+def _progress_chapter(value: Any) -> Any:
+    return value.get("chapterId") if isinstance(value, dict) else value
+
+def upsert_progress(db: Session, tg_id: str, values: Dict[str, Any]) -> None:
+    """Store readProgress entries; moving to another chapter is a "read" activity event."""
+    tg_id = str(tg_id)
+    if not values:
+        return
+    previous = {
+        key: raw for key, raw in db.execute(
+            select(ReadProgress.series_key, ReadProgress.value_json)
+            .where(ReadProgress.tg_id == tg_id, ReadProgress.series_key.in_(list(values)))
+        ).all()
+    }
+    for key, value in values.items():
+        raw = dumps(value)
+        chapter = _progress_chapter(value)
+        if chapter is not None and (key not in previous or _progress_chapter(loads(previous[key])) != chapter):
+            record_event(db, "read", tg_id, key)
+        if key in previous:
+            db.execute(
+                update(ReadProgress)
+                .where(ReadProgress.tg_id == tg_id, ReadProgress.series_key == key)
+                .values(value_json=raw)
+            )
+        else:
+            db.add(ReadProgress(tg_id=tg_id, series_key=key, value_json=raw))
+            db.flush()
+
+class AccountCache:
+    """Decoded (user, account) per tg_id for require_user.
+
+    Write-through: handlers that change an account put() the new version.
+    Entries also expire after `ttl` seconds so that other worker processes'
+    writes become visible. Callers get deep copies and may mutate them freely.
+    """
+
+    def __init__(self, max_entries: int = settings.ACCOUNT_CACHE_SIZE, ttl: float = settings.ACCOUNT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, User, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tg_id: str) -> Optional[Tuple[User, Dict[str, Any]]]:
+        hit = self._entries.get(str(tg_id))
+        if hit is None or hit[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(str(tg_id))
+        self.hits += 1
+        return hit[1], copy.deepcopy(hit[2])
+
+    def put(self, user: User, account: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        key = str(user.tg_id)
+        self._entries[key] = (time.monotonic() + self.ttl, user, copy.deepcopy(account))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def update(self, tg_id: str, fn) -> None:
+        """Apply fn(account) in place to the cached entry, if there is one."""
+        hit = self._entries.get(str(tg_id))
+        if hit is not None:
+            fn(hit[2])
+
+    def invalidate(self, tg_id: str) -> None:
+        self._entries.pop(str(tg_id), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+account_cache = AccountCache()
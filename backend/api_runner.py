@@ -0,0 +1,44 @@
+import argparse
+import os
+import time
+
+from backend.settings import settings
+
+# API-only entry point: migrate once, then start the uvicorn workers. Nothing
+# here imports python-telegram-bot; workers load it only for BOT_MODE=webhook.
+# The bot, if any, runs separately (python -m backend.bot_runner), and so does
+# webhook registration (--set-webhook there).
+
+def migrate() -> None:
+    """Create missing tables and run pending migrations before any worker starts."""
+    from backend.db import init_db, pending_schema
+    t0 = time.perf_counter()
+    pending = pending_schema()
+    if pending:
+        init_db()
+        print(f"schema: applied {', '.join(pending)} in {(time.perf_counter() - t0) * 1000:.0f} ms", flush=True)
+
+def serve(workers: int = settings.API_WORKERS) -> None:
+    import uvicorn
+    # workers read settings from the environment: keep API_WORKERS-dependent
+    # defaults (rate limit backend, comment polling) in line with --workers
+    os.environ["API_WORKERS"] = str(max(1, workers))
+    uvicorn.run("backend.app:app", host=settings.HOST, port=settings.PORT, workers=max(1, workers))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Mangalair API without the bot")
+    ap.add_argument("--workers", type=int, default=settings.API_WORKERS)
+    ap.add_argument("--no-migrate", action="store_true", help="skip the migrate step (already done by the deploy)")
+    ap.add_argument("--startup-report", action="store_true",
+                    help="print import time per module and init time per startup phase, then exit")
+    args = ap.parse_args(argv)
+    if not args.no_migrate:
+        migrate()
+    if args.startup_report:
+        from backend.startup import print_report
+        print_report()
+        return
+    serve(args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,52 @@
-import os, json
+import os, hmac, asyncio
 from typing import Optional, Dict, Any
 
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, PlainTextResponse, RedirectResponse
 
 from .settings import settings
-from .db import SessionLocal, init_db
-from .models import User
-from .auth import parse_and_verify_init_data, extract_init_data_from_request, InitDataError
-
+from .db import run_db, run_db_read, check_schema, shutdown_db
+from .models import User, Comment
+from .likes import set_like, toggle_like, like_count, count_likes
+from .accounts import (load_account, decode_profile, encode_profile, set_favorites, add_favorite, remove_favorite,
+                       upsert_progress, bump_version, account_cache)
+from .auth import parse_and_verify_init_data, extract_init_data_from_request, InitDataError, verified_cache_stats
+from .upstream import close_client, UpstreamError
+from .cache import upstream_cache
+from .writebehind import progress_buffer, DEFERRED_KEYS
+from .catalog import catalog_snapshot
+from .search import search_index, sync_from_snapshot
+from .trending import trending, WINDOWS as TRENDING_WINDOWS
+from .bootstrap import build as build_bootstrap, series_counts
+from .notify import chapter_watcher, dispatcher, dispatch_enabled, watch_enabled
+from .comments import bump_comment_count, chapter_counts, series_chapter_counts, latest_comment_id
+from .live import comment_hub, sse_event
+from . import metrics, startup as startup_timing
+from .serialization import FastJSONResponse, dumpb, loads
+from .httpcache import conditional_response
+from .schemas import (Stats, BatchRequest, LikeOp, FavoriteAddOp, FavoriteRemoveOp, ProgressSetOp, PrefsPatchOp,
+                      StatsPatchOp)
+from pydantic import ValidationError
+
+from sqlalchemy import select, desc, asc, tuple_
 from sqlalchemy.orm import Session
 
-import urllib.request, urllib.error
 from urllib.parse import quote
 
-# --- simple in-memory rate limiter for like endpoint ---
-import time
-_RATE_LIKE_BUCKET = {}
-def _rate_limit_ok(key: str, limit=5, window=10):
-    # allow 'limit' requests per 'window' seconds
-    now = time.time()
-    bucket = _RATE_LIKE_BUCKET.get(key) or []
-    bucket = [t for t in bucket if now - t < window]
-    if len(bucket) >= limit:
-        _RATE_LIKE_BUCKET[key] = bucket
-        return False
-    bucket.append(now)
-    _RATE_LIKE_BUCKET[key] = bucket
-    return True
-# --- end rate limiter ---
+# --- rate limits (token buckets, see backend/ratelimit.py) ---
+from .ratelimit import RateLimiter, default_backend as default_rate_backend
+_like_limiter = RateLimiter(capacity=5, window=10, name="like")
+_comment_limiter = RateLimiter(capacity=5, window=30, name="cmt")
+_RATE_LIMIT_MESSAGE = "Слишком часто. Попробуйте чуть позже."
+# --- end rate limits ---
 
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
 FRONTEND_DIR = os.path.join(ROOT, "frontend")
 
 
-from fastapi.responses import RedirectResponse
-
-
-app = FastAPI(title="Mangalair MiniApp API")
+app = FastAPI(title="Mangalair MiniApp API", default_response_class=FastJSONResponse)
 
 @app.get("/comments,{series_key},{chapter_id}")
 def legacy_comments_alias(series_key: str, chapter_id: str):
@@ -62,13 +69,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
 
 def default_account(user: dict[str, Any]) -> dict[str, Any]:
     return {
@@ -83,13 +85,78 @@ def default_account(user: dict[str, Any]) -> dict[str, Any]:
     }
 
 @app.on_event("startup")
-def startup():
-    init_db()
+async def startup():
+    # the schema itself is created by the migrate step (python -m backend.migrations)
+    with startup_timing.phase("schema_check"):
+        check_schema()
+    default_rate_backend()  # refuses per-process buckets when API_WORKERS > 1
+    with startup_timing.phase("background_tasks"):
+        progress_buffer.start()
+        catalog_snapshot.start()
+        trending.start()
+        if dispatch_enabled(in_api=True):
+            dispatcher.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await comment_hub.stop()
+    await catalog_snapshot.stop()
+    await trending.stop()
+    await chapter_watcher.stop()
+    await dispatcher.stop()
+    await close_client()
+    await progress_buffer.stop()
+    shutdown_db()
+
+# ---------- Telegram webhook (BOT_MODE=webhook) ----------
+# Every API worker processes the updates it receives; the webhook itself is
+# registered once by run.py / bot_runner.py --set-webhook.
+
+@app.on_event("startup")
+async def start_bot_webhook():
+    if settings.BOT_MODE != "webhook":
+        return
+    with startup_timing.phase("bot_webhook"):
+        from .bot import create_application, start_webhook, webhook_secret
+        webhook_secret()  # refuse to serve unauthenticated updates
+        bot_app = create_application(webhook=True)
+        await start_webhook(bot_app)
+    app.state.bot = bot_app
+
+@app.on_event("shutdown")
+async def stop_bot_webhook():
+    bot_app = getattr(app.state, "bot", None)
+    if bot_app is not None:
+        from .bot import stop_webhook
+        app.state.bot = None
+        await stop_webhook(bot_app)
+
+@app.post(settings.WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    bot_app = getattr(app.state, "bot", None)
+    if bot_app is None:
+        raise HTTPException(404, "webhook disabled")
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token") or ""
+    if not settings.WEBHOOK_SECRET or not hmac.compare_digest(token, settings.WEBHOOK_SECRET):
+        raise HTTPException(403, "bad secret token")
+    try:
+        data = await request.json()
+    except Exception:
+        raise HTTPException(400, "invalid update")
+    from .bot import feed_update
+    await feed_update(bot_app, data)
+    return {"ok": True}
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(404, "metrics disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/config")
 def api_config():
     if not settings.PUBLIC_BASE:
@@ -109,176 +176,394 @@ def _ensure_user(db: Session, user_payload: dict) -> User:
             first_name=user_payload.get("first_name"),
             last_name=user_payload.get("last_name"),
             photo_url=user_payload.get("photo_url"),
-            data_json=json.dumps(default_account(user_payload), ensure_ascii=False),
+            data_json=encode_profile(default_account(user_payload)),
         )
         db.add(u)
         db.commit()
         db.refresh(u)
     return u
 
-def require_user(request: Request, db: Session = Depends(get_db)) -> tuple[User, dict]:
+def _load_identity(db: Session, user_payload: dict) -> tuple[User, dict]:
+    user = _ensure_user(db, user_payload)
+    return user, load_account(db, user)
+
+def _read_identity(db: Session, tg_id: str) -> Optional[tuple[User, dict]]:
+    user = _get_user_from_db(db, tg_id)
+    return None if user is None else (user, load_account(db, user))
+
+async def require_user(request: Request) -> tuple[User, dict]:
     raw = extract_init_data_from_request(request)
     if not raw:
+        metrics.AUTH.inc("missing")
         raise HTTPException(401, "initData missing")
     try:
-        pairs = parse_and_verify_init_data(raw, settings.BOT_TOKEN)
+        with metrics.phase("auth"):
+            pairs = parse_and_verify_init_data(raw, settings.BOT_TOKEN)
     except InitDataError as e:
+        metrics.AUTH.inc("expired" if "expired" in str(e) else "invalid")
         raise HTTPException(401, f"initData invalid: {e}")
     user_json = pairs.get("user")
     try:
-        user_payload = json.loads(user_json) if user_json else None
+        user_payload = loads(user_json) if user_json else None
     except Exception:
         user_payload = None
     if not user_payload or "id" not in user_payload:
+        metrics.AUTH.inc("no_user")
         raise HTTPException(401, "user missing in initData")
-
-    user = _ensure_user(db, user_payload)
-    try:
-        account = json.loads(user.data_json or "{}")
-    except Exception:
-        account = default_account(user_payload)
+    metrics.AUTH.inc("ok")
+
+    cached = account_cache.get(str(user_payload["id"]))
+    if cached is not None:
+        return cached
+    found = await run_db_read(_read_identity, str(user_payload["id"]))
+    user, account = found if found is not None else await run_db(_load_identity, user_payload)
+    progress_buffer.overlay(user.tg_id, account)
+    account_cache.put(user, account)
     return user, account
 
 @app.get("/api/me")
-def me(dep=Depends(require_user)):
-    user, account = dep
-    return {"ok": True, "account": account}
-
-@app.post("/api/me/update")
-async def me_update(payload: Dict[str, Any], dep=Depends(require_user), db: Session=Depends(get_db)):
+async def me(dep=Depends(require_user)):
     user, account = dep
+    # plain dicts: skip jsonable_encoder on the hottest route
+    return FastJSONResponse({"ok": True, "account": account})
+
+def _merge_prefs(prefs: dict, value: dict) -> dict:
+    prefs = dict(prefs) if isinstance(prefs, dict) else {}
+    # direction + continuous
+    prefs.update({
+        "direction": value.get("direction", prefs.get("direction", "manhwa")),
+    })
+    # continuous derives from direction unless explicitly provided (for ltr/rtl)
+    if prefs["direction"] == "manhwa":
+        prefs["continuous"] = True
+    else:
+        prefs["continuous"] = bool(value.get("continuous", prefs.get("continuous", False)))
+    # comments: "after" | "always" | "off"
+    cval = (value.get("comments", prefs.get("comments", "after")) or "after")
+    if cval not in ("after","always","off"):
+        cval = "after"
+    prefs["comments"] = cval
+    return prefs
+
+def _apply_me_update(db: Session, user: User, account: dict, payload: Dict[str, Any]) -> dict:
+    user = db.merge(user, load=False)
     updated = {**account}
     for key, value in payload.items():
         if key == "prefs":
-            prefs = updated.get("prefs", {})
-            # direction + continuous
-            prefs.update({
-                "direction": value.get("direction", prefs.get("direction", "manhwa")),
-            })
-            # continuous derives from direction unless explicitly provided (for ltr/rtl)
-            if prefs["direction"] == "manhwa":
-                prefs["continuous"] = True
-            else:
-                prefs["continuous"] = bool(value.get("continuous", prefs.get("continuous", False)))
-            # comments: "after" | "always" | "off"
-            cval = (value.get("comments", prefs.get("comments", "after")) or "after")
-            if cval not in ("after","always","off"):
-                cval = "after"
-            prefs["comments"] = cval
-            updated["prefs"] = prefs
-        elif key in ("favorites", "likes", "readProgress", "stats"):
-            cur = updated.get(key, {} if key != "favorites" else [])
+            updated["prefs"] = _merge_prefs(updated.get("prefs", {}), value)
+        elif key == "likes" and isinstance(value, dict):
+            likes = updated.get("likes") or {}
+            for k, v in value.items():
+                if set_like(db, user.tg_id, k, bool(v)):
+                    catalog_snapshot.mark_likes_changed()
+                if v:
+                    likes[k] = True
+                else:
+                    likes.pop(k, None)
+            updated["likes"] = likes
+        elif key == "favorites" and isinstance(value, list):
+            updated["favorites"] = set_favorites(db, user.tg_id, value)
+        elif key == "readProgress" and isinstance(value, dict):
+            upsert_progress(db, user.tg_id, value)
+            progress = updated.get("readProgress") or {}
+            progress.update(value)
+            updated["readProgress"] = progress
+        elif key in ("favorites", "likes", "readProgress"):
+            # normalized collections only accept their own shape
+            continue
+        elif key == "stats":
+            cur = updated.get(key, {})
             if isinstance(cur, dict) and isinstance(value, dict):
                 cur.update(value)
                 updated[key] = cur
-            elif isinstance(cur, list) and isinstance(value, list):
-                updated[key] = value
             else:
                 updated[key] = value
         else:
             updated[key] = value
-    user.data_json = json.dumps(updated, ensure_ascii=False)
-    db.add(user)
+    user.data_json = encode_profile(updated)
+    updated["version"] = bump_version(db, user.tg_id)
     db.commit()
-    return {"ok": True, "account": updated}
+    return updated
 
-# ---------- Server-side JSON proxy (with URL-encoding for slugs) ----------
+@app.post("/api/me/update")
+async def me_update(payload: Dict[str, Any], dep=Depends(require_user)):
+    user, account = dep
+    # readProgress/stats go to the write-behind buffer, the rest is written now
+    deferred = {}
+    if progress_buffer.enabled:
+        deferred = {k: payload[k] for k in DEFERRED_KEYS if isinstance(payload.get(k), dict)}
+        payload = {k: v for k, v in payload.items() if k not in deferred}
+    try:
+        if "stats" in deferred:
+            deferred["stats"] = Stats.model_validate(deferred["stats"]).model_dump(exclude_unset=True)
+        updated = await run_db(_apply_me_update, user, account, payload) if payload else account
+    except ValidationError as e:
+        raise HTTPException(422, e.errors(include_url=False, include_context=False))
+    if deferred:
+        progress_buffer.add(user.tg_id, deferred)
+        progress_buffer.overlay(user.tg_id, updated)
+    account_cache.put(user, updated)
+    return FastJSONResponse({"ok": True, "account": updated})
+
+class VersionConflict(Exception):
+    def __init__(self, account: dict):
+        self.account = account
+
+def _apply_batch(db: Session, tg_id: str, req: BatchRequest, pending: Dict[str, Any]) -> tuple[User, dict]:
+    # the conditional UPDATE runs first: it is the compare-and-swap and takes
+    # the write lock, so nothing below interleaves with another writer
+    if bump_version(db, tg_id, req.expected_version) is None:
+        db.rollback()
+        found = _read_identity(db, tg_id)
+        raise VersionConflict(found[1] if found is not None else {})
+    # buffered readProgress/stats are older than this batch: write them first
+    if pending.get("readProgress"):
+        upsert_progress(db, tg_id, pending["readProgress"])
+    user = _get_user_from_db(db, tg_id)
+    profile = decode_profile(user)
+    if pending.get("stats"):
+        profile["stats"] = {**(profile.get("stats") or {}), **pending["stats"]}
+    for op in req.ops:
+        if isinstance(op, LikeOp):
+            if set_like(db, tg_id, op.series, op.op == "like"):
+                catalog_snapshot.mark_likes_changed()
+        elif isinstance(op, FavoriteAddOp):
+            add_favorite(db, tg_id, op.item, op.position)
+        elif isinstance(op, FavoriteRemoveOp):
+            remove_favorite(db, tg_id, op.series)
+        elif isinstance(op, ProgressSetOp):
+            upsert_progress(db, tg_id, {op.series: op.value})
+        elif isinstance(op, PrefsPatchOp):
+            profile["prefs"] = _merge_prefs(profile.get("prefs", {}), op.prefs)
+        elif isinstance(op, StatsPatchOp):
+            profile["stats"] = {**(profile.get("stats") or {}), **op.stats.model_dump(exclude_unset=True)}
+    user.data_json = encode_profile(profile)
+    db.commit()
+    return user, load_account(db, user)
 
-def _fetch_json_no_store(url: str):
-    req = urllib.request.Request(url, headers={
-        "Cache-Control": "no-store",
-        "Pragma": "no-cache",
-        "User-Agent": "MangalairMiniApp/1.0"
-    })
+@app.post("/api/me/batch")
+async def me_batch(req: BatchRequest, dep=Depends(require_user)):
+    """Apply `ops` in order in one transaction; all or nothing.
+
+    With `expected_version` the batch only applies if the account is still at
+    that version, otherwise 409 with the current account to rebase on.
+    """
+    user, _ = dep
+    pending = progress_buffer.take(user.tg_id)
     try:
-        with urllib.request.urlopen(req, timeout=20) as resp:
-            data = resp.read()
-            return json.loads(data.decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        raise HTTPException(e.code, f"Upstream HTTP {e.code} for {url}")
-    except urllib.error.URLError as e:
-        raise HTTPException(502, f"Upstream error for {url}: {e.reason}")
+        user, updated = await run_db(_apply_batch, user.tg_id, req, pending)
+    except VersionConflict as e:
+        if pending:
+            progress_buffer.add(user.tg_id, pending)
+        progress_buffer.overlay(user.tg_id, e.account)
+        account_cache.invalidate(user.tg_id)
+        return FastJSONResponse({"ok": False, "error": "version conflict", "version": e.account.get("version"),
+                                 "account": e.account}, status_code=409)
     except Exception as e:
-        raise HTTPException(500, f"Upstream parse error for {url}: {e}")
+        if pending:
+            progress_buffer.add(user.tg_id, pending)
+        if isinstance(e, ValidationError):
+            raise HTTPException(422, e.errors(include_url=False, include_context=False))
+        raise
+    progress_buffer.overlay(user.tg_id, updated)
+    account_cache.put(user, updated)
+    return FastJSONResponse({"ok": True, "version": updated["version"], "account": updated})
+
+# ---------- Server-side JSON proxy (with URL-encoding for slugs) ----------
+
+async def _fetch_json_cached(request: Request, url: str, ttl: float):
+    try:
+        entry = await upstream_cache.get_entry(url, ttl)
+    except UpstreamError as e:
+        raise HTTPException(e.status, e.detail)
+    body, etag = entry.rendered()
+    return conditional_response(request, body, etag=etag, last_modified=entry.last_modified or entry.modified_at,
+                                max_age=int(ttl))
+
+def _series_base(sid: str, slug: str) -> str:
+    sid_q = quote(str(sid), safe="")
+    slug_q = quote(str(slug), safe="")
+    return f"{settings.PUBLIC_BASE}/series/{sid_q}-{slug_q}/"
 
 @app.get("/api/catalog")
-def api_catalog(db: Session = Depends(get_db)):
+async def api_catalog(request: Request):
     if not settings.PUBLIC_BASE:
         raise HTTPException(500, "PUBLIC_BASE is not configured")
-    url = f"{settings.PUBLIC_BASE}/catalog/index.json"
-    data = _fetch_json_no_store(url)
-    # Merge likes counts
+    # prebuilt bytes with likes merged, see backend/catalog.py
     try:
-        counts = _count_likes_patch(db)
-        items = data if isinstance(data, list) else (data.get("items") if isinstance(data, dict) else None)
-        if isinstance(items, list):
-            for it in items:
-                key = None
-                try:
-                    sid = str(it.get("sid") or it.get("seriesId") or it.get("series_id") or it.get("id") or "")
-                    slug = str(it.get("slug") or "")
-                    key = f"{sid}-{slug}" if slug else (sid if sid and sid.startswith("sr_") else None)
-                except Exception:
-                    key = None
-                if key:
-                    it["likes"] = int(counts.get(key, 0))
-    except Exception:
-        pass
-    return data
+        body, etag = await catalog_snapshot.get()
+    except UpstreamError as e:
+        raise HTTPException(e.status, e.detail)
+    return conditional_response(request, body, etag=etag, last_modified=catalog_snapshot.built_at,
+                                max_age=int(settings.CACHE_TTL_CATALOG))
+
+catalog_snapshot.add_listener(sync_from_snapshot)
+if watch_enabled():
+    catalog_snapshot.add_listener(chapter_watcher.on_catalog)
+    upstream_cache.add_listener(chapter_watcher.on_upstream)
+
+_SEARCH_PARAMS = {"q", "sort", "offset", "limit"}
+_SEARCH_SORTS = {"relevance", "likes", "title"}
+
+@app.get("/api/catalog/search")
+async def api_catalog_search(request: Request, q: str = "", sort: str = "", offset: int = 0, limit: int = 20):
+    """One page of the catalog: title search (prefix/trigram, RU/EN transliteration), facet filters
+    as repeated query params (?genres=action&genres=drama&status=ongoing), sort=relevance|likes|title
+    (prefix "-" to reverse), plus facet counts for the whole result set."""
+    if not settings.PUBLIC_BASE:
+        raise HTTPException(500, "PUBLIC_BASE is not configured")
+    if sort and sort.lstrip("-") not in _SEARCH_SORTS:
+        raise HTTPException(400, "sort must be one of: relevance, likes, title")
+    try:
+        await catalog_snapshot.get()  # builds/refreshes the snapshot and, through the listener, the index
+    except UpstreamError as e:
+        raise HTTPException(e.status, e.detail)
+    filters: Dict[str, list] = {}
+    for name, value in request.query_params.multi_items():
+        # anything else (initData, cache busters, fields gone from the catalog) is ignored
+        if name not in _SEARCH_PARAMS and search_index.filterable(name):
+            filters.setdefault(name, []).append(value)
+    offset = max(0, offset)
+    limit = max(1, min(limit, 100))
+    result = search_index.search(q, filters, sort, offset, limit)
+    body = dumpb({"ok": True, "offset": offset, "limit": limit, **result})
+    return conditional_response(request, body, max_age=int(settings.CACHE_TTL_CATALOG))
+
+@app.get("/api/trending")
+async def api_trending(request: Request, window: str = "day", limit: int = 20):
+    """Top series by recent likes and reads (window=day|week|all), from the in-memory rankings."""
+    if trending.interval <= 0:
+        raise HTTPException(404, "trending is disabled")
+    if window not in TRENDING_WINDOWS:
+        raise HTTPException(400, "window must be one of: " + ", ".join(TRENDING_WINDOWS))
+    if trending.updated_at is None:
+        await trending.refresh()
+    limit = max(1, min(limit, trending.top_n))
+    items = []
+    for key, score in trending.top(window, limit):
+        entry = {"series": key, "score": round(score, 3)}
+        found = catalog_snapshot.index.get(key)
+        if found:
+            entry["item"] = found[0]
+        items.append(entry)
+    body = dumpb({"ok": True, "window": window, "updatedAt": int(trending.updated_at), "items": items})
+    return conditional_response(request, body, max_age=int(trending.interval))
 
 @app.get("/api/series/{sid}-{slug}/meta")
-def api_series_meta(sid: str, slug: str):
+async def api_series_meta(sid: str, slug: str, request: Request):
     if not settings.PUBLIC_BASE:
         raise HTTPException(500, "PUBLIC_BASE is not configured")
-    sid_q = quote(str(sid), safe="")
-    slug_q = quote(str(slug), safe="")
-    url = f"{settings.PUBLIC_BASE}/series/{sid_q}-{slug_q}/meta.json"
-    return _fetch_json_no_store(url)
+    url = _series_base(sid, slug) + "meta.json"
+    return await _fetch_json_cached(request, url, settings.CACHE_TTL_META)
 
 @app.get("/api/series/{sid}-{slug}/chapters-index")
-def api_series_chapters_index(sid: str, slug: str):
+async def api_series_chapters_index(sid: str, slug: str, request: Request):
     if not settings.PUBLIC_BASE:
         raise HTTPException(500, "PUBLIC_BASE is not configured")
-    sid_q = quote(str(sid), safe="")
-    slug_q = quote(str(slug), safe="")
-    url = f"{settings.PUBLIC_BASE}/series/{sid_q}-{slug_q}/chapters/index.json"
-    return _fetch_json_no_store(url)
+    url = _series_base(sid, slug) + "chapters/index.json"
+    return await _fetch_json_cached(request, url, settings.CACHE_TTL_CHAPTERS)
+
+async def optional_user(request: Request) -> Optional[tuple[User, dict]]:
+    if not extract_init_data_from_request(request):
+        return None
+    return await require_user(request)
+
+@app.get("/api/series/{sid}-{slug}/bootstrap")
+async def api_series_bootstrap(sid: str, slug: str, request: Request, dep=Depends(optional_user)):
+    """meta + chapters index + like/comment counts, joined with the caller's progress and like
+    (when initData is sent) and next/previous chapter hints; one round trip to open a series."""
+    if not settings.PUBLIC_BASE:
+        raise HTTPException(500, "PUBLIC_BASE is not configured")
+    base = _series_base(sid, slug)
+    key = _series_key(sid, slug)
+    try:
+        meta, chapters, counts = await asyncio.gather(
+            upstream_cache.get_entry(base + "meta.json", settings.CACHE_TTL_META),
+            upstream_cache.get_entry(base + "chapters/index.json", settings.CACHE_TTL_CHAPTERS),
+            run_db_read(series_counts, key),
+        )
+    except UpstreamError as e:
+        raise HTTPException(e.status, e.detail)
+    account = dep[1] if dep is not None else None
+    body = dumpb(build_bootstrap(key, meta.value, chapters.value, counts, account))
+    # personal when authenticated: private, and always revalidated (progress moves)
+    return conditional_response(request, body, max_age=0, public=account is None)
+
+# ---------- Admin hooks (X-Admin-Token, disabled while ADMIN_TOKEN is empty) ----------
+
+def require_admin(request: Request) -> None:
+    token = request.headers.get("X-Admin-Token") or ""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(403, "admin API disabled")
+    if not hmac.compare_digest(token, settings.ADMIN_TOKEN):
+        raise HTTPException(403, "bad admin token")
+
+@app.post("/api/admin/purge/{sid}-{slug}")
+async def api_admin_purge_series(sid: str, slug: str, catalog: bool = True, _=Depends(require_admin)):
+    """Drop cached meta/chapters of a series (and by default the catalog) after publishing."""
+    purged = upstream_cache.purge(_series_base(sid, slug))
+    if catalog:
+        purged += upstream_cache.purge(f"{settings.PUBLIC_BASE}/catalog/")
+    return {"ok": True, "purged": purged}
+
+@app.get("/api/admin/stats")
+async def api_admin_stats(_=Depends(require_admin)):
+    return {
+        "ok": True,
+        "account_cache": account_cache.stats(),
+        "upstream_cache": dict(upstream_cache.stats, size=len(upstream_cache)),
+        "progress_buffer": progress_buffer.stats(),
+        "comment_stream": comment_hub.stats(),
+        "trending": trending.stats(),
+        "notifications": dict(dispatcher.stats(), checks=chapter_watcher.checks, jobs=chapter_watcher.jobs),
+        "startup_ms": startup_timing.stats(),
+    }
 
-# ---------- Global Likes (computed across users' data_json) ----------
+metrics.register_stats("upstream_cache", "Upstream JSON cache counters and size.",
+                       lambda: dict(upstream_cache.stats, size=len(upstream_cache)))
+metrics.register_stats("account_cache", "Decoded account cache counters and size.", account_cache.stats)
+metrics.register_stats("initdata_cache", "Verified initData cache counters and size.", verified_cache_stats)
+metrics.register_stats("progress_buffer", "Write-behind buffer for readProgress/stats.", progress_buffer.stats)
+metrics.register_stats("comment_stream", "Live comment stream subscribers and fan-out.", comment_hub.stats)
+metrics.register_stats("trending", "Activity events folded into the trending rankings.", trending.stats)
+metrics.register_stats("notifications", "New chapter notification delivery.", dispatcher.stats)
+metrics.register_stats("startup_ms", "Time spent in each startup phase of this worker, ms.", startup_timing.stats)
+
+# ---------- Global Likes (maintained counters in like_counts) ----------
 def _series_key(sid: str, slug: str) -> str:
     return f"{sid}-{slug}"
 
-def _count_likes(db: Session) -> dict[str, int]:
-    rows = db.query(User).all()
-    counts: dict[str, int] = {}
-    for u in rows:
-        try:
-            data = json.loads(u.data_json or "{}")
-            likes = data.get("likes") or {}
-            if isinstance(likes, dict):
-                for k, v in likes.items():
-                    if v:
-                        counts[k] = counts.get(k, 0) + 1
-        except Exception:
-            continue
-    return counts
+def _toggle_like_tx(db: Session, tg_id: str, key: str) -> tuple[bool, int, Optional[int]]:
+    liked = toggle_like(db, tg_id, key)
+    version = bump_version(db, tg_id)
+    db.commit()
+    catalog_snapshot.mark_likes_changed()
+    return liked, like_count(db, key), version
+
+def _remember_like(tg_id: str, key: str, liked: bool, version: Optional[int]) -> None:
+    def apply(account: dict) -> None:
+        likes = account.setdefault("likes", {})
+        if liked:
+            likes[key] = True
+        else:
+            likes.pop(key, None)
+        if version is not None:
+            account["version"] = version
+    account_cache.update(tg_id, apply)
 
 @app.get("/api/likes/all")
-def api_likes_all(db: Session = Depends(get_db)):
-    return {"ok": True, "counts": _count_likes(db)}
+async def api_likes_all(request: Request):
+    body = dumpb({"ok": True, "counts": await run_db_read(count_likes)})
+    return conditional_response(request, body, max_age=settings.HTTP_MAX_AGE_LIKES)
 
 @app.post("/api/likes/{sid}-{slug}/toggle")
-def api_like_toggle(sid: str, slug: str, db: Session = Depends(get_db), dep=Depends(require_user)):
+async def api_like_toggle(sid: str, slug: str, dep=Depends(require_user)):
     user, account = dep
+    if not await _like_limiter.allow(user.tg_id):
+        raise HTTPException(429, _RATE_LIMIT_MESSAGE)
     key = _series_key(sid, slug)
-    likes = account.get("likes") or {}
-    liked = not bool(likes.get(key))
-    likes[key] = liked
-    account["likes"] = likes
-    user.data_json = json.dumps(account, ensure_ascii=False)
-    db.add(user)
-    db.commit()
-    total = _count_likes(db).get(key, 0)
+    liked, total, version = await run_db(_toggle_like_tx, user.tg_id, key)
+    _remember_like(user.tg_id, key, liked, version)
     return {"ok": True, "liked": liked, "count": total}
 
 # -------------------------------------------------------------------------
@@ -286,62 +571,9 @@ def api_like_toggle(sid: str, slug: str, db: Session = Depends(get_db), dep=Depe
 
 # --- Patch: add GET support and dash-joined series key for likes toggle ---
 
-from fastapi import Response
-from sqlalchemy.orm import Session
-
-def _series_key_patch(sid: str, slug: str) -> str:
-    return f"{sid}-{slug}"
-
-def _count_likes_patch(db: Session) -> Dict[str, int]:
-    out: Dict[str, int] = {}
-    try:
-        users = db.query(User).all()
-    except Exception:
-        return out
-    for u in users:
-        try:
-            acc = json.loads(u.data_json or "{}")
-            for k, v in (acc.get("likes") or {}).items():
-                if v:
-                    out[k] = out.get(k, 0) + 1
-        except Exception:
-            continue
-    return out
-
-def _get_or_create_user_from_initdata(request: Request, db: Session) -> User:
-    raw = extract_init_data_from_request(request)
-    if not raw:
-        raise HTTPException(status_code=401, detail="initData required")
-    pairs = parse_and_verify_init_data(raw, settings.BOT_TOKEN)
-    user_field = pairs.get("user")
-    if isinstance(user_field, str):
-        try:
-            user_obj = json.loads(user_field)
-        except Exception:
-            user_obj = {}
-    else:
-        user_obj = user_field or {}
-    tg_id = str(user_obj.get("id") or "")
-    if not tg_id:
-        raise HTTPException(status_code=401, detail="invalid initData (no user)")
-    user = db.query(User).filter(User.tg_id == tg_id).first()
-    if not user:
-        user = User(
-            tg_id=tg_id,
-            username=user_obj.get("username"),
-            first_name=user_obj.get("first_name"),
-            last_name=user_obj.get("last_name"),
-            photo_url=user_obj.get("photo_url"),
-            data_json="{}",
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-    return user
-
 @app.get("/api/likes/{series_key}/toggle")
 @app.post("/api/likes/{series_key}/toggle")
-def toggle_like_dash(series_key: str, request: Request):
+async def toggle_like_dash(series_key: str, dep=Depends(require_user)):
     """
     Accepts series_key in form '<sid>-<slug>' (hyphen-joined).
     This endpoint mirrors the POST /api/likes/{sid}-{slug}/toggle behavior
@@ -351,27 +583,13 @@ def toggle_like_dash(series_key: str, request: Request):
     if "-" not in series_key:
         raise HTTPException(status_code=404, detail="invalid series key")
     sid, slug = series_key.split("-", 1)
-
-    db = SessionLocal()
-    try:
-        user = _get_or_create_user_from_initdata(request, db)
-        # load account payload
-        try:
-            account = json.loads(user.data_json or "{}")
-        except Exception:
-            account = {}
-        key = _series_key_patch(sid, slug)
-        likes = account.get("likes") or {}
-        liked = not bool(likes.get(key))
-        likes[key] = liked
-        account["likes"] = likes
-        user.data_json = json.dumps(account, ensure_ascii=False)
-        db.add(user)
-        db.commit()
-        total = _count_likes_patch(db).get(key, 0)
-        return {"ok": True, "liked": liked, "count": total}
-    finally:
-        db.close()
+    user, account = dep
+    if not await _like_limiter.allow(user.tg_id):
+        raise HTTPException(429, _RATE_LIMIT_MESSAGE)
+    key = _series_key(sid, slug)
+    liked, total, version = await run_db(_toggle_like_tx, user.tg_id, key)
+    _remember_like(user.tg_id, key, liked, version)
+    return {"ok": True, "liked": liked, "count": total}
 
 # --- end patch ---
 
@@ -379,34 +597,89 @@ def toggle_like_dash(series_key: str, request: Request):
 
 # --------------------- Comments API ---------------------
 
-from sqlalchemy import select, desc, asc
-from .models import Comment
-
-def _series_key(sid: str, slug: str) -> str:
-    return f"{sid}-{slug}"
-
-@app.get("/api/comments/{sid}-{slug}/{chapter_id}")
-def api_comments_list(sid: str, slug: str, chapter_id: str, db: Session = Depends(get_db)):
-    key = _series_key(sid, slug)
-    rows = db.execute(
-        select(Comment).where(Comment.series_key == key, Comment.chapter_id == str(chapter_id)).order_by(asc(Comment.created_at)).limit(200)
-    ).scalars().all()
-    items = [{
+def _comment_item(c: Comment) -> dict:
+    return {
         "id": c.id,
         "author": c.username or f"user{c.tg_id}",
         "tg_id": c.tg_id,
         "text": c.text,
         "ts": c.created_at.isoformat() if c.created_at else None,
-    } for c in rows]
-    return {"ok": True, "items": items}
+    }
+
+def _list_comments(db: Session, key: str, chapter_id: str, limit: int,
+                   before: Optional[int] = None, after: Optional[int] = None) -> tuple[list[dict], bool]:
+    """One page of a thread in (created_at, id) order using ix_comments_thread.
+
+    `after`/`before` are comment ids; the page continues right after / ends
+    right before that comment. Returns (items, has_more in that direction).
+    """
+    q = select(Comment).where(Comment.series_key == key, Comment.chapter_id == str(chapter_id))
+    cursor = before if before is not None else after
+    if cursor is not None:
+        # compare against the stored created_at of the cursor row (row values
+        # let SQLite seek the index instead of filtering the whole thread)
+        anchor = tuple_(select(Comment.created_at).where(Comment.id == cursor).scalar_subquery(), cursor)
+        if before is not None:
+            q = q.where(tuple_(Comment.created_at, Comment.id) < anchor)
+        else:
+            q = q.where(tuple_(Comment.created_at, Comment.id) > anchor)
+    if before is not None:
+        q = q.order_by(desc(Comment.created_at), desc(Comment.id))
+    else:
+        q = q.order_by(asc(Comment.created_at), asc(Comment.id))
+    rows = db.execute(q.limit(limit + 1)).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+    return [_comment_item(c) for c in rows], has_more
+
+def _add_comment(db: Session, c: Comment) -> dict:
+    db.add(c)
+    bump_comment_count(db, c.series_key, c.chapter_id)
+    db.commit()
+    db.refresh(c)
+    return _comment_item(c)
+
+# declared before the list route, which would otherwise take "counts" as a chapter id
+@app.get("/api/comments/{sid}-{slug}/counts")
+async def api_comments_counts(sid: str, slug: str):
+    counts = await run_db_read(chapter_counts, _series_key(sid, slug))
+    return {"ok": True, "counts": counts, "total": sum(counts.values())}
+
+@app.post("/api/comments/counts")
+async def api_comments_counts_bulk(payload: Dict[str, Any]):
+    keys = payload.get("keys") or []
+    if not isinstance(keys, list) or not all(isinstance(k, str) for k in keys):
+        raise HTTPException(400, "keys must be a list of series keys")
+    if len(keys) > 500:
+        raise HTTPException(413, "too many keys (max 500)")
+    counts = await run_db_read(series_chapter_counts, keys)
+    return {"ok": True, "counts": counts, "totals": {k: sum(v.values()) for k, v in counts.items()}}
+
+@app.get("/api/comments/{sid}-{slug}/{chapter_id}")
+async def api_comments_list(sid: str, slug: str, chapter_id: str, request: Request, limit: Optional[int] = None,
+                            before: Optional[int] = None, after: Optional[int] = None):
+    if before is not None and after is not None:
+        raise HTTPException(400, "use either before or after")
+    limit = max(1, min(limit or settings.COMMENTS_PAGE_SIZE, settings.COMMENTS_PAGE_MAX))
+    items, has_more = await run_db_read(_list_comments, _series_key(sid, slug), chapter_id, limit, before, after)
+    body = dumpb({
+        "ok": True,
+        "items": items,
+        "has_more": has_more,
+        "before": items[0]["id"] if items else before,
+        "after": items[-1]["id"] if items else after,
+    })
+    # new comments arrive over the stream; a refetch is a cheap 304 when nothing changed
+    return conditional_response(request, body, max_age=0)
 
 @app.post("/api/comments/{sid}-{slug}/{chapter_id}/add")
-async def api_comments_add(sid: str, slug: str, chapter_id: str, payload: Dict[str, Any], dep=Depends(require_user), db: Session = Depends(get_db)):
+async def api_comments_add(sid: str, slug: str, chapter_id: str, payload: Dict[str, Any], dep=Depends(require_user)):
     user, account = dep
     # basic rate limit per user
-    rl_key = f"cmt:{user.tg_id}"
-    if not _rate_limit_ok(rl_key, limit=5, window=30):
-        raise HTTPException(429, "Слишком часто. Попробуйте чуть позже.")
+    if not await _comment_limiter.allow(user.tg_id):
+        raise HTTPException(429, _RATE_LIMIT_MESSAGE)
     text = (payload.get("text") or "").strip()
     if not text:
         raise HTTPException(400, "Пустой комментарий")
@@ -419,15 +692,71 @@ async def api_comments_add(sid: str, slug: str, chapter_id: str, payload: Dict[s
         username=account.get("username") or user.username,
         text=text[:1000],
     )
-    db.add(c)
-    db.commit()
-    db.refresh(c)
-    return {"ok": True, "item": {
-        "id": c.id, "author": c.username or f"user{c.tg_id}", "tg_id": c.tg_id, "text": c.text,
-        "ts": c.created_at.isoformat() if c.created_at else None
-    }}
+    item = await run_db(_add_comment, c)
+    comment_hub.publish((c.series_key, c.chapter_id), item)
+    return {"ok": True, "item": item}
+
+# ---------- Live comments (Server-Sent Events, see backend/live.py) ----------
+
+async def _comments_after(topic: tuple[str, str], after: int) -> list[dict]:
+    items, _ = await run_db_read(_list_comments, topic[0], topic[1], settings.COMMENTS_PAGE_SIZE, None, after)
+    return items
+
+comment_hub.fetch_after = _comments_after
+
+@app.get("/api/comments/{sid}-{slug}/{chapter_id}/stream")
+async def api_comments_stream(sid: str, slug: str, chapter_id: str, request: Request, last_id: Optional[int] = None):
+    """New comments of a chapter as they are added.
+
+    Events: `comment` (data = item, id = comment id), `reset` (the client fell
+    behind or missed too much; refetch the list and reconnect). Reconnecting
+    with Last-Event-ID / ?last_id= first replays what was missed.
+    """
+    header_id = request.headers.get("last-event-id")
+    if last_id is None and header_id and header_id.isdigit():
+        last_id = int(header_id)
+    topic = (_series_key(sid, slug), str(chapter_id))
+    # subscribe before reading the database so nothing falls in between
+    sub = comment_hub.subscribe(topic)
+
+    async def events():
+        try:
+            yield b"retry: 3000\n\n"
+            sent = last_id
+            if sent is None:
+                sent = await run_db_read(latest_comment_id, *topic)
+            else:
+                items, has_more = await run_db_read(_list_comments, *topic, settings.COMMENTS_PAGE_MAX, None, sent)
+                if has_more:
+                    yield sse_event("reset", {"last_id": sent})
+                    return
+                for item in items:
+                    sent = item["id"]
+                    yield sse_event("comment", item, sent)
+            comment_hub.seen(topic, sent)
+            # the hub delivers each id once but not necessarily in id order
+            # (another worker's comment may show up after a later local one);
+            # only ids up to the starting point were already covered above
+            start = sent
+            while True:
+                if sub.overflowed:
+                    yield sse_event("reset", {"last_id": sent})
+                    return
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), timeout=settings.COMMENTS_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if item["id"] > start:
+                    sent = max(sent, item["id"])
+                    yield sse_event("comment", item, item["id"])
+        finally:
+            comment_hub.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Mount frontend only if directory exists (Pages serves the real front)
-import os as _os
-if _os.path.isdir(FRONTEND_DIR):
+if os.path.isdir(FRONTEND_DIR):
+    from fastapi.staticfiles import StaticFiles
     app.mount("/", StaticFiles(directory=FRONTEND_DIR, html=True), name="frontend")
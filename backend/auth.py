@@ -1,23 +1,67 @@
 from __future__ import annotations
+import functools
 import hashlib
 import hmac
 import os
 import time
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 from urllib.parse import parse_qsl
 
 INITDATA_TTL = int(os.getenv("INITDATA_TTL", "86400"))
 DEBUG_INITDATA = os.getenv("DEBUG_INITDATA", "0") == "1"
+INITDATA_CACHE_SIZE = int(os.getenv("INITDATA_CACHE_SIZE", "10000"))
 
 class InitDataError(Exception):
     pass
 
+@functools.lru_cache(maxsize=8)
 def _secret_webappdata(bot_token: str) -> bytes:
     return hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
 
+@functools.lru_cache(maxsize=8)
 def _secret_legacy(bot_token: str) -> bytes:
     return hashlib.sha256(bot_token.encode("utf-8")).digest()
 
+# Successfully verified initData, keyed by sha256 of the raw string. The client
+# sends the same header on every call of a session, so repeat requests skip
+# parsing and HMAC. Entries carry the token they were verified with and expire
+# together with auth_date + INITDATA_TTL.
+_verified: "OrderedDict[bytes, Tuple[str, float, Dict[str, str]]]" = OrderedDict()
+_cache_counts = {"hits": 0, "misses": 0}
+
+def _cache_key(raw: str) -> bytes:
+    return hashlib.sha256(raw.encode("utf-8")).digest()
+
+def _cache_get(raw: str, bot_token: str) -> Optional[Dict[str, str]]:
+    key = _cache_key(raw)
+    hit = _verified.get(key)
+    if hit is None:
+        _cache_counts["misses"] += 1
+        return None
+    token, expires_at, pairs = hit
+    if token != bot_token or time.time() > expires_at:
+        _verified.pop(key, None)
+        _cache_counts["misses"] += 1
+        return None
+    _verified.move_to_end(key)
+    _cache_counts["hits"] += 1
+    return dict(pairs)
+
+def _cache_put(raw: str, bot_token: str, pairs: Dict[str, str]) -> None:
+    if INITDATA_CACHE_SIZE <= 0:
+        return
+    expires_at = int(pairs["auth_date"]) + INITDATA_TTL if INITDATA_TTL > 0 else float("inf")
+    _verified[_cache_key(raw)] = (bot_token, expires_at, dict(pairs))
+    while len(_verified) > INITDATA_CACHE_SIZE:
+        _verified.popitem(last=False)
+
+def clear_verified_cache() -> None:
+    _verified.clear()
+
+def verified_cache_stats() -> Dict[str, int]:
+    return dict(_cache_counts, size=len(_verified))
+
 def _build_data_check_string(pairs: Dict[str, str]) -> str:
     # Exclude ONLY 'hash' (include 'signature' if present)
     items = [(k, v) for k, v in pairs.items() if k != "hash"]
@@ -30,6 +74,9 @@ def _hex_hmac_sha256(msg: str, key: bytes) -> str:
 def parse_and_verify_init_data(raw: str, bot_token: str) -> Dict[str, str]:
     if not raw:
         raise InitDataError("empty initData")
+    cached = _cache_get(raw, bot_token)
+    if cached is not None:
+        return cached
     pairs_list = parse_qsl(raw, keep_blank_values=True, strict_parsing=False)
     pairs: Dict[str, str] = {k: v for k, v in pairs_list}
 
@@ -49,16 +96,18 @@ def parse_and_verify_init_data(raw: str, bot_token: str) -> Dict[str, str]:
 
     secret1 = _secret_webappdata(bot_token)
     calc1 = _hex_hmac_sha256(dcs, secret1)
-    if calc1 == hash_value:
+    if hmac.compare_digest(calc1.encode(), hash_value.encode("utf-8")):
         if DEBUG_INITDATA:
             print("[initData] OK via WebAppData. DCS=", dcs)
+        _cache_put(raw, bot_token, pairs)
         return pairs
 
     secret2 = _secret_legacy(bot_token)
     calc2 = _hex_hmac_sha256(dcs, secret2)
-    if calc2 == hash_value:
+    if hmac.compare_digest(calc2.encode(), hash_value.encode("utf-8")):
         if DEBUG_INITDATA:
             print("[initData] OK via legacy SHA256(bot_token). DCS=", dcs)
+        _cache_put(raw, bot_token, pairs)
         return pairs
 
     if DEBUG_INITDATA:
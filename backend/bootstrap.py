@@ -0,0 +1,64 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .comments import chapter_counts
+from .likes import like_count
+
+# GET /api/series/{sid}-{slug}/bootstrap: everything the reader needs to open a
+# series in one response. app.py fetches meta.json and chapters/index.json
+# through the upstream cache concurrently with the counters below; this module
+# joins them with the caller's account and works out where to continue.
+
+def chapter_list(data: Any) -> List[dict]:
+    """Chapters from a chapters/index.json document: a bare list or {"chapters"|"items": [...]}."""
+    if isinstance(data, dict):
+        data = data.get("chapters", data.get("items"))
+    return [c for c in data if isinstance(c, dict)] if isinstance(data, list) else []
+
+def chapter_id(chapter: dict) -> Optional[str]:
+    value = chapter.get("id", chapter.get("chapterId", chapter.get("chapter_id")))
+    return None if value is None else str(value)
+
+def progress_chapter(progress: Any) -> Optional[str]:
+    if isinstance(progress, dict):
+        value = progress.get("chapterId", progress.get("chapter_id"))
+        return None if value is None else str(value)
+    return None
+
+def series_counts(db: Session, key: str) -> Dict[str, Any]:
+    return {"likes": like_count(db, key), "comments": chapter_counts(db, key)}
+
+def prefetch_hints(key: str, chapters: List[dict], progress: Any) -> Dict[str, Any]:
+    """Current chapter (from readProgress, else the first one) and its neighbours in index order."""
+    ids = [chapter_id(c) for c in chapters]
+    current = progress_chapter(progress)
+    i = ids.index(current) if current in ids else (0 if chapters else None)
+    if i is None:
+        return {"current": None, "prev": None, "next": None, "urls": []}
+    prev_ch = chapters[i - 1] if i > 0 else None
+    next_ch = chapters[i + 1] if i + 1 < len(chapters) else None
+    urls = [f"/api/comments/{key}/{ids[i]}"]
+    if next_ch is not None and ids[i + 1] is not None:
+        urls.append(f"/api/comments/{key}/{ids[i + 1]}")
+    return {"current": chapters[i], "prev": prev_ch, "next": next_ch, "urls": urls}
+
+def build(key: str, meta: Any, chapters_doc: Any, counts: Dict[str, Any],
+          account: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    chapters = chapter_list(chapters_doc)
+    progress = None
+    liked = False
+    if account is not None:
+        progress = (account.get("readProgress") or {}).get(key)
+        liked = bool((account.get("likes") or {}).get(key))
+    comments = counts["comments"]
+    return {
+        "ok": True,
+        "series": key,
+        "meta": meta,
+        "chapters": chapters_doc,
+        "progress": progress,
+        "likes": {"count": counts["likes"], "liked": liked},
+        "comments": {"counts": comments, "total": sum(comments.values())},
+        "prefetch": prefetch_hints(key, chapters, progress),
+    }
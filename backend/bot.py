@@ -3,10 +3,21 @@ from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, WebAppI
 from telegram.ext import Application, CommandHandler, ContextTypes
 from .settings import settings
 
-def create_application() -> Application:
+def create_application(webhook: bool = False) -> Application:
     if not settings.BOT_TOKEN:
         raise RuntimeError("BOT_TOKEN is not set")
-    app = Application.builder().token(settings.BOT_TOKEN).build()
+    builder = Application.builder().token(settings.BOT_TOKEN)
+    if settings.TELEGRAM_API_BASE:
+        # e.g. a local fake Bot API server in tests/benchmarks
+        base = settings.TELEGRAM_API_BASE.rstrip("/")
+        builder = builder.base_url(f"{base}/bot").base_file_url(f"{base}/file/bot")
+    if webhook:
+        # updates are pushed to the API process, no getUpdates loop
+        builder = builder.updater(None)
+    else:
+        # run_polling() calls these; run_bot() calls them itself
+        builder = builder.post_init(start_notifications).post_shutdown(stop_notifications)
+    app = builder.build()
 
     async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         kb = InlineKeyboardMarkup([[
@@ -21,14 +32,58 @@ def create_application() -> Application:
     app.add_handler(CommandHandler("start", start))
     return app
 
+# ---------- New chapter notifications ----------
+# The polling bot process is where the notification dispatcher runs by default
+# (API workers only detect new chapters, see backend/notify.py).
+
+async def start_notifications(_app: Application) -> None:
+    from .notify import dispatcher, dispatch_enabled
+    if dispatch_enabled(in_api=False):
+        dispatcher.start()
+
+async def stop_notifications(_app: Application) -> None:
+    from .notify import dispatcher
+    await dispatcher.stop()
+
 async def run_bot(app: Application):
     # Proper polling for PTB v21.x
     await app.initialize()
     await app.start()
     await app.updater.start_polling(allowed_updates=[])
+    await start_notifications(app)
     try:
         await asyncio.Event().wait()
     finally:
+        await stop_notifications(app)
         await app.updater.stop()
         await app.stop()
         await app.shutdown()
+
+# ---------- Webhook mode ----------
+
+def webhook_url() -> str:
+    if not settings.WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL is not set")
+    return settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH
+
+def webhook_secret() -> str:
+    # without it anyone who finds WEBHOOK_PATH could post fake updates
+    if not settings.WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET is not set (required with BOT_MODE=webhook)")
+    return settings.WEBHOOK_SECRET
+
+async def set_webhook(app: Application) -> None:
+    """Register the webhook with Telegram. Done once per deploy, not per worker."""
+    await app.bot.set_webhook(url=webhook_url(), secret_token=webhook_secret(), allowed_updates=[])
+
+async def start_webhook(app: Application) -> None:
+    # start() runs the update_queue consumer; the API route feeds the queue
+    await app.initialize()
+    await app.start()
+
+async def stop_webhook(app: Application) -> None:
+    await app.stop()
+    await app.shutdown()
+
+async def feed_update(app: Application, data: dict) -> None:
+    await app.update_queue.put(Update.de_json(data, app.bot))
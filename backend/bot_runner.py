@@ -1,6 +1,25 @@
-from backend.bot import create_application
+import argparse
+import asyncio
+
+from backend.bot import create_application, set_webhook
 # Note: python-telegram-bot v21 provides a blocking run_polling method
-def main():
+
+async def _webhook(register: bool):
+    app = create_application(webhook=True)
+    async with app:
+        if register:
+            await set_webhook(app)
+        else:
+            await app.bot.delete_webhook()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Mangalair bot: polling process or webhook registration")
+    ap.add_argument("--set-webhook", action="store_true", help="register WEBHOOK_URL + WEBHOOK_PATH and exit")
+    ap.add_argument("--delete-webhook", action="store_true", help="remove the webhook and exit")
+    args = ap.parse_args(argv)
+    if args.set_webhook or args.delete_webhook:
+        asyncio.run(_webhook(register=args.set_webhook))
+        return
     app = create_application()
     # Blocking call; handles signals and idles
     app.run_polling()
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from .settings import settings
+from .upstream import UpstreamClient, UpstreamError, get_client
+from .httpcache import http_etag
+from .serialization import dumpb, loads
+
+log = logging.getLogger(__name__)
+
+# In-memory cache of upstream JSON documents keyed by URL.
+#   - fresh entries (younger than ttl) are served without touching upstream;
+#   - expired entries within the stale window are served immediately while a
+#     background revalidation (If-None-Match / If-Modified-Since) runs;
+#   - only one fetch per URL is in flight at a time, concurrent callers await it;
+#   - if upstream fails and we still hold a copy, the stale copy is served.
+
+class _Entry:
+    __slots__ = ("value", "etag", "last_modified", "fetched_at", "expires_at", "modified_at", "_rendered")
+
+    def __init__(self, value: Any, etag: Optional[str], last_modified: Optional[str], ttl: float):
+        now = time.monotonic()
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = now
+        self.expires_at = now + ttl
+        self.modified_at = time.time()  # wall clock, for Last-Modified when upstream sends none
+        self._rendered: Optional[Tuple[bytes, str]] = None
+
+    def rendered(self) -> Tuple[bytes, str]:
+        """The value as JSON bytes and their ETag, serialized once per entry."""
+        if self._rendered is None:
+            body = dumpb(self.value)
+            self._rendered = (body, http_etag(body))
+        return self._rendered
+
+class UpstreamCache:
+    def __init__(self, max_entries: int = settings.CACHE_MAX_ENTRIES, stale_ttl: float = settings.CACHE_STALE_TTL,
+                 client: Optional[UpstreamClient] = None):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self._client = client
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._purged: Set[asyncio.Task] = set()  # fetches in flight during purge(); their result is not stored
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "errors": 0}
+        self._listeners: list = []
+
+    def add_listener(self, fn) -> None:
+        """Call fn(url, entry) whenever upstream returns a new document (not on 304s)."""
+        self._listeners.append(fn)
+
+    @property
+    def client(self) -> UpstreamClient:
+        return self._client or get_client()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, url: str, entry: _Entry) -> None:
+        self._entries[url] = entry
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _fetch(self, url: str, ttl: float) -> _Entry:
+        entry = self._entries.get(url)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        try:
+            resp = await self.client.get(url, headers=headers)
+            if resp.status_code == 304 and entry is not None:
+                self.stats["revalidated"] += 1
+                entry.expires_at = time.monotonic() + ttl
+                return entry
+            if resp.status_code >= 400:
+                raise UpstreamError(resp.status_code, f"Upstream HTTP {resp.status_code} for {url}")
+            try:
+                value = loads(resp.content)
+            except Exception as e:
+                raise UpstreamError(500, f"Upstream parse error for {url}: {e}")
+        except UpstreamError:
+            self.stats["errors"] += 1
+            if entry is not None and url in self._entries:
+                return entry  # stale-on-error; the next request retries
+            raise
+        fresh = _Entry(value, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), ttl)
+        if asyncio.current_task() not in self._purged:
+            self._store(url, fresh)
+        for fn in self._listeners:
+            try:
+                fn(url, fresh)
+            except Exception:
+                log.exception("upstream cache listener %r failed", fn)
+        return fresh
+
+    def _done(self, url: str, task: asyncio.Task) -> None:
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        self._purged.discard(task)
+        # background revalidations may have nobody awaiting them; errors are
+        # already counted, so mark the exception as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def _refresh(self, url: str, ttl: float) -> asyncio.Task:
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(url, ttl))
+            self._inflight[url] = task
+            task.add_done_callback(lambda t, url=url: self._done(url, t))
+        return task
+
+    async def get_entry(self, url: str, ttl: float) -> _Entry:
+        entry = self._entries.get(url)
+        now = time.monotonic()
+        if entry is not None:
+            self._entries.move_to_end(url)
+            if now < entry.expires_at:
+                self.stats["hits"] += 1
+                return entry
+            if now < entry.expires_at + self.stale_ttl:
+                self.stats["stale"] += 1
+                self._refresh(url, ttl)
+                return entry
+        self.stats["misses"] += 1
+        return await asyncio.shield(self._refresh(url, ttl))
+
+    async def get_json(self, url: str, ttl: float) -> Any:
+        return (await self.get_entry(url, ttl)).value
+
+    def purge(self, prefix: str) -> int:
+        # only fetches under the prefix are discarded, the rest still get stored
+        for k in [k for k in self._inflight if k.startswith(prefix)]:
+            self._purged.add(self._inflight.pop(k))
+        keys = [k for k in self._entries if k.startswith(prefix)]
+        for k in keys:
+            del self._entries[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._purged.update(self._inflight.values())
+        self._inflight.clear()
+        self._entries.clear()
+
+upstream_cache = UpstreamCache()
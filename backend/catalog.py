@@ -0,0 +1,131 @@
+import asyncio
+import copy
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache import upstream_cache
+from .db import run_db_read
+from .likes import count_likes
+from .serialization import dumpb
+from .settings import settings
+
+log = logging.getLogger(__name__)
+
+# /api/catalog is served from a prebuilt snapshot: the upstream catalog with
+# like counts merged in, serialized once to bytes with a strong ETag. It is
+# rebuilt (in the background, the previous body keeps being served) only when
+# the cached upstream document changes or like counts change. Local toggles
+# mark it dirty right away; a periodic refresh picks up other workers' likes.
+
+def catalog_url() -> str:
+    return f"{settings.PUBLIC_BASE}/catalog/index.json"
+
+def catalog_items(data: Any) -> Optional[list]:
+    items = data if isinstance(data, list) else (data.get("items") if isinstance(data, dict) else None)
+    return items if isinstance(items, list) else None
+
+def item_series_key(it: Any) -> Optional[str]:
+    try:
+        sid = str(it.get("sid") or it.get("seriesId") or it.get("series_id") or it.get("id") or "")
+        slug = str(it.get("slug") or "")
+        return f"{sid}-{slug}" if slug else (sid if sid and sid.startswith("sr_") else None)
+    except Exception:
+        return None
+
+class CatalogSnapshot:
+    def __init__(self, refresh_interval: float = settings.CATALOG_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.built_at: Optional[float] = None
+        self.data: Any = None
+        self.index: Dict[str, List[dict]] = {}  # series key -> catalog items
+        self.counts: Dict[str, int] = {}
+        self._source = None  # upstream cache entry the snapshot was built from
+        self._dirty = True
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._listeners: List = []
+
+    def add_listener(self, fn) -> None:
+        """Call fn(snapshot, source_changed) after every rebuild (e.g. to update the search index)."""
+        self._listeners.append(fn)
+
+    def mark_likes_changed(self) -> None:
+        self._dirty = True
+
+    async def _rebuild(self, entry) -> None:
+        self._dirty = False
+        counts = await run_db_read(count_likes)
+        if entry is self._source and counts == self.counts and self.body is not None:
+            return
+        if entry is not self._source:
+            data = copy.deepcopy(entry.value)
+            index: Dict[str, List[dict]] = {}
+            for it in catalog_items(data) or []:
+                key = item_series_key(it)
+                if key:
+                    index.setdefault(key, []).append(it)
+        else:
+            data, index = self.data, self.index
+        for key, items in index.items():
+            n = int(counts.get(key, 0))
+            for it in items:
+                it["likes"] = n
+        body = dumpb(data)
+        source_changed = entry is not self._source
+        self.data, self.index, self.counts, self._source = data, index, counts, entry
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.built_at = time.time()
+        for fn in self._listeners:
+            try:
+                fn(self, source_changed)
+            except Exception:
+                log.exception("catalog listener %r failed", fn)
+
+    def _schedule(self, entry) -> asyncio.Task:
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self._rebuild(entry))
+            self._rebuild_task.add_done_callback(
+                lambda t: t.cancelled() or t.exception() is None or log.error("catalog rebuild failed: %r", t.exception())
+            )
+        return self._rebuild_task
+
+    async def get(self) -> Tuple[bytes, str]:
+        entry = await upstream_cache.get_entry(catalog_url(), settings.CACHE_TTL_CATALOG)
+        stale = entry is not self._source or self._dirty
+        if self.body is None:
+            await asyncio.shield(self._schedule(entry))
+        elif stale:
+            self._schedule(entry)
+        return self.body, self.etag
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            if self.body is None:
+                continue
+            try:
+                self.mark_likes_changed()
+                await self.get()
+            except Exception:
+                log.exception("catalog refresh failed")
+
+    def start(self) -> None:
+        if self.refresh_interval > 0 and settings.PUBLIC_BASE and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        for task in (self._refresh_task, self._rebuild_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._refresh_task = self._rebuild_task = None
+
+catalog_snapshot = CatalogSnapshot()
@@ -0,0 +1,46 @@
+from typing import Dict, Iterable
+
+from sqlalchemy import select, update, desc
+from sqlalchemy.orm import Session
+
+from .models import Comment, CommentCount
+
+# Per-chapter comment totals, bumped in the same transaction as the insert so
+# list screens can show counts for a whole series with one indexed query.
+
+def bump_comment_count(db: Session, key: str, chapter_id: str, delta: int = 1) -> None:
+    res = db.execute(
+        update(CommentCount)
+        .where(CommentCount.series_key == key, CommentCount.chapter_id == str(chapter_id))
+        .values(count=CommentCount.count + delta)
+    )
+    if res.rowcount == 0:
+        db.add(CommentCount(series_key=key, chapter_id=str(chapter_id), count=max(delta, 0)))
+        db.flush()
+
+def chapter_counts(db: Session, key: str) -> Dict[str, int]:
+    rows = db.execute(
+        select(CommentCount.chapter_id, CommentCount.count).where(CommentCount.series_key == key)
+    ).all()
+    return {ch: int(n) for ch, n in rows}
+
+def series_chapter_counts(db: Session, keys: Iterable[str]) -> Dict[str, Dict[str, int]]:
+    keys = list(dict.fromkeys(keys))
+    out: Dict[str, Dict[str, int]] = {k: {} for k in keys}
+    if not keys:
+        return out
+    rows = db.execute(
+        select(CommentCount.series_key, CommentCount.chapter_id, CommentCount.count)
+        .where(CommentCount.series_key.in_(keys))
+    ).all()
+    for key, ch, n in rows:
+        out[key][ch] = int(n)
+    return out
+
+def latest_comment_id(db: Session, key: str, chapter_id: str) -> int:
+    """Id of the newest comment of a thread (0 if empty); walks ix_comments_thread backwards."""
+    cid = db.execute(
+        select(Comment.id).where(Comment.series_key == key, Comment.chapter_id == str(chapter_id))
+        .order_by(desc(Comment.created_at), desc(Comment.id)).limit(1)
+    ).scalar_one_or_none()
+    return int(cid or 0)
@@ -1,13 +1,183 @@
-from sqlalchemy import create_engine, text
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event, inspect, select
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from .metrics import DB_CALL_SECONDS, add_phase, instrument_engine
 from .settings import settings
 
-engine = create_engine(settings.DATABASE_URL, echo=False, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+# ---------- SQLite tuning ----------
+# Applied on every new DBAPI connection, so operators no longer have to run
+# the PRAGMAs by hand. SQLITE_PRAGMAS ("name=value,...") overrides single values.
+
+SQLITE_PROFILES = {
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,      # KiB, i.e. 64 MB per connection
+        "mmap_size": 268435456,    # 256 MB
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 10000,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+    "off": {},
+}
+
+def sqlite_pragmas() -> dict:
+    pragmas = dict(SQLITE_PROFILES.get(settings.SQLITE_PROFILE, SQLITE_PROFILES["wal"]))
+    for item in filter(None, (p.strip() for p in settings.SQLITE_PRAGMAS.split(","))):
+        name, _, value = item.partition("=")
+        pragmas[name.strip()] = value.strip()
+    return pragmas
+
+def _install_pragmas(eng, read_only: bool = False) -> None:
+    pragmas = sqlite_pragmas()
+    if read_only:
+        pragmas.pop("journal_mode", None)  # persistent and needs a write; the writer sets it
+        pragmas["query_only"] = "ON"
+
+    @event.listens_for(eng, "connect")
+    def _on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cur.execute(f"PRAGMA {name}={value}")
+        finally:
+            cur.close()
+
+def _is_file_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url and url.rstrip("/") not in ("sqlite:", "sqlite+pysqlite:")
+
+_SQLITE_FILE = _is_file_sqlite(settings.DATABASE_URL)
+
+if _SQLITE_FILE:
+    # One writer connection per writer thread and a separate reader pool: in WAL
+    # mode readers never wait on the single SQLite writer.
+    engine = create_engine(settings.DATABASE_URL, echo=False, future=True,
+                           pool_size=settings.DB_WRITERS, max_overflow=2)
+    read_engine = create_engine(settings.DATABASE_URL, echo=False, future=True,
+                                pool_size=settings.DB_WORKERS, max_overflow=2)
+    _install_pragmas(engine)
+    _install_pragmas(read_engine, read_only=True)
+else:
+    engine = create_engine(settings.DATABASE_URL, echo=False, future=True)
+    read_engine = engine
+if settings.METRICS_ENABLED:
+    instrument_engine(engine, "writer")
+    if read_engine is not engine:
+        instrument_engine(read_engine, "reader")
+# expire_on_commit=False: objects returned from run_db() stay readable after
+# their session is closed in the executor thread.
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
 Base = declarative_base()
 
-def init_db():
-    # tables created in models import
+# All database work from async handlers goes through these executors, so a slow
+# commit/fsync never blocks the event loop (which also drives the bot). Writes
+# are serialized on DB_WRITERS threads (SQLite has a single writer anyway);
+# read-only work gets its own DB_WORKERS threads and never queues behind them.
+_db_executor: ThreadPoolExecutor | None = None
+_read_executor: ThreadPoolExecutor | None = None
+
+def _executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        workers = settings.DB_WRITERS if _SQLITE_FILE else settings.DB_WORKERS
+        _db_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+    return _db_executor
+
+def _reader() -> ThreadPoolExecutor:
+    global _read_executor
+    if not _SQLITE_FILE:
+        return _executor()
+    if _read_executor is None:
+        _read_executor = ThreadPoolExecutor(max_workers=settings.DB_WORKERS, thread_name_prefix="db-read")
+    return _read_executor
+
+def _call_with_session(factory, fn, args, kwargs):
+    db = factory()
+    try:
+        return fn(db, *args, **kwargs)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def _run(pool: str, executor: ThreadPoolExecutor, factory, fn, args, kwargs):
+    # the copied context carries the request's phase timings into the thread
+    ctx = contextvars.copy_context()
+    t0 = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, ctx.run, _call_with_session, factory, fn, args, kwargs)
+    finally:
+        elapsed = time.perf_counter() - t0
+        DB_CALL_SECONDS.observe(elapsed, pool)
+        add_phase("db", elapsed)
+
+async def run_db(fn, *args, **kwargs):
+    """Run fn(session, *args, **kwargs) in the DB executor with a fresh session."""
+    return await _run("writer", _executor(), SessionLocal, fn, args, kwargs)
+
+async def run_db_read(fn, *args, **kwargs):
+    """Like run_db() for read-only work: reader pool, query_only connections."""
+    return await _run("reader", _reader(), ReadSessionLocal, fn, args, kwargs)
+
+def shutdown_db():
+    global _db_executor, _read_executor
+    for ex in (_read_executor, _db_executor):
+        if ex is not None:
+            ex.shutdown(wait=True)
+    _db_executor = _read_executor = None
+
+# ---------- schema ----------
+# Tables and migrations are applied by one explicit step before workers start
+# (python -m backend.migrations; run.py and backend.api_runner do it for you).
+# A worker's startup only checks that the step has happened: one read of
+# sqlite_master and one of schema_migrations instead of create_all per boot.
+
+def init_db() -> list[str]:
+    """Create missing tables and run pending migrations. Returns the migrations applied."""
     from . import models  # noqa
+    from .migrations import run_migrations
     Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        return run_migrations(db)
+    finally:
+        db.close()
+
+def pending_schema() -> list[str]:
+    """Tables missing from the database and migrations not applied yet."""
+    from .models import SchemaMigration
+    from .migrations import MIGRATIONS
+    existing = set(inspect(engine).get_table_names())
+    pending = [f"table {name}" for name in Base.metadata.tables if name not in existing]
+    done = set()
+    if SchemaMigration.__tablename__ in existing:
+        with engine.connect() as conn:
+            done = set(conn.execute(select(SchemaMigration.name)).scalars())
+    return pending + [name for name, _ in MIGRATIONS if name not in done]
+
+def check_schema() -> None:
+    """Startup check: migrate in place when DB_AUTO_MIGRATE=1, otherwise refuse to serve an old schema."""
+    pending = pending_schema()
+    if not pending:
+        return
+    if settings.DB_AUTO_MIGRATE:
+        init_db()
+        return
+    listed = ", ".join(pending[:5]) + (f" and {len(pending) - 5} more" if len(pending) > 5 else "")
+    raise RuntimeError(f"database schema is not up to date ({listed}); "
+                       "run `python -m backend.migrations` first or set DB_AUTO_MIGRATE=1")
@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple, Union
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .settings import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Validators, Cache-Control and compression for the public read endpoints.
+# Routes render their JSON to bytes and hand it to conditional_response():
+#   - ETag (strong, hash of the body) and optional Last-Modified; a matching
+#     If-None-Match / If-Modified-Since gets an empty 304;
+#   - br (when the brotli package is installed) or gzip by Accept-Encoding for
+#     bodies of at least COMPRESS_MIN_SIZE bytes, with "-br"/"-gzip" appended to
+#     the ETag as the representation differs; compressed bodies are kept in a
+#     small LRU by ETag, so the catalog is compressed once per rebuild.
+# Done per route rather than as middleware so the SSE stream is never buffered.
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def http_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def http_date(ts: float) -> str:
+    return formatdate(ts, usegmt=True)
+
+def _bare_tag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ('-br"', '-gzip"'):
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(_bare_tag(t) == etag for t in header.split(","))
+
+def _not_modified_since(header: Optional[str], last_modified: Optional[str]) -> bool:
+    if not header or not last_modified:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+
+def pick_encoding(accept: Optional[str]) -> Optional[str]:
+    if not accept:
+        return None
+    offered: Dict[str, float] = {}
+    for part in accept.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    star = offered.get("*", 0.0)
+    for enc in (("br",) if brotli is not None else ()) + ("gzip",):
+        if offered.get(enc, star) > 0:
+            return enc
+    return None
+
+class _CompressedCache:
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+    def get(self, etag: str, encoding: str, body: bytes) -> bytes:
+        key = (etag, encoding)
+        data = self._entries.get(key)
+        if data is None:
+            if encoding == "br":
+                data = brotli.compress(body, quality=BROTLI_QUALITY)
+            else:
+                data = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            self._entries[key] = data
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return data
+
+_compressed = _CompressedCache()
+
+def cache_control(max_age: int, public: bool = True, stale: Optional[int] = None) -> str:
+    if max_age <= 0:
+        return ("public" if public else "private") + ", no-cache"
+    stale = settings.HTTP_STALE_WHILE_REVALIDATE if stale is None else stale
+    value = f"{'public' if public else 'private'}, max-age={int(max_age)}"
+    return value + (f", stale-while-revalidate={int(stale)}" if stale > 0 else "")
+
+def conditional_response(request: Request, body: bytes, *, etag: Optional[str] = None,
+                         last_modified: Union[float, str, None] = None, max_age: int = 0,
+                         public: bool = True, media_type: str = "application/json") -> Response:
+    etag = etag or http_etag(body)
+    if isinstance(last_modified, (int, float)):
+        last_modified = http_date(min(last_modified, time.time()))
+    encoding = pick_encoding(request.headers.get("accept-encoding")) if len(body) >= settings.COMPRESS_MIN_SIZE else None
+    headers = {
+        "ETag": etag if encoding is None else f'{etag[:-1]}-{encoding}"',
+        "Cache-Control": cache_control(max_age, public),
+        "Vary": "Accept-Encoding",
+    }
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    inm = request.headers.get("if-none-match")
+    if etag_matches(inm, etag) or (inm is None and _not_modified_since(request.headers.get("if-modified-since"),
+                                                                       last_modified)):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        body = _compressed.get(etag, encoding, body)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
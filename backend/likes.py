@@ -0,0 +1,56 @@
+from typing import Dict
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.orm import Session
+
+from .models import Like, LikeCount
+from .trending import record_event
+
+# Likes live in two tables: `likes` holds one row per (user, series) and
+# `like_counts` holds the running total per series. Both are changed in the
+# caller's transaction, so counts never drift from the relation.
+
+def _bump_count(db: Session, key: str, delta: int) -> None:
+    res = db.execute(
+        update(LikeCount).where(LikeCount.series_key == key).values(count=LikeCount.count + delta)
+    )
+    if res.rowcount == 0:
+        db.add(LikeCount(series_key=key, count=max(delta, 0)))
+        db.flush()
+
+def is_liked(db: Session, tg_id: str, key: str) -> bool:
+    row = db.execute(
+        select(Like.id).where(Like.tg_id == str(tg_id), Like.series_key == key)
+    ).first()
+    return row is not None
+
+def set_like(db: Session, tg_id: str, key: str, liked: bool) -> bool:
+    """Make the like state of (tg_id, key) equal to `liked`. Returns True if it changed."""
+    tg_id = str(tg_id)
+    if liked:
+        if is_liked(db, tg_id, key):
+            return False
+        db.add(Like(tg_id=tg_id, series_key=key))
+        db.flush()
+        _bump_count(db, key, 1)
+        record_event(db, "like", tg_id, key)
+        return True
+    res = db.execute(delete(Like).where(Like.tg_id == tg_id, Like.series_key == key))
+    if res.rowcount:
+        _bump_count(db, key, -res.rowcount)
+        record_event(db, "unlike", tg_id, key)
+        return True
+    return False
+
+def toggle_like(db: Session, tg_id: str, key: str) -> bool:
+    liked = not is_liked(db, tg_id, key)
+    set_like(db, tg_id, key, liked)
+    return liked
+
+def like_count(db: Session, key: str) -> int:
+    value = db.execute(select(LikeCount.count).where(LikeCount.series_key == key)).scalar()
+    return int(value or 0)
+
+def count_likes(db: Session) -> Dict[str, int]:
+    rows = db.execute(select(LikeCount.series_key, LikeCount.count).where(LikeCount.count > 0)).all()
+    return {k: int(n) for k, n in rows}
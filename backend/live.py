@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .serialization import dumps
+from .settings import settings
+
+log = logging.getLogger(__name__)
+
+# In-process pub/sub for the live comment stream. One topic per
+# (series_key, chapter_id); api_comments_add publishes each new comment once
+# and the hub copies it into every subscriber's bounded queue. A subscriber
+# whose queue is full (slow client) is dropped and told to resync, so one slow
+# connection never holds back the others or grows memory without bound.
+#
+# With several API workers a comment is published only in the worker that
+# stored it; there each active topic is also polled (one query per topic per
+# COMMENTS_STREAM_POLL seconds, not per subscriber). The poller keeps its own
+# cursor, moved only by what it read from the database: SQLite has one writer
+# at a time, so ids become visible in order there, while local publishes may
+# run ahead of comments another worker committed just before. Items seen both
+# ways are skipped by id (the last RECENT_IDS per topic), not by a high-water
+# mark, so a lower id arriving late is still delivered.
+
+Topic = Tuple[str, str]
+RECENT_IDS = 1024
+FetchAfter = Callable[[Topic, int], Awaitable[List[dict]]]
+
+def sse_event(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {dumps(data)}\n\n".encode("utf-8")
+
+class Subscription:
+    def __init__(self, topic: Topic, maxsize: int):
+        self.topic = topic
+        self.queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+class CommentHub:
+    def __init__(self, queue_size: int = settings.COMMENTS_STREAM_QUEUE, poll_interval: Optional[float] = None):
+        self.queue_size = queue_size
+        if poll_interval is None:
+            poll_interval = settings.COMMENTS_STREAM_POLL
+        if poll_interval < 0:  # auto: only needed when other workers add comments
+            poll_interval = 2.0 if settings.API_WORKERS > 1 else 0.0
+        self.poll_interval = poll_interval
+        self.fetch_after: Optional[FetchAfter] = None
+        self._subs: Dict[Topic, Set[Subscription]] = {}
+        self._cursor: Dict[Topic, int] = {}  # poller: everything up to here was read from the DB
+        self._recent: Dict[Topic, Tuple[deque, Set[int]]] = {}  # ids already fanned out
+        self._pollers: Dict[Topic, asyncio.Task] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, topic: Topic) -> Subscription:
+        sub = Subscription(topic, self.queue_size)
+        self._subs.setdefault(topic, set()).add(sub)
+        if self.poll_interval > 0 and self.fetch_after is not None and topic not in self._pollers:
+            self._pollers[topic] = asyncio.create_task(self._poll(topic))
+        return sub
+
+    def seen(self, topic: Topic, last_id: int) -> None:
+        """Start polling `topic` after `last_id`, an id read from the database by its first subscriber.
+
+        Later subscribers must not move the cursor: older subscribers may not
+        have the comments in between yet.
+        """
+        if topic in self._subs:
+            self._cursor.setdefault(topic, last_id)
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subs.get(sub.topic)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subs[sub.topic]
+            self._cursor.pop(sub.topic, None)
+            self._recent.pop(sub.topic, None)
+            task = self._pollers.pop(sub.topic, None)
+            if task is not None:
+                task.cancel()
+
+    def publish(self, topic: Topic, item: dict) -> int:
+        """Fan an item out to the topic's subscribers; returns how many got it."""
+        subs = self._subs.get(topic)
+        if not subs:
+            return 0
+        order, ids = self._recent.setdefault(topic, (deque(), set()))
+        if item["id"] in ids:
+            return 0
+        ids.add(item["id"])
+        order.append(item["id"])
+        if len(order) > RECENT_IDS:
+            ids.discard(order.popleft())
+        self.published += 1
+        delivered = 0
+        for sub in list(subs):
+            try:
+                sub.queue.put_nowait(item)
+                delivered += 1
+            except asyncio.QueueFull:
+                # drop the slow subscriber; its stream sends "reset" and ends
+                sub.overflowed = True
+                self.dropped += 1
+                self.unsubscribe(sub)
+        return delivered
+
+    async def _poll(self, topic: Topic) -> None:
+        while topic in self._subs:
+            await asyncio.sleep(self.poll_interval)
+            cursor = self._cursor.get(topic)
+            if cursor is None:
+                continue  # first subscriber has not read its starting point yet
+            try:
+                for item in await self.fetch_after(topic, cursor):
+                    if topic in self._cursor:
+                        self._cursor[topic] = max(self._cursor[topic], item["id"])
+                    self.publish(topic, item)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("comment stream poll failed for %s", topic)
+
+    async def stop(self) -> None:
+        for task in list(self._pollers.values()):
+            task.cancel()
+        self._pollers.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "topics": len(self._subs),
+            "subscribers": sum(len(s) for s in self._subs.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+comment_hub = CommentHub()
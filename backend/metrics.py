@@ -0,0 +1,260 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .settings import settings
+
+log = logging.getLogger(__name__)
+
+# Minimal Prometheus-style metrics, rendered by GET /metrics in the text
+# exposition format. Everything is per process: with API_WORKERS > 1 each
+# worker reports its own numbers. Recording is a dict lookup plus a couple of
+# additions under a lock, cheap enough to leave on.
+#
+# With SLOW_REQUEST_MS > 0, requests slower than that are logged with the time
+# spent per phase (auth, db, sql, upstream); phases are collected in a
+# contextvar that also follows run_db() into the executor threads.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "mangalair_"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = labels
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, v in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List[float]] = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            s[i] += 1
+            s[-1] += value
+
+    def count(self, *labels) -> int:
+        s = self._series.get(labels)
+        return int(sum(s[:-1])) if s else 0
+
+    def samples(self) -> Iterable[str]:
+        for labels, s in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, s):
+                cumulative += n
+                le = _labels(self.labelnames, labels, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{le} {_num(cumulative)}"
+            cumulative += s[len(self.buckets)]
+            le = _labels(self.labelnames, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{le} {_num(cumulative)}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {repr(s[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {_num(cumulative)}"
+
+# ---------- registry ----------
+
+_metrics: List = []
+_collectors: List[Tuple[str, str, Callable[[], Dict[str, float]]]] = []
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+def register_stats(name: str, help: str, fn: Callable[[], Dict[str, float]]) -> None:
+    """Expose a stats() dict of a component as gauge `mangalair_<name>{stat="..."}` at scrape time."""
+    _collectors.append((PREFIX + name, help, fn))
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(m.samples())
+    for name, help, fn in _collectors:
+        try:
+            stats = fn()
+        except Exception:
+            log.exception("metrics collector %s failed", name)
+            continue
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        for stat, v in sorted(stats.items()):
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                lines.append(f'{name}{{stat="{_escape(stat)}"}} {_num(v)}')
+    return "\n".join(lines) + "\n"
+
+REQUESTS = _register(Counter("http_requests_total", "HTTP requests by route template and status.",
+                             ("method", "route", "status")))
+REQUEST_SECONDS = _register(Histogram("http_request_duration_seconds", "HTTP request latency by route template.",
+                                      ("method", "route")))
+IN_FLIGHT = _register(Gauge("http_requests_in_flight", "HTTP requests being served."))
+SQL_SECONDS = _register(Histogram("db_query_duration_seconds", "SQL statement execution time.",
+                                  ("engine", "op", "status")))
+DB_CALL_SECONDS = _register(Histogram("db_call_duration_seconds", "run_db()/run_db_read() wall time incl. queueing.",
+                                      ("pool",)))
+UPSTREAM_SECONDS = _register(Histogram("upstream_request_duration_seconds", "PUBLIC_BASE fetch time per attempt.",
+                                       ("kind", "status")))
+UPSTREAM_RETRIES = _register(Counter("upstream_retries_total", "PUBLIC_BASE fetch retries.", ("kind",)))
+AUTH = _register(Counter("auth_requests_total", "initData checks by outcome.", ("outcome",)))
+RATE_LIMITED = _register(Counter("rate_limit_rejections_total", "Requests rejected by a rate limiter.", ("limiter",)))
+
+# ---------- per-request phases (slow request log) ----------
+
+_phases: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_phases", default=None)
+
+def add_phase(name: str, seconds: float) -> None:
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+@contextmanager
+def phase(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase(name, time.perf_counter() - t0)
+
+# ---------- SQLAlchemy ----------
+
+def _statement_op(statement: str) -> str:
+    op = statement.lstrip()[:6].lower()
+    return op if op in ("select", "insert", "update", "delete") else "other"
+
+def instrument_engine(engine, name: str) -> None:
+    from sqlalchemy import event
+
+    # the start time lives on the execution context, which goes away with the
+    # statement whether it succeeds or fails
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _observe(context, statement: str, status: str) -> None:
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        del context._metrics_started
+        elapsed = time.perf_counter() - started
+        SQL_SECONDS.observe(elapsed, name, _statement_op(statement), status)
+        add_phase("sql", elapsed)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _observe(context, statement, "ok")
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        if exception_context.execution_context is not None and exception_context.statement is not None:
+            _observe(exception_context.execution_context, exception_context.statement, "error")
+
+# ---------- upstream ----------
+
+def upstream_kind(url: str) -> str:
+    path = url.split("?", 1)[0]
+    if path.endswith("/catalog/index.json"):
+        return "catalog"
+    if path.endswith("/meta.json"):
+        return "meta"
+    if path.endswith("/chapters/index.json"):
+        return "chapters"
+    return "other"
+
+# ---------- ASGI middleware ----------
+
+class MetricsMiddleware:
+    """Times every HTTP request under its route template (e.g. /api/series/{sid}-{slug}/meta).
+
+    Event streams are counted but kept out of the latency histogram.
+    """
+
+    def __init__(self, app, slow_ms: float = settings.SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = [500, False]  # status code, is event stream
+        token = _phases.set({}) if self.slow_ms > 0 else None
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                for k, v in message.get("headers") or ():
+                    if k == b"content-type" and v.startswith(b"text/event-stream"):
+                        status[1] = True
+            await send(message)
+
+        IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            REQUESTS.inc(method, template, str(status[0]))
+            if not status[1]:
+                REQUEST_SECONDS.observe(elapsed, method, template)
+            if token is not None:
+                phases = _phases.get()
+                _phases.reset(token)
+                if elapsed * 1000 >= self.slow_ms and not status[1]:
+                    breakdown = " ".join(f"{k}={v * 1000:.1f}ms" for k, v in sorted(phases.items()))
+                    log.warning("slow request %s %s (%s) %d %.1fms %s", method, scope.get("path"), template,
+                                status[0], elapsed * 1000, breakdown)
@@ -0,0 +1,177 @@
+from sqlalchemy import select, delete, func, inspect, text
+from sqlalchemy.orm import Session
+
+from .models import User, Like, LikeCount, Favorite, ReadProgress, Comment, CommentCount, SchemaMigration
+from .accounts import NORMALIZED_KEYS, favorite_key, decode_profile, encode_profile, repair_profile
+from .serialization import dumps, loads
+
+BATCH_SIZE = 500
+
+# Each migration runs once per database and is recorded in `schema_migrations`.
+# Data migrations walk `users` by primary key in batches so memory stays flat
+# regardless of the number of accounts.
+
+def _iter_user_batches(db: Session, batch_size: int = BATCH_SIZE):
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(User).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).scalars().all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+
+def backfill_likes(db: Session) -> None:
+    """Build `likes` / `like_counts` from the likes stored in users.data_json."""
+    for rows in _iter_user_batches(db):
+        tg_ids = [u.tg_id for u in rows]
+        existing = set(db.execute(
+            select(Like.tg_id, Like.series_key).where(Like.tg_id.in_(tg_ids))
+        ).all())
+        for u in rows:
+            try:
+                likes = loads(u.data_json or "{}").get("likes") or {}
+            except Exception:
+                continue
+            if not isinstance(likes, dict):
+                continue
+            for key, value in likes.items():
+                if value and (u.tg_id, key) not in existing:
+                    db.add(Like(tg_id=u.tg_id, series_key=key))
+                    existing.add((u.tg_id, key))
+        db.commit()
+        db.expunge_all()
+    db.execute(delete(LikeCount))
+    for key, n in db.execute(select(Like.series_key, func.count()).group_by(Like.series_key)).all():
+        db.add(LikeCount(series_key=key, count=n))
+    db.commit()
+
+def normalize_accounts(db: Session) -> None:
+    """Move favorites and readProgress out of users.data_json into their own tables.
+
+    Likes were already copied by 0001; here they are only stripped from the blob.
+    Each batch is committed on its own, so an interrupted run simply resumes.
+    """
+    for rows in _iter_user_batches(db):
+        for u in rows:
+            try:
+                data = loads(u.data_json or "{}")
+            except Exception:
+                continue
+            if not isinstance(data, dict) or not any(k in data for k in NORMALIZED_KEYS):
+                continue
+            favorites = data.get("favorites")
+            if isinstance(favorites, list):
+                seen = set()
+                for item in favorites:
+                    key = favorite_key(item)
+                    if key in seen:
+                        continue
+                    db.add(Favorite(tg_id=u.tg_id, series_key=key, position=len(seen),
+                                    item_json=dumps(item)))
+                    seen.add(key)
+            progress = data.get("readProgress")
+            if isinstance(progress, dict):
+                for key, value in progress.items():
+                    db.add(ReadProgress(tg_id=u.tg_id, series_key=str(key),
+                                        value_json=dumps(value)))
+            for k in NORMALIZED_KEYS:
+                data.pop(k, None)
+            u.data_json = dumps(data)
+        db.commit()
+        db.expunge_all()
+
+def repair_profiles(db: Session) -> None:
+    """Drop profile values that fail schemas.Profile (e.g. a non-numeric legacy
+    stats.chaptersRead), so that no stored value makes later writes fail."""
+    for rows in _iter_user_batches(db):
+        for u in rows:
+            profile = decode_profile(u)
+            if repair_profile(profile):
+                u.data_json = encode_profile(profile)
+        db.commit()
+        db.expunge_all()
+
+# covered by the leading columns of ix_comments_thread
+REDUNDANT_COMMENT_INDEXES = ("ix_comments_series_key", "ix_comments_chapter_id")
+
+def drop_redundant_comment_indexes(db: Session) -> None:
+    for name in REDUNDANT_COMMENT_INDEXES:
+        db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    db.commit()
+
+def comments_thread_index(db: Session) -> None:
+    """Add ix_comments_thread to databases created before it was declared, replacing
+    the single-column indexes on series_key and chapter_id."""
+    for index in Comment.__table__.indexes:
+        if index.name == "ix_comments_thread":
+            index.create(bind=db.get_bind(), checkfirst=True)
+    drop_redundant_comment_indexes(db)
+
+def backfill_comment_counts(db: Session) -> None:
+    db.execute(delete(CommentCount))
+    rows = db.execute(
+        select(Comment.series_key, Comment.chapter_id, func.count()).group_by(Comment.series_key, Comment.chapter_id)
+    ).all()
+    for key, ch, n in rows:
+        db.add(CommentCount(series_key=key, chapter_id=ch, count=n))
+    db.commit()
+
+def users_version_column(db: Session) -> None:
+    """Add users.version (optimistic concurrency for /api/me/batch) to older databases."""
+    columns = {c["name"] for c in inspect(db.get_bind()).get_columns("users")}
+    if "version" not in columns:
+        db.execute(text("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+        db.commit()
+
+def favorites_series_index(db: Session) -> None:
+    """Add ix_favorites_series_tg (series -> followers lookup) to older databases."""
+    for index in Favorite.__table__.indexes:
+        if index.name == "ix_favorites_series_tg":
+            index.create(bind=db.get_bind(), checkfirst=True)
+
+# Run in list order. Schema changes that the ORM queries of the data
+# migrations depend on (every select(User) reads users.version) come first.
+MIGRATIONS = [
+    ("0005_users_version_column", users_version_column),
+    ("0001_backfill_likes", backfill_likes),
+    ("0002_normalize_accounts", normalize_accounts),
+    ("0003_comments_thread_index", comments_thread_index),
+    ("0004_backfill_comment_counts", backfill_comment_counts),
+    ("0006_favorites_series_index", favorites_series_index),
+    # databases that ran 0003 before it dropped the single-column indexes
+    ("0007_drop_redundant_comment_indexes", drop_redundant_comment_indexes),
+    ("0008_repair_profiles", repair_profiles),
+]
+
+def run_migrations(db: Session) -> list[str]:
+    done = set(db.execute(select(SchemaMigration.name)).scalars().all())
+    applied = []
+    for name, fn in MIGRATIONS:
+        if name in done:
+            continue
+        fn(db)
+        db.add(SchemaMigration(name=name))
+        db.commit()
+        applied.append(name)
+    return applied
+
+def main(argv=None) -> None:
+    import argparse
+    from .db import init_db, pending_schema
+    ap = argparse.ArgumentParser(description="Create missing tables and apply pending migrations")
+    ap.add_argument("--check", action="store_true", help="only list what is pending; exit status 1 if anything is")
+    args = ap.parse_args(argv)
+    pending = pending_schema()
+    if not pending:
+        print("schema is up to date")
+        return
+    if args.check:
+        print("\n".join(pending))
+        raise SystemExit(1)
+    init_db()
+    print("applied: " + ", ".join(pending))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from .db import Base
 
@@ -11,16 +11,126 @@ class User(Base):
     last_name = Column(String(255), nullable=True)
     photo_url = Column(String(512), nullable=True)
     data_json = Column(Text, nullable=False, default="{}")  # account payload
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped on every account change
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
 class Comment(Base):
     __tablename__ = "comments"
+    # one chapter's thread in display order: equality on the first two columns,
+    # range scan over (created_at, id) for keyset pagination. Its leading
+    # columns also serve lookups by series_key alone, so those two columns
+    # carry no single-column indexes (each one is extra work on every insert).
+    __table_args__ = (Index("ix_comments_thread", "series_key", "chapter_id", "created_at", "id"),)
     id = Column(Integer, primary_key=True)
-    series_key = Column(String(128), index=True, nullable=False)  # "<sid>-<slug>"
-    chapter_id = Column(String(64), index=True, nullable=False)
+    series_key = Column(String(128), nullable=False)  # "<sid>-<slug>"
+    chapter_id = Column(String(64), nullable=False)
     tg_id = Column(String(64), index=True, nullable=False)
     username = Column(String(255), nullable=True)
     text = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Like(Base):
+    __tablename__ = "likes"
+    __table_args__ = (UniqueConstraint("tg_id", "series_key", name="uq_likes_user_series"),)
+    id = Column(Integer, primary_key=True)
+    tg_id = Column(String(64), index=True, nullable=False)
+    series_key = Column(String(128), index=True, nullable=False)  # "<sid>-<slug>"
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LikeCount(Base):
+    __tablename__ = "like_counts"
+    series_key = Column(String(128), primary_key=True)  # "<sid>-<slug>"
+    count = Column(Integer, nullable=False, default=0)
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    name = Column(String(128), primary_key=True)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Favorite(Base):
+    __tablename__ = "favorites"
+    # the second index is the reverse lookup (who follows a series), walked in
+    # tg_id order by the notification dispatcher
+    __table_args__ = (UniqueConstraint("tg_id", "series_key", name="uq_favorites_user_series"),
+                      Index("ix_favorites_series_tg", "series_key", "tg_id"))
+    id = Column(Integer, primary_key=True)
+    tg_id = Column(String(64), index=True, nullable=False)
+    series_key = Column(String(255), index=True, nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    item_json = Column(Text, nullable=False)  # favorite entry as sent by the client
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ReadProgress(Base):
+    __tablename__ = "read_progress"
+    __table_args__ = (UniqueConstraint("tg_id", "series_key", name="uq_read_progress_user_series"),)
+    id = Column(Integer, primary_key=True)
+    tg_id = Column(String(64), index=True, nullable=False)
+    series_key = Column(String(255), nullable=False)
+    value_json = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class CommentCount(Base):
+    __tablename__ = "comment_counts"
+    series_key = Column(String(128), primary_key=True)  # "<sid>-<slug>"
+    chapter_id = Column(String(64), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ActivityEvent(Base):
+    __tablename__ = "activity_events"
+    # feed for backend/trending.py, tailed by id; events older than the longest
+    # window are folded into trending_totals and deleted
+    id = Column(Integer, primary_key=True)
+    series_key = Column(String(255), nullable=False)  # "<sid>-<slug>"
+    kind = Column(String(16), nullable=False)  # like | unlike | read
+    tg_id = Column(String(64), nullable=False)
+    ts = Column(Float, index=True, nullable=False)  # unix time
+
+
+class TrendingTotal(Base):
+    __tablename__ = "trending_totals"
+    # all-time score of the activity events compacted out of activity_events
+    series_key = Column(String(255), primary_key=True)
+    score = Column(Float, nullable=False, default=0.0)
+
+
+class SeriesChapters(Base):
+    __tablename__ = "series_chapters"
+    # last chapters/index.json seen per series, to detect new chapters
+    series_key = Column(String(255), primary_key=True)  # "<sid>-<slug>"
+    chapter_ids_json = Column(Text, nullable=False)  # list of chapter ids
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class NotificationJob(Base):
+    __tablename__ = "notification_jobs"
+    # one "new chapter" broadcast to everyone who favorited the series; the
+    # recipients are not copied, `cursor` is the last tg_id handled
+    id = Column(Integer, primary_key=True)
+    series_key = Column(String(255), nullable=False)
+    chapter_id = Column(String(64), nullable=False)
+    text = Column(Text, nullable=False)
+    status = Column(String(16), index=True, nullable=False, default="pending")  # pending | done
+    cursor = Column(String(64), nullable=False, default="")
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    lease_owner = Column(String(64), nullable=True)  # dispatcher currently sending it
+    lease_until = Column(Float, nullable=True)  # unix time
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+class Lease(Base):
+    __tablename__ = "leases"
+    # named singleton roles shared by all processes (e.g. the notification
+    # dispatcher); whoever holds an unexpired row owns the role
+    name = Column(String(64), primary_key=True)
+    owner = Column(String(64), nullable=False)
+    until = Column(Float, nullable=False)  # unix time
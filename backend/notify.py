@@ -0,0 +1,529 @@
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from sqlalchemy import select, update, delete, or_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .bootstrap import chapter_id, chapter_list
+from .cache import upstream_cache
+from .catalog import catalog_snapshot
+from .db import run_db, run_db_read
+from .models import Favorite, Lease, NotificationJob, SeriesChapters
+from .serialization import dumpb, dumps, loads
+from .settings import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+log = logging.getLogger(__name__)
+
+# "New chapter" messages to everyone who favorited a series.
+#
+# Detection: every chapters/index.json fetched into the upstream cache is
+# compared with the chapter ids last seen for that series (series_chapters).
+# New ids enqueue one notification_jobs row; the compare-and-swap on the
+# stored ids makes sure only one worker enqueues it. Index fetches happen when
+# readers open a series, and, for followed series whose catalog item changed,
+# right after a catalog rebuild.
+#
+# Delivery: exactly one dispatcher sends at a time, across all processes. It
+# holds the "notify-dispatcher" row in `leases`; the polling bot process runs
+# one by default, API workers only with NOTIFY_ENABLED=1 (for webhook / no-bot
+# deployments), and either way the lease elects a single sender, so the
+# NOTIFY_RATE / NOTIFY_CHAT_RATE token buckets of that process are the real
+# limits. A 429 pauses all sends for its retry_after.
+#
+# The dispatcher leases one job at a time and walks its recipients straight
+# from `favorites` (ix_favorites_series_tg) in tg_id order, NOTIFY_BATCH per
+# query. While a batch is in flight a heartbeat renews both leases every
+# NOTIFY_LEASE / 3 seconds, however long a 429 pause or slow sends take, and
+# the cursor is saved each time another NOTIFY_CONCURRENCY recipients in a row
+# are finished (and on shutdown). A dispatcher taking over after a crash resends
+# at most the unsaved tail: in-flight plus under NOTIFY_CONCURRENCY finished.
+# One that lost its lease sends nothing more, not even sends already waiting
+# out a 429 pause or a retry; the new owner picks those up from the cursor.
+
+MAX_ATTEMPTS = 5
+DISPATCHER_LEASE = "notify-dispatcher"
+IN_CHUNK = 500  # series keys per IN (...) query
+
+def _series_key_from_url(url: str) -> Optional[str]:
+    prefix = f"{settings.PUBLIC_BASE}/series/"
+    suffix = "/chapters/index.json"
+    if not (url.startswith(prefix) and url.endswith(suffix)):
+        return None
+    return unquote(url[len(prefix):-len(suffix)]) or None
+
+def _chapters_url(key: str) -> str:
+    sid, _, slug = key.partition("-")
+    return f"{settings.PUBLIC_BASE}/series/{quote(sid, safe='')}-{quote(slug, safe='')}/chapters/index.json"
+
+def message_text(key: str, chapter: dict) -> str:
+    items = catalog_snapshot.index.get(key) or [{}]
+    title = items[0].get("title") or key
+    label = chapter.get("title") or (f"Глава {chapter['number']}" if chapter.get("number") is not None else "")
+    return f"Новая глава «{title}»" + (f": {label}" if label else "")
+
+# ---------- detection ----------
+
+def record_chapters(db: Session, key: str, chapters: List[dict]) -> Optional[int]:
+    """Store the chapter ids of `key`; enqueue a job when new ones appeared. Returns the job id."""
+    ids = [i for i in (chapter_id(c) for c in chapters) if i is not None]
+    raw = dumps(ids)
+    row = db.get(SeriesChapters, key)
+    if row is None:
+        # first sight of this series: nothing to compare with
+        db.add(SeriesChapters(series_key=key, chapter_ids_json=raw))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+        return None
+    if row.chapter_ids_json == raw:
+        return None
+    known = set(loads(row.chapter_ids_json))
+    new = [c for c in chapters if chapter_id(c) is not None and chapter_id(c) not in known]
+    res = db.execute(
+        update(SeriesChapters)
+        .where(SeriesChapters.series_key == key, SeriesChapters.chapter_ids_json == row.chapter_ids_json)
+        .values(chapter_ids_json=raw)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount == 0:
+        db.rollback()  # another worker saw the change first
+        return None
+    job_id = None
+    followed = db.execute(select(Favorite.id).where(Favorite.series_key == key).limit(1)).first() is not None
+    if new and followed:
+        job = NotificationJob(series_key=key, chapter_id=chapter_id(new[-1]), text=message_text(key, new[-1]))
+        db.add(job)
+        db.flush()
+        job_id = job.id
+    db.commit()
+    return job_id
+
+def _to_check(db: Session, keys: List[str], changed: List[str]) -> List[str]:
+    """Followed series among `keys` that changed or have no stored chapter ids yet."""
+    followed: set = set()
+    seen: set = set()
+    # IN (...) in chunks: the catalog can outgrow SQLite's bound parameter limit
+    for start in range(0, len(keys), IN_CHUNK):
+        chunk = keys[start:start + IN_CHUNK]
+        found = list(db.execute(
+            select(Favorite.series_key).where(Favorite.series_key.in_(chunk)).distinct()
+        ).scalars())
+        followed.update(found)
+        if found:
+            seen.update(db.execute(
+                select(SeriesChapters.series_key).where(SeriesChapters.series_key.in_(found))
+            ).scalars())
+    changed_set = set(changed)
+    return sorted(k for k in followed if k in changed_set or k not in seen)
+
+class ChapterWatcher:
+    """Upstream-cache and catalog listeners that feed record_chapters()."""
+
+    def __init__(self):
+        self._fingerprints: Optional[Dict[str, bytes]] = None
+        self._tasks: set = set()
+        self.checks = 0
+        self.jobs = 0
+        self.on_job = None  # called with the job id, e.g. to wake the dispatcher
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def check(self, key: str, value: Any) -> None:
+        chapters = chapter_list(value)
+        if not chapters:
+            return
+        self.checks += 1
+        try:
+            job_id = await run_db(record_chapters, key, chapters)
+        except Exception:
+            log.exception("chapter check failed for %s", key)
+            return
+        if job_id is not None:
+            self.jobs += 1
+            log.info("new chapter in %s: notification job %s", key, job_id)
+            if self.on_job is not None:
+                self.on_job(job_id)
+
+    def on_upstream(self, url: str, entry) -> None:
+        key = _series_key_from_url(url)
+        if key is not None:
+            self._spawn(self.check(key, entry.value))
+
+    def on_catalog(self, snapshot, source_changed: bool) -> None:
+        if not source_changed:
+            return
+        fingerprints = {
+            key: hashlib.blake2b(dumpb({k: v for k, v in items[0].items() if k != "likes"}, sort_keys=True),
+                                 digest_size=16).digest()
+            for key, items in snapshot.index.items() if items
+        }
+        previous, self._fingerprints = self._fingerprints, fingerprints
+        # first build: only series never checked before, so later changes have a baseline
+        changed = [] if previous is None else [k for k, fp in fingerprints.items() if previous.get(k) != fp]
+        self._spawn(self._refetch(list(fingerprints), changed))
+
+    async def _refetch(self, keys: List[str], changed: List[str]) -> None:
+        changed_set = set(changed)
+        for key in await run_db_read(_to_check, keys, changed):
+            url = _chapters_url(key)
+            if key in changed_set:
+                upstream_cache.purge(url)  # the cached copy predates the catalog change
+            try:
+                await upstream_cache.get_entry(url, settings.CACHE_TTL_CHAPTERS)  # on_upstream does the rest
+            except Exception as e:
+                log.warning("chapters index for %s: %r", key, e)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+
+# ---------- delivery ----------
+
+class TokenBucket:
+    """`rate` tokens per second, at most `capacity` banked. reserve() never refuses:
+    it returns how long the caller has to wait for its token."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1.0
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+def _claim_job(db: Session, owner: str, lease: float) -> Optional[Tuple[int, str, str, str]]:
+    now = time.time()
+    free = or_(NotificationJob.lease_until.is_(None), NotificationJob.lease_until < now,
+               NotificationJob.lease_owner == owner)
+    job = db.execute(
+        select(NotificationJob).where(NotificationJob.status == "pending", free).order_by(NotificationJob.id).limit(1)
+    ).scalar_one_or_none()
+    if job is None:
+        return None
+    res = db.execute(
+        update(NotificationJob).where(NotificationJob.id == job.id, free)
+        .values(lease_owner=owner, lease_until=now + lease).execution_options(synchronize_session=False)
+    )
+    if res.rowcount == 0:
+        db.rollback()
+        return None
+    db.commit()
+    return job.id, job.series_key, job.text, job.cursor
+
+def _recipients(db: Session, key: str, after: str, limit: int) -> List[str]:
+    return list(db.execute(
+        select(Favorite.tg_id).where(Favorite.series_key == key, Favorite.tg_id > after)
+        .order_by(Favorite.tg_id).limit(limit)
+    ).scalars())
+
+def _hold_lease(db: Session, name: str, owner: str, ttl: float) -> bool:
+    """Take or renew the named lease; False while another owner holds it."""
+    now = time.time()
+    res = db.execute(
+        update(Lease).where(Lease.name == name, or_(Lease.owner == owner, Lease.until < now))
+        .values(owner=owner, until=now + ttl).execution_options(synchronize_session=False)
+    )
+    if res.rowcount == 0:
+        db.add(Lease(name=name, owner=owner, until=now + ttl))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+    db.commit()
+    return True
+
+def _renew(db: Session, job_id: int, owner: str, ttl: float) -> bool:
+    until = time.time() + ttl
+    job = db.execute(
+        update(NotificationJob).where(NotificationJob.id == job_id, NotificationJob.lease_owner == owner)
+        .values(lease_until=until).execution_options(synchronize_session=False)
+    )
+    role = db.execute(
+        update(Lease).where(Lease.name == DISPATCHER_LEASE, Lease.owner == owner)
+        .values(until=until).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return job.rowcount > 0 and role.rowcount > 0
+
+def _advance_job(db: Session, job_id: int, owner: str, cursor: str, sent: int, failed: int,
+                 lease: float, done: bool) -> bool:
+    values: Dict[str, Any] = {"cursor": cursor, "sent": NotificationJob.sent + sent,
+                              "failed": NotificationJob.failed + failed, "lease_until": time.time() + lease}
+    if done:
+        values.update(status="done", lease_owner=None, lease_until=None, finished_at=func.now())
+    res = db.execute(
+        update(NotificationJob).where(NotificationJob.id == job_id, NotificationJob.lease_owner == owner)
+        .values(**values).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return res.rowcount > 0
+
+def _release(db: Session, owner: str) -> None:
+    db.execute(update(NotificationJob).where(NotificationJob.lease_owner == owner)
+               .values(lease_owner=None, lease_until=None).execution_options(synchronize_session=False))
+    db.execute(delete(Lease).where(Lease.name == DISPATCHER_LEASE, Lease.owner == owner))
+    db.commit()
+
+def dispatch_enabled(in_api: bool) -> bool:
+    """Whether this process runs a dispatcher: the bot process unless NOTIFY_ENABLED=0,
+    API workers only with NOTIFY_ENABLED=1."""
+    if not settings.BOT_TOKEN or settings.NOTIFY_ENABLED is False:
+        return False
+    return settings.NOTIFY_ENABLED is True or not in_api
+
+def watch_enabled() -> bool:
+    return bool(settings.BOT_TOKEN) and settings.NOTIFY_ENABLED is not False
+
+class Dispatcher:
+    def __init__(self, rate: float = settings.NOTIFY_RATE, chat_rate: float = settings.NOTIFY_CHAT_RATE,
+                 concurrency: int = settings.NOTIFY_CONCURRENCY, batch: int = settings.NOTIFY_BATCH,
+                 lease: float = settings.NOTIFY_LEASE, poll: float = settings.NOTIFY_POLL_INTERVAL,
+                 max_chats: int = 100000, transport: Optional["httpx.AsyncBaseTransport"] = None):
+        self.owner = uuid.uuid4().hex
+        self.chat_rate = chat_rate
+        self.concurrency = concurrency
+        self.batch = batch
+        self.lease = lease
+        self.poll = poll
+        self.max_chats = max_chats
+        self._global = TokenBucket(rate, max(1.0, rate))
+        self._chats: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._paused_until = 0.0
+        self._transport = transport
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.leader = False  # holds DISPATCHER_LEASE
+        self.stats_counts = {"sent": 0, "failed": 0, "retries": 0, "flood_waits": 0, "jobs_done": 0,
+                             "leases_lost": 0}
+
+    def _url(self) -> str:
+        base = (settings.TELEGRAM_API_BASE or "https://api.telegram.org").rstrip("/")
+        return f"{base}/bot{settings.BOT_TOKEN}/sendMessage"
+
+    def wake(self, *_) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    # ---------- rate limiting ----------
+
+    def _chat_bucket(self, chat: str, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat)
+        if bucket is None:
+            bucket = self._chats[chat] = TokenBucket(self.chat_rate, 1.0)
+            while len(self._chats) > self.max_chats:
+                oldest = next(iter(self._chats))
+                if not self._chats[oldest].idle(now):
+                    break
+                del self._chats[oldest]
+        else:
+            self._chats.move_to_end(chat)
+        return bucket
+
+    async def _slot(self, chat: str) -> None:
+        delay = self._chat_bucket(chat, time.monotonic()).reserve(time.monotonic())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            delay = self._global.reserve(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._paused_until <= time.monotonic():
+                return
+
+    # ---------- sending ----------
+
+    async def _send(self, chat: str, payload: Dict[str, Any], leased: Callable[[], bool]) -> Optional[bool]:
+        """True if delivered, False if Telegram refused it, None if the lease was lost before it went out."""
+        for attempt in range(MAX_ATTEMPTS):
+            await self._slot(chat)
+            # a 429 pause or a retry may outlast the lease; the next owner resends it
+            if not leased():
+                return None
+            try:
+                resp = await self._client.post(self._url(), content=dumpb(dict(payload, chat_id=chat)),
+                                               headers={"Content-Type": "application/json"})
+            except self._http_error as e:
+                log.debug("sendMessage to %s: %r", chat, e)
+                self.stats_counts["retries"] += 1
+                await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt))
+                continue
+            if resp.status_code == 200:
+                return True
+            if resp.status_code == 429:
+                try:
+                    retry_after = float(loads(resp.content).get("parameters", {}).get("retry_after", 1))
+                except Exception:
+                    retry_after = 1.0
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self.stats_counts["flood_waits"] += 1
+                self.stats_counts["retries"] += 1
+                continue
+            if resp.status_code >= 500:
+                self.stats_counts["retries"] += 1
+                await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt))
+                continue
+            return False  # 400/403: chat not found, bot blocked or never started
+        return False
+
+    async def _heartbeat(self, job_id: int) -> None:
+        """Renew the job and dispatcher leases until cancelled; returns when either was lost."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not await run_db(_renew, job_id, self.owner, self.lease):
+                return
+
+    async def _send_batch(self, job_id: int, chats: List[str], payload: Dict[str, Any],
+                          heartbeat: asyncio.Task) -> bool:
+        """Send to `chats`, saving the cursor after every `concurrency` finished in a row. False if the lease was lost."""
+        sem = asyncio.Semaphore(self.concurrency)
+        results: List[Optional[bool]] = [None] * len(chats)
+        done = saved = 0  # chats[:done] finished, chats[:saved] recorded in the job
+        lock = asyncio.Lock()
+        lost = False
+
+        async def save(upto: int) -> None:
+            nonlocal saved, lost
+            async with lock:
+                if upto <= saved or lost:
+                    return
+                part = results[saved:upto]
+                sent = sum(part)
+                if await run_db(_advance_job, job_id, self.owner, chats[upto - 1], sent, len(part) - sent,
+                                self.lease, False):
+                    saved = upto
+                else:
+                    lost = True
+
+        def leased() -> bool:
+            return not lost and not heartbeat.done()
+
+        async def one(i: int, chat: str) -> None:
+            nonlocal done
+            async with sem:
+                if not leased():
+                    return
+                ok = await self._send(chat, payload, leased)
+            if ok is None:
+                return
+            results[i] = ok
+            self.stats_counts["sent" if ok else "failed"] += 1
+            while done < len(results) and results[done] is not None:
+                done += 1
+            if done - saved >= self.concurrency:
+                await save(done)
+
+        try:
+            await asyncio.gather(*(one(i, c) for i, c in enumerate(chats)))
+        except asyncio.CancelledError:
+            await save(done)  # shutting down: keep what was sent
+            raise
+        await save(done)
+        return not lost and not heartbeat.done() and done == len(chats)
+
+    async def run_job(self, job: Tuple[int, str, str, str]) -> bool:
+        """Send one leased job to the end. False if the lease was lost on the way."""
+        job_id, key, text, cursor = job
+        payload = {"text": text, "reply_markup": {"inline_keyboard": [[
+            {"text": "Читать", "web_app": {"url": settings.FRONTEND_URL}}]]}}
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            while True:
+                chats = await run_db_read(_recipients, key, cursor, self.batch)
+                if not chats:
+                    await run_db(_advance_job, job_id, self.owner, cursor, 0, 0, self.lease, True)
+                    self.stats_counts["jobs_done"] += 1
+                    return True
+                if not await self._send_batch(job_id, chats, payload, heartbeat):
+                    log.warning("notification job %s: lease lost", job_id)
+                    self.stats_counts["leases_lost"] += 1
+                    self.leader = False
+                    return False
+                cursor = chats[-1]
+        finally:
+            heartbeat.cancel()
+
+    async def run_once(self) -> bool:
+        """Lease and send the oldest pending job, if any, when this is the elected dispatcher."""
+        self.leader = await run_db(_hold_lease, DISPATCHER_LEASE, self.owner, self.lease)
+        if not self.leader:
+            return False
+        job = await run_db(_claim_job, self.owner, self.lease)
+        if job is None:
+            return False
+        await self.run_job(job)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("notification dispatcher failed")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            import httpx
+            self._http_error = httpx.HTTPError
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(15.0, connect=5.0), transport=self._transport,
+                                             limits=httpx.Limits(max_connections=self.concurrency))
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+            try:
+                await run_db(_release, self.owner)  # let the next process resume right away
+            except Exception:
+                log.exception("releasing notification leases failed")
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.stats_counts, chats_tracked=len(self._chats), leader=int(self.leader))
+
+chapter_watcher = ChapterWatcher()
+dispatcher = Dispatcher()
+chapter_watcher.on_job = dispatcher.wake
@@ -0,0 +1,134 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import RATE_LIMITED
+from .settings import settings
+
+# Token-bucket rate limiting. A bucket is just (tokens, last refill time), so
+# memory per key is constant; idle keys are evicted. The memory backend is
+# per-process, the SQLite backend shares buckets between uvicorn workers; the
+# default ("auto") picks it whenever API_WORKERS > 1.
+
+def _refill(tokens: float, updated: float, now: float, rate: float, capacity: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+class MemoryBackend:
+    def __init__(self, max_keys: int = settings.RATE_LIMIT_MAX_KEYS, idle: float = settings.RATE_LIMIT_IDLE):
+        self.max_keys = max_keys
+        self.idle = idle
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, updated]
+
+    def acquire(self, key: str, rate: float, capacity: float, now: float) -> bool:
+        b = self._buckets.get(key)
+        tokens = capacity if b is None else _refill(b[0], b[1], now, rate, capacity)
+        ok = tokens >= 1.0
+        if ok:
+            tokens -= 1.0
+        if b is None:
+            self._buckets[key] = [tokens, now]
+        else:
+            b[0], b[1] = tokens, now
+            self._buckets.move_to_end(key)
+        # least recently used keys sit at the front
+        while self._buckets:
+            oldest_key, oldest = next(iter(self._buckets.items()))
+            if len(self._buckets) > self.max_keys or now - oldest[1] > self.idle:
+                del self._buckets[oldest_key]
+            else:
+                break
+        return ok
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class SqliteBackend:
+    """Buckets in a small SQLite file shared by all worker processes."""
+
+    blocking = True
+
+    def __init__(self, path: str = settings.RATE_LIMIT_DB, idle: float = settings.RATE_LIMIT_IDLE,
+                 sweep_every: int = 1000):
+        self.path = path
+        self.idle = idle
+        self.sweep_every = sweep_every
+        self._local = threading.local()
+        self._calls = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_buckets_updated ON rate_buckets (updated)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # losing a few buckets on a crash is harmless
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, key: str, rate: float, capacity: float, now: float) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else _refill(row[0], row[1], now, rate, capacity)
+            ok = tokens >= 1.0
+            if ok:
+                tokens -= 1.0
+            conn.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            self._calls += 1
+            if self._calls % self.sweep_every == 0:
+                conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - self.idle,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ok
+
+class RateLimiter:
+    """Allows bursts of `capacity` requests and refills `capacity` tokens per `window` seconds."""
+
+    def __init__(self, capacity: float, window: float, backend=None, name: str = ""):
+        self.capacity = float(capacity)
+        self.rate = float(capacity) / float(window)
+        self._backend = backend
+        self.name = name
+
+    @property
+    def backend(self):
+        return self._backend or default_backend()
+
+    async def allow(self, key: str) -> bool:
+        key = f"{self.name}:{key}" if self.name else key
+        # wall clock, not monotonic: buckets are compared across processes
+        now = time.time()
+        if getattr(self.backend, "blocking", False):
+            ok = await asyncio.to_thread(self.backend.acquire, key, self.rate, self.capacity, now)
+        else:
+            ok = self.backend.acquire(key, self.rate, self.capacity, now)
+        if not ok:
+            RATE_LIMITED.inc(self.name or "default")
+        return ok
+
+_backend = None
+
+def backend_name() -> str:
+    """RATE_LIMIT_BACKEND resolved for this deployment; refuses per-process buckets with several workers."""
+    name = settings.RATE_LIMIT_BACKEND
+    if name == "auto":
+        return "sqlite" if settings.API_WORKERS > 1 else "memory"
+    if name == "memory" and settings.API_WORKERS > 1:
+        raise RuntimeError(f"RATE_LIMIT_BACKEND=memory with API_WORKERS={settings.API_WORKERS} would allow "
+                           f"{settings.API_WORKERS}x every limit; use sqlite (or auto)")
+    return name
+
+def default_backend():
+    global _backend
+    if _backend is None:
+        _backend = SqliteBackend() if backend_name() == "sqlite" else MemoryBackend()
+    return _backend
@@ -0,0 +1,69 @@
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field
+
+# Typed shape of the profile part of an account (what users.data_json holds;
+# likes/favorites/readProgress live in their own tables). Unknown keys are kept.
+# Writes go through Profile.model_validate(...).model_dump_json(), which
+# validates and encodes in pydantic-core without an intermediate json pass.
+
+class Prefs(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    direction: str = "manhwa"
+    continuous: bool = True
+    comments: str = "after"
+
+class Stats(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    chaptersRead: int = 0
+
+class Profile(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    username: Optional[str] = None
+    avatarUrl: Optional[str] = None
+    since: Optional[str] = None
+    stats: Stats = Stats()
+    prefs: Prefs = Prefs()
+
+# ---------- /api/me/batch ----------
+# One account mutation per entry, applied in order in a single transaction.
+# `series` is the "<sid>-<slug>" key used by likes, favorites and readProgress.
+
+class _Op(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+class LikeOp(_Op):
+    op: Literal["like", "unlike"]
+    series: str = Field(min_length=1, max_length=128)
+
+class FavoriteAddOp(_Op):
+    op: Literal["favorite.add"]
+    item: Union[Dict[str, Any], str]
+    position: Optional[int] = Field(default=None, ge=0)
+
+class FavoriteRemoveOp(_Op):
+    op: Literal["favorite.remove"]
+    series: str = Field(min_length=1, max_length=255)
+
+class ProgressSetOp(_Op):
+    op: Literal["progress.set"]
+    series: str = Field(min_length=1, max_length=255)
+    value: Dict[str, Any]
+
+class PrefsPatchOp(_Op):
+    op: Literal["prefs.patch"]
+    prefs: Dict[str, Any]
+
+class StatsPatchOp(_Op):
+    op: Literal["stats.patch"]
+    stats: Stats
+
+BatchOp = Annotated[
+    Union[LikeOp, FavoriteAddOp, FavoriteRemoveOp, ProgressSetOp, PrefsPatchOp, StatsPatchOp],
+    Field(discriminator="op"),
+]
+
+class BatchRequest(BaseModel):
+    ops: List[BatchOp] = Field(max_length=200)
+    # compare-and-swap: apply only if the account is still at this version
+    expected_version: Optional[int] = None
@@ -0,0 +1,292 @@
+import bisect
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .serialization import dumpb
+
+# In-memory search index over the catalog snapshot (see backend/catalog.py),
+# so clients can ask for one page of results instead of downloading and
+# filtering the whole catalog.
+#   - titles are normalized (case, ё/й, diacritics, punctuation) and
+#     transliterated to Latin, so "solo" finds "Соло левелинг" and back;
+#   - a query token matches a title token by prefix (sorted vocabulary +
+#     bisect) or, failing that, by trigram overlap (typos, infixes);
+#   - facets are the short string/bool/list-of-string fields the items have;
+#   - rankings by likes and by title are kept pre-sorted and only re-sorted
+#     when counts or titles change, so sorted pages don't sort the result set.
+# sync() is called after every snapshot rebuild and only re-indexes series
+# whose catalog item changed.
+
+FACET_MAX_VALUES = 200
+TRIGRAM_MIN_OVERLAP = 0.5
+_NOT_FACETS = {"sid", "seriesid", "series_id", "id", "slug", "cover", "poster", "image", "url", "description", "likes"}
+
+_CYR_TO_LAT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "",
+    "э": "e", "ю": "iu", "я": "ia", "і": "i", "ї": "i", "є": "e", "ґ": "g",
+}
+_TRANSLIT = str.maketrans(_CYR_TO_LAT)
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+def normalize(text: str) -> str:
+    """Lowercase Latin-only form: transliterated, without diacritics and punctuation."""
+    text = unicodedata.normalize("NFKD", str(text).casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    # NFKD splits й/ё into и/е + combining mark, which the line above drops
+    return _NON_WORD.sub(" ", text.translate(_TRANSLIT)).strip()
+
+def tokens(text: str) -> List[str]:
+    return normalize(text).split()
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _title_texts(item: dict) -> Iterable[str]:
+    for key, value in item.items():
+        k = key.lower()
+        if "title" in k or k in ("name", "names", "alt", "aliases"):
+            if isinstance(value, str):
+                yield value
+            elif isinstance(value, list):
+                yield from (v for v in value if isinstance(v, str))
+
+def _facet_values(value: Any) -> Optional[List[str]]:
+    if isinstance(value, bool):
+        return [str(value).lower()]
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return value
+    return None
+
+def _fingerprint(item: dict) -> bytes:
+    return hashlib.blake2b(dumpb({k: v for k, v in item.items() if k != "likes"}, sort_keys=True),
+                           digest_size=16).digest()
+
+class _Doc:
+    __slots__ = ("key", "item", "fp", "tokens", "facets", "sort_title")
+
+    def __init__(self, key: str, item: dict, fp: bytes):
+        self.key = key
+        self.item = item
+        self.fp = fp
+        self.tokens: Set[str] = {t for text in _title_texts(item) for t in tokens(text)}
+        self.facets: Dict[str, Set[str]] = {}
+        for field, value in item.items():
+            if field.lower() in _NOT_FACETS or "title" in field.lower():
+                continue
+            values = _facet_values(value)
+            if values:
+                self.facets[field] = {v.strip().lower() for v in values if v.strip()}
+        titles = list(_title_texts(item))
+        self.sort_title = normalize(titles[0]) if titles else key
+
+class SearchIndex:
+    def __init__(self):
+        self.docs: Dict[str, _Doc] = {}
+        self._postings: Dict[str, Set[str]] = {}  # token -> series keys
+        self._vocab: List[str] = []  # sorted tokens, for prefix ranges
+        self._trigrams: Dict[str, Set[str]] = {}  # trigram -> tokens
+        self._facets: Dict[str, Dict[str, Set[str]]] = {}  # field -> value -> series keys
+        self._facet_labels: Dict[str, Dict[str, str]] = {}  # field -> value -> display value
+        self.likes: Dict[str, int] = {}
+        self._by_likes: List[str] = []
+        self._by_title: List[str] = []
+        self._rank: Dict[str, Dict[str, int]] = {"likes": {}, "title": {}}  # series key -> position
+        self.version = 0
+
+    # ---------- maintenance ----------
+
+    def _add_token(self, token: str, key: str) -> None:
+        keys = self._postings.get(token)
+        if keys is None:
+            keys = self._postings[token] = set()
+            bisect.insort(self._vocab, token)
+            for tri in trigrams(token):
+                self._trigrams.setdefault(tri, set()).add(token)
+        keys.add(key)
+
+    def _remove_token(self, token: str, key: str) -> None:
+        keys = self._postings.get(token)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._postings[token]
+            i = bisect.bisect_left(self._vocab, token)
+            if i < len(self._vocab) and self._vocab[i] == token:
+                del self._vocab[i]
+            for tri in trigrams(token):
+                owners = self._trigrams.get(tri)
+                if owners is not None:
+                    owners.discard(token)
+                    if not owners:
+                        del self._trigrams[tri]
+
+    def _add(self, doc: _Doc, item: dict) -> None:
+        self.docs[doc.key] = doc
+        for token in doc.tokens:
+            self._add_token(token, doc.key)
+        for field, values in doc.facets.items():
+            by_value = self._facets.setdefault(field, {})
+            labels = self._facet_labels.setdefault(field, {})
+            raw = _facet_values(item.get(field)) or []
+            for v in raw:
+                labels.setdefault(v.strip().lower(), v.strip())
+            for v in values:
+                by_value.setdefault(v, set()).add(doc.key)
+
+    def _remove(self, key: str) -> None:
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        for token in doc.tokens:
+            self._remove_token(token, key)
+        for field, values in doc.facets.items():
+            by_value = self._facets.get(field, {})
+            for v in values:
+                keys = by_value.get(v)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del by_value[v]
+                        self._facet_labels.get(field, {}).pop(v, None)
+            if not by_value:
+                self._facets.pop(field, None)
+                self._facet_labels.pop(field, None)
+
+    def sync(self, items: Dict[str, dict], counts: Dict[str, int]) -> Tuple[int, int]:
+        """Bring the index to `items` (series key -> catalog item) and like `counts`.
+
+        Returns (re-indexed, removed). Unchanged items are not touched.
+        """
+        changed = removed = 0
+        for key in [k for k in self.docs if k not in items]:
+            self._remove(key)
+            removed += 1
+        for key, item in items.items():
+            fp = _fingerprint(item)
+            doc = self.docs.get(key)
+            if doc is not None and doc.fp == fp:
+                doc.item = item
+                continue
+            if doc is not None:
+                self._remove(key)
+            self._add(_Doc(key, item, fp), item)
+            changed += 1
+        self.update_likes(counts, force=bool(changed or removed))
+        if changed or removed:
+            self._by_title = sorted(self.docs, key=lambda k: (self.docs[k].sort_title, k))
+            self._rank["title"] = {k: i for i, k in enumerate(self._by_title)}
+            self.version += 1
+        return changed, removed
+
+    def update_likes(self, counts: Dict[str, int], force: bool = False) -> None:
+        likes = {key: int(counts.get(key, 0)) for key in self.docs}
+        if force or likes != self.likes:
+            self.likes = likes
+            self._by_likes = sorted(self.docs, key=lambda k: (-likes[k], self.docs[k].sort_title, k))
+            self._rank["likes"] = {k: i for i, k in enumerate(self._by_likes)}
+
+    # ---------- queries ----------
+
+    def _match_token(self, qt: str) -> Dict[str, float]:
+        """Series key -> score for one query token: exact > prefix > trigram."""
+        scores: Dict[str, float] = {}
+        i = bisect.bisect_left(self._vocab, qt)
+        while i < len(self._vocab) and self._vocab[i].startswith(qt):
+            token = self._vocab[i]
+            weight = 3.0 if token == qt else 2.0
+            for key in self._postings[token]:
+                if scores.get(key, 0.0) < weight:
+                    scores[key] = weight
+            i += 1
+        if scores or len(qt) < 3:
+            return scores
+        q_tris = trigrams(qt)
+        shared: Dict[str, int] = {}
+        for tri in q_tris:
+            for token in self._trigrams.get(tri, ()):
+                shared[token] = shared.get(token, 0) + 1
+        for token, n in shared.items():
+            overlap = 2.0 * n / (len(q_tris) + len(trigrams(token)))  # Dice coefficient
+            if overlap >= TRIGRAM_MIN_OVERLAP:
+                for key in self._postings[token]:
+                    scores[key] = max(scores.get(key, 0.0), overlap)
+        return scores
+
+    def facet_fields(self) -> List[str]:
+        return sorted(f for f, values in self._facets.items() if len(values) <= FACET_MAX_VALUES)
+
+    def filterable(self, field: str) -> bool:
+        # every indexed field filters, including ones with too many values to count
+        return field in self._facets
+
+    def search(self, q: str = "", filters: Optional[Dict[str, List[str]]] = None, sort: str = "",
+               offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        scores: Optional[Dict[str, float]] = None
+        for qt in tokens(q):
+            matched = self._match_token(qt)
+            if scores is None:
+                scores = matched
+            else:
+                scores = {k: s + matched[k] for k, s in scores.items() if k in matched}
+            if not scores:
+                break
+        keys: Optional[Set[str]] = None if scores is None else set(scores)
+        for field, wanted in (filters or {}).items():
+            by_value = self._facets.get(field, {})
+            allowed: Set[str] = set()
+            for v in wanted:
+                allowed |= by_value.get(v.strip().lower(), set())
+            keys = allowed if keys is None else keys & allowed
+
+        sort = sort or ("relevance" if scores is not None else "likes")
+        desc = sort.startswith("-")
+        sort = sort.lstrip("-")
+        if sort == "relevance" and scores is not None:
+            ordered = sorted(keys, key=lambda k: (-scores[k], -self.likes.get(k, 0), self.docs[k].sort_title))
+        else:
+            sort = "title" if sort == "title" else "likes"
+            ranking = self._by_title if sort == "title" else self._by_likes
+            if keys is None:
+                ordered = ranking
+            elif len(keys) * 8 < len(ranking):
+                # small result set: order it by the precomputed positions
+                ordered = sorted(keys, key=self._rank[sort].__getitem__)
+            else:
+                ordered = [k for k in ranking if k in keys]
+        if desc:
+            ordered = ordered[::-1]
+        return {
+            "total": len(ordered),
+            "sort": ("-" if desc else "") + sort,
+            "items": [self.docs[k].item for k in ordered[offset:offset + limit]],
+            "facets": self._facet_counts(keys),
+        }
+
+    def _facet_counts(self, keys: Optional[Set[str]]) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = {}
+        for field in self.facet_fields():
+            labels = self._facet_labels.get(field, {})
+            counts = {}
+            for v, members in self._facets[field].items():
+                n = len(members) if keys is None else len(members & keys)
+                if n:
+                    counts[labels.get(v, v)] = n
+            out[field] = counts
+        return out
+
+search_index = SearchIndex()
+
+def sync_from_snapshot(snapshot, source_changed: bool) -> None:
+    """CatalogSnapshot listener: re-index changed items, or only re-rank when just likes moved."""
+    if source_changed or not search_index.docs:
+        search_index.sync({key: items[0] for key, items in snapshot.index.items() if items}, snapshot.counts)
+    else:
+        search_index.update_likes(snapshot.counts)
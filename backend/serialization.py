@@ -0,0 +1,42 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+# One place for JSON encode/decode. orjson is used when installed (several
+# times faster on account blobs and upstream documents); otherwise stdlib json
+# with the same output conventions: UTF-8, no ASCII escaping, compact.
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumpb(obj: Any, sort_keys: bool = False) -> bytes:
+        return orjson.dumps(obj, option=(_OPTS | orjson.OPT_SORT_KEYS) if sort_keys else _OPTS)
+
+    def dumps(obj: Any, sort_keys: bool = False) -> str:
+        return dumpb(obj, sort_keys).decode("utf-8")
+
+    def loads(data: str | bytes) -> Any:
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any, sort_keys: bool = False) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=str)
+
+    def dumpb(obj: Any, sort_keys: bool = False) -> bytes:
+        return dumps(obj, sort_keys).encode("utf-8")
+
+    def loads(data: str | bytes) -> Any:
+        return json.loads(data)
+
+class FastJSONResponse(JSONResponse):
+    """Default response class. Handlers on hot paths return it directly to skip jsonable_encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return dumpb(content)
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 import os
 from dotenv import load_dotenv
 
@@ -14,6 +15,59 @@ class Settings(BaseModel):
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:8000")
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")  # polling | webhook | off
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")  # public https base, e.g. https://api.mangalair.ru
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    TELEGRAM_API_BASE: str = os.getenv("TELEGRAM_API_BASE", "")  # default: https://api.telegram.org
+    API_WORKERS: int = int(os.getenv("API_WORKERS", "1"))
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./data.db")
+    DB_WORKERS: int = int(os.getenv("DB_WORKERS", "4"))  # reader threads/connections
+    DB_WRITERS: int = int(os.getenv("DB_WRITERS", "1"))  # writer threads/connections (SQLite)
+    SQLITE_PROFILE: str = os.getenv("SQLITE_PROFILE", "wal")  # wal | safe | off
+    SQLITE_PRAGMAS: str = os.getenv("SQLITE_PRAGMAS", "")  # overrides, e.g. "cache_size=-128000,mmap_size=0"
+    UPSTREAM_CONNECT_TIMEOUT: float = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+    UPSTREAM_READ_TIMEOUT: float = float(os.getenv("UPSTREAM_READ_TIMEOUT", "15"))
+    UPSTREAM_MAX_CONNECTIONS: int = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+    UPSTREAM_PER_HOST: int = int(os.getenv("UPSTREAM_PER_HOST", "20"))
+    UPSTREAM_RETRIES: int = int(os.getenv("UPSTREAM_RETRIES", "2"))
+    UPSTREAM_BACKOFF: float = float(os.getenv("UPSTREAM_BACKOFF", "0.2"))
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+    CACHE_STALE_TTL: float = float(os.getenv("CACHE_STALE_TTL", "3600"))
+    CACHE_TTL_CATALOG: float = float(os.getenv("CACHE_TTL_CATALOG", "60"))
+    CACHE_TTL_META: float = float(os.getenv("CACHE_TTL_META", "300"))
+    CACHE_TTL_CHAPTERS: float = float(os.getenv("CACHE_TTL_CHAPTERS", "30"))
+    ACCOUNT_CACHE_SIZE: int = int(os.getenv("ACCOUNT_CACHE_SIZE", "10000"))
+    ACCOUNT_CACHE_TTL: float = float(os.getenv("ACCOUNT_CACHE_TTL", "60"))
+    COMMENTS_PAGE_SIZE: int = int(os.getenv("COMMENTS_PAGE_SIZE", "200"))
+    COMMENTS_PAGE_MAX: int = int(os.getenv("COMMENTS_PAGE_MAX", "500"))
+    COMMENTS_STREAM_QUEUE: int = int(os.getenv("COMMENTS_STREAM_QUEUE", "100"))  # per subscriber
+    COMMENTS_STREAM_HEARTBEAT: float = float(os.getenv("COMMENTS_STREAM_HEARTBEAT", "15"))
+    COMMENTS_STREAM_POLL: float = float(os.getenv("COMMENTS_STREAM_POLL", "-1"))  # -1 = auto (on when API_WORKERS > 1)
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "auto")  # auto (sqlite if API_WORKERS > 1) | memory | sqlite
+    RATE_LIMIT_DB: str = os.getenv("RATE_LIMIT_DB", "./ratelimit.db")
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    RATE_LIMIT_IDLE: float = float(os.getenv("RATE_LIMIT_IDLE", "600"))
+    PROGRESS_FLUSH_INTERVAL: float = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "5"))  # 0 = write-through
+    PROGRESS_FLUSH_MAX: int = int(os.getenv("PROGRESS_FLUSH_MAX", "500"))
+    CATALOG_REFRESH_INTERVAL: float = float(os.getenv("CATALOG_REFRESH_INTERVAL", "30"))
+    COMPRESS_MIN_SIZE: int = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))  # bytes; smaller bodies go uncompressed
+    HTTP_STALE_WHILE_REVALIDATE: int = int(os.getenv("HTTP_STALE_WHILE_REVALIDATE", "300"))
+    HTTP_MAX_AGE_LIKES: int = int(os.getenv("HTTP_MAX_AGE_LIKES", "10"))
+    TRENDING_INTERVAL: float = float(os.getenv("TRENDING_INTERVAL", "10"))  # seconds; 0 = no activity events/trending
+    TRENDING_TOP_N: int = int(os.getenv("TRENDING_TOP_N", "100"))
+    # new chapter messages (needs BOT_TOKEN). Unset: detected by the API, sent by the
+    # polling bot process; 1: API workers may send too (one is elected); 0: off
+    NOTIFY_ENABLED: Optional[bool] = {"1": True, "0": False}.get(os.getenv("NOTIFY_ENABLED", ""))
+    NOTIFY_RATE: float = float(os.getenv("NOTIFY_RATE", "25"))  # messages/s overall (Telegram allows ~30)
+    NOTIFY_CHAT_RATE: float = float(os.getenv("NOTIFY_CHAT_RATE", "1"))  # messages/s per chat
+    NOTIFY_CONCURRENCY: int = int(os.getenv("NOTIFY_CONCURRENCY", "16"))
+    NOTIFY_BATCH: int = int(os.getenv("NOTIFY_BATCH", "200"))  # recipients per query
+    NOTIFY_LEASE: float = float(os.getenv("NOTIFY_LEASE", "60"))
+    NOTIFY_POLL_INTERVAL: float = float(os.getenv("NOTIFY_POLL_INTERVAL", "10"))  # look for jobs queued elsewhere
+    DB_AUTO_MIGRATE: bool = os.getenv("DB_AUTO_MIGRATE", "0") == "1"  # startup migrates instead of refusing an old schema
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "1") == "1"
+    SLOW_REQUEST_MS: float = float(os.getenv("SLOW_REQUEST_MS", "0"))  # 0 = slow request log off
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
 
 settings = Settings()
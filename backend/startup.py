@@ -0,0 +1,117 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Cold-start profile of an API worker.
+#
+# The startup hooks in app.py wrap their steps in phase(), so every worker
+# knows how long its own init took (/api/admin/stats "startup_ms", /metrics).
+# `python -m backend.api_runner --startup-report` prints the full picture:
+# import time per module (from `python -X importtime` in a fresh interpreter,
+# so nothing is cached) followed by a real startup/shutdown of the app.
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+_phases: Dict[str, float] = {}
+
+@contextmanager
+def phase(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[name] = _phases.get(name, 0.0) + time.perf_counter() - t0
+
+def stats() -> Dict[str, float]:
+    """Init phases of this process, in milliseconds."""
+    return {name: round(seconds * 1000, 2) for name, seconds in _phases.items()}
+
+# ---------- import time ----------
+
+def _group(name: str) -> str:
+    # backend modules one by one, everything else by top-level package
+    return name if name == "backend" or name.startswith("backend.") else name.split(".", 1)[0]
+
+def parse_importtime(lines: List[str], root: str = "backend") -> Tuple[float, Dict[str, List[float]]]:
+    """Fold `-X importtime` output into {group: [self us, cumulative us]}.
+
+    A group's cumulative time counts each place it was entered from another
+    group, so a package's dependencies imported through it are included.
+    Only imports under the `root` package are considered.
+    """
+    nodes = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header row
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        nodes.append((depth, name.strip(), float(parts[0]), float(parts[1])))
+    # importtime prints children before their parent; reversed it is parent first
+    groups: Dict[str, List[float]] = {}
+    total = 0.0
+    stack: List[str] = []
+    for depth, name, self_us, cum_us in reversed(nodes):
+        del stack[depth:]
+        top = stack[0] if stack else name
+        stack.append(name)
+        if _group(top).split(".", 1)[0] != root:
+            continue
+        if depth == 0:
+            total += cum_us
+        g = _group(name)
+        parent = _group(stack[-2]) if len(stack) > 1 else None
+        entry = groups.setdefault(g, [0.0, 0.0])
+        entry[0] += self_us
+        if g != parent:
+            entry[1] += cum_us
+    return total, groups
+
+def import_report(module: str = "backend.app") -> Tuple[float, Dict[str, List[float]]]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr.splitlines(), module.split(".", 1)[0])
+
+# ---------- init time ----------
+
+async def _init_report() -> List[Tuple[str, float, Optional[str]]]:
+    """(step, ms, error) for importing the app and each of its startup/shutdown hooks."""
+    rows = []
+    t0 = time.perf_counter()
+    from .app import app
+    rows.append(("import backend.app", (time.perf_counter() - t0) * 1000, None))
+    for kind, hooks in (("startup", app.router.on_startup), ("shutdown", app.router.on_shutdown)):
+        for fn in hooks:
+            t0 = time.perf_counter()
+            error = None
+            try:
+                await fn()
+            except Exception as e:
+                error = repr(e)
+            rows.append((f"{kind}: {fn.__name__}", (time.perf_counter() - t0) * 1000, error))
+    return rows
+
+def print_report(top: int = 20, init: bool = True) -> None:
+    total, groups = import_report()
+    print(f"import backend.app: {total / 1000:.1f} ms (cold, -X importtime)")
+    print(f"  {'module':<28} {'self ms':>9} {'cumul ms':>9}")
+    ranked = sorted(groups.items(), key=lambda kv: kv[1][1], reverse=True)
+    for name, (self_us, cum_us) in ranked[:top]:
+        print(f"  {name:<28} {self_us / 1000:>9.1f} {cum_us / 1000:>9.1f}")
+    if not init:
+        return
+    rows = asyncio.run(_init_report())
+    print("init:")
+    for step, ms, error in rows:
+        print(f"  {step:<38} {ms:>9.1f}" + (f"  FAILED {error}" if error else ""))
+    for name, ms in stats().items():
+        print(f"    {name:<36} {ms:>9.1f}")
@@ -0,0 +1,259 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete, func, case, literal, or_, and_, union_all
+from sqlalchemy.orm import Session
+
+from .db import run_db, run_db_read
+from .models import ActivityEvent, TrendingTotal
+from .settings import settings
+
+log = logging.getLogger(__name__)
+
+# Trending series from recent activity. Like toggles and chapter changes in
+# readProgress append a row to `activity_events` (record_event(), in the
+# writer's transaction). Every API worker tails that table by id and keeps,
+# per window, one score per series:
+#   - day / week: only events of the last 24h / 7d count, each weighted by
+#     2^((ts - t0) / half_life) ("forward decay": old scores never need
+#     rescaling, newer events simply weigh more); events leaving the window
+#     are subtracted again, read back from the table by ts range (ids are
+#     assigned at commit, so they need not follow ts);
+#   - all: plain sum of weights.
+# Events older than the longest window (plus COMPACT_MARGIN) are folded into
+# `trending_totals` and deleted once per COMPACT_EVERY, so the table, a
+# worker's startup load and its memory stay bounded by a week of activity.
+# The top TRENDING_TOP_N of each window is recomputed after a tick that
+# changed it, so the work depends on the number of series and new events,
+# never on the number of users. /api/trending is served from memory.
+
+WEIGHTS = {"like": 3.0, "unlike": -3.0, "read": 1.0}
+# name -> (span seconds or None for all-time, half-life seconds or None for no decay)
+WINDOWS = {"day": (86400.0, 6 * 3600.0), "week": (7 * 86400.0, 2 * 86400.0), "all": (None, None)}
+BATCH_SIZE = 5000
+COMPACT_EVERY = 3600.0
+COMPACT_MARGIN = 3600.0  # keeps events a window may still subtract well clear of compaction
+_REBASE_AFTER = 256  # half-lives; keeps 2^x far from float overflow
+
+def record_event(db: Session, kind: str, tg_id: str, series_key: str) -> None:
+    if kind in WEIGHTS and settings.TRENDING_INTERVAL > 0:
+        db.add(ActivityEvent(series_key=series_key, kind=kind, tg_id=str(tg_id), ts=time.time()))
+
+class _Window:
+    def __init__(self, name: str, span: Optional[float], half_life: Optional[float], now: float):
+        self.name = name
+        self.span = span
+        self.half_life = half_life
+        self.t0 = now
+        self.scores: Dict[str, float] = {}  # series key -> score at t0 scale
+        self.start = now - span if span is not None else None  # events before this ts are not counted
+        self.top: List[Tuple[str, float]] = []  # (series key, score now), best first
+        self.dirty = True
+
+    def _weight(self, kind: str, ts: float) -> float:
+        w = WEIGHTS.get(kind, 0.0)
+        return w if self.half_life is None else w * 2.0 ** ((ts - self.t0) / self.half_life)
+
+    def apply(self, key: str, kind: str, ts: float, sign: int = 1) -> None:
+        w = self._weight(kind, ts)
+        s = self.scores.get(key, 0.0) + sign * w
+        if abs(s) < abs(w) * 1e-9:
+            self.scores.pop(key, None)  # back to zero, modulo float noise
+        else:
+            self.scores[key] = s
+        self.dirty = True
+
+    def rebase(self, now: float) -> None:
+        if self.half_life is None or (now - self.t0) / self.half_life < _REBASE_AFTER:
+            return
+        scale = 2.0 ** (-(now - self.t0) / self.half_life)
+        self.scores = {k: v * scale for k, v in self.scores.items()}
+        self.t0 = now
+
+    def rank(self, n: int, now: float) -> None:
+        scale = 1.0 if self.half_life is None else 2.0 ** (-(now - self.t0) / self.half_life)
+        best = heapq.nlargest(n, ((v, k) for k, v in self.scores.items() if v > 0))
+        self.top = [(k, v * scale) for v, k in best]
+        self.dirty = False
+
+def _weight_sql():
+    return case({k: literal(w) for k, w in WEIGHTS.items()}, value=ActivityEvent.kind, else_=literal(0.0))
+
+def _load_all(db: Session) -> Tuple[int, List[Tuple[str, float]]]:
+    """Last event id and all-time score per series: compacted totals plus the events still in the table."""
+    last_id = db.execute(select(func.max(ActivityEvent.id))).scalar() or 0
+    # one statement, so a compaction running meanwhile is seen entirely or not at all
+    parts = union_all(
+        select(TrendingTotal.series_key.label("key"), TrendingTotal.score.label("score")),
+        select(ActivityEvent.series_key.label("key"), _weight_sql().label("score")).where(ActivityEvent.id <= last_id),
+    ).subquery()
+    rows = db.execute(select(parts.c.key, func.sum(parts.c.score)).group_by(parts.c.key)).all()
+    return last_id, [tuple(r) for r in rows]
+
+def _events(db: Session, after: int, limit: int = BATCH_SIZE) -> List[Tuple]:
+    """Events with id > after, in id order (the tail of the feed)."""
+    q = select(ActivityEvent.id, ActivityEvent.series_key, ActivityEvent.kind, ActivityEvent.ts) \
+        .where(ActivityEvent.id > after).order_by(ActivityEvent.id).limit(limit)
+    return [tuple(r) for r in db.execute(q).all()]
+
+def _events_between(db: Session, lo: float, hi: Optional[float], upto: int, after: Tuple[float, int],
+                    limit: int = BATCH_SIZE) -> List[Tuple]:
+    """Events with lo <= ts < hi and id <= upto in (ts, id) order, keyset-paged after `after`."""
+    q = select(ActivityEvent.id, ActivityEvent.series_key, ActivityEvent.kind, ActivityEvent.ts).where(
+        ActivityEvent.ts >= lo, ActivityEvent.id <= upto,
+        or_(ActivityEvent.ts > after[0], and_(ActivityEvent.ts == after[0], ActivityEvent.id > after[1])))
+    if hi is not None:
+        q = q.where(ActivityEvent.ts < hi)
+    return [tuple(r) for r in db.execute(q.order_by(ActivityEvent.ts, ActivityEvent.id).limit(limit)).all()]
+
+def compact(db: Session, before: float, batch: int = BATCH_SIZE) -> int:
+    """Fold events older than `before` into trending_totals and delete them. Returns how many."""
+    removed = 0
+    while True:
+        doomed = select(ActivityEvent.id).where(ActivityEvent.ts < before).limit(batch)
+        # the DELETE comes first so the transaction holds the write lock before reading
+        rows = db.execute(delete(ActivityEvent).where(ActivityEvent.id.in_(doomed))
+                          .returning(ActivityEvent.series_key, ActivityEvent.kind)).all()
+        if not rows:
+            db.rollback()
+            return removed
+        scores: Dict[str, float] = {}
+        for key, kind in rows:
+            scores[key] = scores.get(key, 0.0) + WEIGHTS.get(kind, 0.0)
+        totals = {t.series_key: t for t in db.execute(
+            select(TrendingTotal).where(TrendingTotal.series_key.in_(list(scores)))).scalars()}
+        for key, score in scores.items():
+            if key in totals:
+                totals[key].score += score
+            else:
+                db.add(TrendingTotal(series_key=key, score=score))
+        db.commit()
+        removed += len(rows)
+        if len(rows) < batch:
+            return removed
+
+def _longest_span() -> float:
+    return max(span for span, _ in WINDOWS.values() if span is not None)
+
+class TrendingAggregator:
+    def __init__(self, interval: float = settings.TRENDING_INTERVAL, top_n: int = settings.TRENDING_TOP_N):
+        self.interval = interval
+        self.top_n = top_n
+        self.windows: Dict[str, _Window] = {}
+        self.last_id = 0
+        self.updated_at: Optional[float] = None
+        self.version = 0
+        self.events = 0
+        self.compacted = 0
+        self._compacted_at = 0.0
+        self._loaded = False
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def _load(self, now: float) -> None:
+        self.windows = {name: _Window(name, span, hl, now) for name, (span, hl) in WINDOWS.items()}
+        self.last_id, totals = await run_db_read(_load_all)
+        self.windows["all"].scores = {key: score for key, score in totals if score}
+        for w in self.windows.values():
+            if w.span is None:
+                continue
+            after = (w.start, 0)
+            while True:
+                rows = await run_db_read(_events_between, w.start, None, self.last_id, after)
+                for _, key, kind, ts in rows:
+                    w.apply(key, kind, ts)
+                if len(rows) < BATCH_SIZE:
+                    break
+                after = (rows[-1][3], rows[-1][0])
+        self._loaded = True
+
+    async def _expire(self, w: _Window, now: float) -> None:
+        """Subtract the applied events (id <= last_id) whose ts fell out of the window since the last tick."""
+        cutoff = now - w.span
+        after = (w.start, 0)
+        while True:
+            rows = await run_db_read(_events_between, w.start, cutoff, self.last_id, after)
+            for _, key, kind, ts in rows:
+                w.apply(key, kind, ts, sign=-1)
+            if len(rows) < BATCH_SIZE:
+                break
+            after = (rows[-1][3], rows[-1][0])
+        w.start = cutoff
+
+    async def _compact(self, now: float) -> None:
+        if now - self._compacted_at < COMPACT_EVERY:
+            return
+        self._compacted_at = now
+        try:
+            self.compacted += await run_db(compact, now - _longest_span() - COMPACT_MARGIN)
+        except Exception:
+            log.exception("compacting activity events failed")
+
+    async def refresh(self) -> int:
+        """Apply new events, expire old ones and re-rank changed windows. Returns the number of new events."""
+        async with self._lock:
+            now = time.time()
+            if not self._loaded:
+                await self._load(now)
+            new = 0
+            while True:
+                rows = await run_db_read(_events, self.last_id)
+                for event_id, key, kind, ts in rows:
+                    for w in self.windows.values():
+                        if w.start is None or ts >= w.start:  # else already outside the window
+                            w.apply(key, kind, ts)
+                    self.last_id = event_id
+                new += len(rows)
+                if len(rows) < BATCH_SIZE:
+                    break
+            changed = False
+            for w in self.windows.values():
+                if w.span is not None:
+                    await self._expire(w, now)
+                w.rebase(now)
+                if w.dirty:
+                    w.rank(self.top_n, now)
+                    changed = True
+            await self._compact(now)  # after _expire: it reads the events leaving the windows
+            self.events += new
+            self.updated_at = now
+            if changed:
+                self.version += 1
+            return new
+
+    def top(self, window: str, limit: int) -> List[Tuple[str, float]]:
+        w = self.windows.get(window)
+        return [] if w is None else w.top[:limit]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                log.exception("trending refresh failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"events": self.events, "last_id": self.last_id, "version": self.version,
+                               "compacted": self.compacted}
+        for name, w in self.windows.items():
+            out[f"{name}_series"] = len(w.scores)
+        return out
+
+trending = TrendingAggregator()
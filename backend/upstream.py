@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from urllib.parse import urlsplit
+
+from .settings import settings
+from .metrics import UPSTREAM_RETRIES, UPSTREAM_SECONDS, add_phase, upstream_kind
+from .serialization import loads
+
+if TYPE_CHECKING:
+    import httpx
+
+# Shared async client for the PUBLIC_BASE JSON proxy: keep-alive connection
+# pool, per-host concurrency cap, split connect/read timeouts and a bounded
+# number of retries with jittered exponential backoff. httpx is imported with
+# the first client, not when the API module loads.
+
+RETRY_STATUSES = {502, 503, 504}
+
+DEFAULT_HEADERS = {
+    "Cache-Control": "no-store",
+    "Pragma": "no-cache",
+    "User-Agent": "MangalairMiniApp/1.0",
+}
+
+class UpstreamError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+class UpstreamClient:
+    def __init__(
+        self,
+        connect_timeout: float = settings.UPSTREAM_CONNECT_TIMEOUT,
+        read_timeout: float = settings.UPSTREAM_READ_TIMEOUT,
+        max_connections: int = settings.UPSTREAM_MAX_CONNECTIONS,
+        per_host: int = settings.UPSTREAM_PER_HOST,
+        retries: int = settings.UPSTREAM_RETRIES,
+        backoff: float = settings.UPSTREAM_BACKOFF,
+        transport: Optional["httpx.AsyncBaseTransport"] = None,
+    ):
+        import httpx
+        self._transport_error = httpx.TransportError
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers=DEFAULT_HEADERS,
+            transport=transport,
+        )
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        sem = self._hosts.get(host)
+        if sem is None:
+            sem = self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return sem
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> "httpx.Response":
+        kind = upstream_kind(url)
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    async with self._host_slot(url):
+                        resp = await self._client.get(url, headers=headers)
+                    UPSTREAM_SECONDS.observe(time.perf_counter() - t0, kind, str(resp.status_code))
+                    if resp.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                        return resp
+                except self._transport_error as e:
+                    UPSTREAM_SECONDS.observe(time.perf_counter() - t0, kind, "error")
+                    if attempt >= self.retries:
+                        raise UpstreamError(502, f"Upstream error for {url}: {e!r}")
+                attempt += 1
+                UPSTREAM_RETRIES.inc(kind)
+                await asyncio.sleep(self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+        finally:
+            add_phase("upstream", time.perf_counter() - started)
+
+    async def fetch_json(self, url: str) -> Any:
+        resp = await self.get(url)
+        if resp.status_code >= 400:
+            raise UpstreamError(resp.status_code, f"Upstream HTTP {resp.status_code} for {url}")
+        try:
+            return loads(resp.content)
+        except Exception as e:
+            raise UpstreamError(500, f"Upstream parse error for {url}: {e}")
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+_client: Optional[UpstreamClient] = None
+
+def get_client() -> UpstreamClient:
+    global _client
+    if _client is None:
+        _client = UpstreamClient()
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
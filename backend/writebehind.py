@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .accounts import upsert_progress, decode_profile, encode_profile
+from .db import run_db
+from .models import User
+from .settings import settings
+
+log = logging.getLogger(__name__)
+
+# Write-behind buffer for readProgress and stats. The reader sends them on
+# almost every page turn; instead of one commit per call, updates are merged
+# per user in memory and written in one transaction every
+# PROGRESS_FLUSH_INTERVAL seconds or once PROGRESS_FLUSH_MAX users are pending.
+# Pending values, and those of a flush still in flight, are overlaid on
+# accounts read from the database, and the buffer is flushed on shutdown.
+#
+# The buffer is per process. With API_WORKERS > 1 another worker serves the
+# database value (plus its own account_cache TTL) until this worker flushes,
+# i.e. readProgress/stats can be up to PROGRESS_FLUSH_INTERVAL old there; set
+# PROGRESS_FLUSH_INTERVAL=0 where that matters more than the saved commits.
+
+DEFERRED_KEYS = ("readProgress", "stats")
+
+def _merge(dst: Dict[str, Any], src: Dict[str, Any]) -> None:
+    for key in DEFERRED_KEYS:
+        if key in src:
+            dst.setdefault(key, {}).update(src[key])
+
+def _write_batch(db: Session, batch: Dict[str, Dict[str, Any]]) -> None:
+    stats_for = [tg_id for tg_id, p in batch.items() if p.get("stats")]
+    users = {}
+    if stats_for:
+        users = {u.tg_id: u for u in db.execute(select(User).where(User.tg_id.in_(stats_for))).scalars()}
+    for tg_id, pending in batch.items():
+        if pending.get("readProgress"):
+            upsert_progress(db, tg_id, pending["readProgress"])
+        user = users.get(tg_id)
+        if user is not None:
+            profile = decode_profile(user)
+            stats = profile.get("stats") if isinstance(profile.get("stats"), dict) else {}
+            stats.update(pending["stats"])
+            profile["stats"] = stats
+            try:
+                user.data_json = encode_profile(profile)
+            except ValidationError:
+                log.warning("dropping invalid stats for %s", tg_id)
+    db.commit()
+
+class ProgressBuffer:
+    def __init__(self, interval: float = settings.PROGRESS_FLUSH_INTERVAL, max_pending: int = settings.PROGRESS_FLUSH_MAX):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flushing: Dict[str, Dict[str, Any]] = {}  # batch being written, until its commit
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._lock = asyncio.Lock()
+        self.updates = 0
+        self.flushes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def add(self, tg_id: str, changes: Dict[str, Any]) -> None:
+        self._merge_pending(str(tg_id), changes)
+        self.updates += 1
+        if len(self._pending) >= self.max_pending and self._wake is not None:
+            self._wake.set()
+
+    def _merge_pending(self, tg_id: str, changes: Dict[str, Any]) -> None:
+        _merge(self._pending.setdefault(tg_id, {}), changes)
+
+    def overlay(self, tg_id: str, account: Dict[str, Any]) -> Dict[str, Any]:
+        # in-flight batch first, newer pending values on top
+        for source in (self._flushing, self._pending):
+            pending = source.get(str(tg_id))
+            if not pending:
+                continue
+            for key in DEFERRED_KEYS:
+                if key in pending:
+                    cur = account.get(key)
+                    account[key] = {**(cur if isinstance(cur, dict) else {}), **pending[key]}
+        return account
+
+    def take(self, tg_id: str) -> Dict[str, Any]:
+        """Remove and return one user's pending changes (to be written by the caller)."""
+        return self._pending.pop(str(tg_id), {})
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            # readers that miss account_cache during the write must still see the batch
+            self._flushing = batch
+            try:
+                await run_db(_write_batch, batch)
+            except Exception:
+                # keep the data: newer updates that arrived meanwhile win
+                for tg_id, changes in batch.items():
+                    newer = self._pending.pop(tg_id, {})
+                    self._merge_pending(tg_id, changes)
+                    self._merge_pending(tg_id, newer)
+                raise
+            finally:
+                self._flushing = {}
+            self.flushes += 1
+            return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("progress flush failed, will retry")
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            if settings.API_WORKERS > 1:
+                log.info("readProgress/stats write-behind is per worker: other workers see changes "
+                         "after up to %.0fs", self.interval)
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending_users": len(self._pending), "flushing_users": len(self._flushing),
+                "updates": self.updates, "flushes": self.flushes}
+
+progress_buffer = ProgressBuffer()
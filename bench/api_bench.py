@@ -0,0 +1,228 @@
+"""End-to-end latency/throughput of the API, in-process, against a seeded database.
+
+    python -m bench.api_bench [--users 1000,10000] [--comments 20000] [--concurrency 32]
+                              [--duration 5] [--endpoints me,catalog,...] [--out result.json]
+                              [--baseline previous.json]
+
+For every --users value a child interpreter gets a fresh SQLite file seeded by
+bench.seed and PUBLIC_BASE pointed at bench.fake_cdn, then drives the ASGI app
+through httpx.ASGITransport (startup/shutdown hooks included) with
+`concurrency` clients per endpoint for `duration` seconds. Rate limits are
+lifted unless --rate-limits is given, so write endpoints measure the handler,
+not the 429 path.
+
+Output is one JSON document (p50/p95/p99/max in ms, requests/s and status
+counts per endpoint); --baseline adds the relative change of p95 and rps
+against an earlier result, so releases can be compared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BOT_TOKEN = "123456:bench-token"
+SERIES = 200
+CHAPTERS = 50
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+def _summary(latencies: list, statuses: dict, elapsed: float) -> dict:
+    lat = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)  # noqa: E731
+    return {
+        "requests": len(lat),
+        "rps": round(len(lat) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(_percentile(lat, 0.50)),
+        "p95_ms": ms(_percentile(lat, 0.95)),
+        "p99_ms": ms(_percentile(lat, 0.99)),
+        "max_ms": ms(lat[-1]) if lat else 0.0,
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+def _scenarios(auth_pool: list, threads: list) -> dict:
+    """endpoint name -> fn(rnd) returning (method, path, headers, json body)."""
+    from bench.fake_cdn import series_ref
+
+    def series(rnd):
+        sid, slug = series_ref(rnd.randrange(SERIES))
+        return f"{sid}-{slug}"
+
+    def auth(rnd):
+        return {"X-Telegram-Init-Data": rnd.choice(auth_pool)}
+
+    def thread(rnd):
+        return rnd.choice(threads)
+
+    return {
+        "health": lambda rnd: ("GET", "/health", None, None),
+        "me": lambda rnd: ("GET", "/api/me", auth(rnd), None),
+        "likes_all": lambda rnd: ("GET", "/api/likes/all", None, None),
+        "catalog": lambda rnd: ("GET", "/api/catalog", None, None),
+        "catalog_search": lambda rnd: ("GET", rnd.choice([
+            f"/api/catalog/search?q=серия {rnd.randrange(SERIES)}", "/api/catalog/search?genres=action&sort=likes",
+            f"/api/catalog/search?q=seriia&offset={rnd.randrange(0, SERIES, 20)}"]), None, None),
+        "trending": lambda rnd: ("GET", "/api/trending?window=" + rnd.choice(["day", "week", "all"]), None, None),
+        "series_meta": lambda rnd: ("GET", f"/api/series/{series(rnd)}/meta", None, None),
+        "series_bootstrap": lambda rnd: ("GET", f"/api/series/{series(rnd)}/bootstrap", auth(rnd), None),
+        "chapters_index": lambda rnd: ("GET", f"/api/series/{series(rnd)}/chapters-index", None, None),
+        "comments_list": lambda rnd: ("GET", "/api/comments/{}/{}".format(*thread(rnd)), None, None),
+        "comments_counts": lambda rnd: ("GET", f"/api/comments/{series(rnd)}/counts", None, None),
+        "me_update": lambda rnd: ("POST", "/api/me/update", auth(rnd), {
+            "readProgress": {series(rnd): {"chapterId": f"ch_{rnd.randrange(1, CHAPTERS)}", "page": rnd.randrange(30)}},
+        }),
+        "like_toggle": lambda rnd: ("POST", f"/api/likes/{series(rnd)}/toggle", auth(rnd), None),
+        "comment_add": lambda rnd: ("POST", "/api/comments/{}/{}/add".format(*thread(rnd)), auth(rnd),
+                                    {"text": "bench comment"}),
+    }
+
+ENDPOINTS = ["health", "me", "likes_all", "catalog", "catalog_search", "trending", "series_meta", "chapters_index",
+             "series_bootstrap", "comments_list",
+             "comments_counts", "me_update", "like_toggle", "comment_add"]
+
+async def _drive(client, make, concurrency: int, duration: float, seed: int) -> dict:
+    latencies, statuses = [], {}
+
+    async def worker(n):
+        rnd = random.Random(seed * 1000 + n)
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            method, path, headers, body = make(rnd)
+            t0 = time.perf_counter()
+            resp = await client.request(method, path, headers=headers, json=body)
+            latencies.append(time.perf_counter() - t0)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return _summary(latencies, statuses, time.perf_counter() - started)
+
+def _child(args) -> dict:
+    # settings are read at import time: environment first, backend afterwards
+    from bench.fake_cdn import FakeCDN
+    cdn = FakeCDN(series=SERIES, chapters=CHAPTERS, latency=args.cdn_latency)
+    os.environ.update({"PUBLIC_BASE": cdn.start(), "BOT_TOKEN": BOT_TOKEN, "BOT_MODE": "off"})
+
+    import httpx
+    from backend.app import app
+    from backend.db import init_db
+    from bench.common import sign_init_data
+    from bench.seed import seed, hot_threads
+
+    init_db()
+    t0 = time.perf_counter()
+    counts = seed(users=args.users, likes=args.likes, comments=args.comments, series=SERIES, chapters=CHAPTERS)
+    seed_seconds = round(time.perf_counter() - t0, 2)
+    if not args.rate_limits:
+        from backend import app as app_module
+        for limiter in (app_module._like_limiter, app_module._comment_limiter):
+            limiter.capacity = limiter.rate = 1e9
+
+    auth_pool = [sign_init_data({"id": i, "username": f"user{i}"}, BOT_TOKEN)
+                 for i in range(min(args.users, 1000))]
+    scenarios = _scenarios(auth_pool, hot_threads(50, SERIES, CHAPTERS))
+    selected = [e for e in args.endpoints.split(",") if e] or ENDPOINTS
+
+    async def run():
+        await app.router.startup()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                out = {}
+                for name in selected:
+                    make = scenarios[name]
+                    await _drive(client, make, min(4, args.concurrency), 0.2, 0)  # warm caches and pools
+                    out[name] = await _drive(client, make, args.concurrency, args.duration, 1)
+                return out
+        finally:
+            await app.router.shutdown()
+
+    try:
+        endpoints = asyncio.run(run())
+    finally:
+        cdn.stop()
+    return {"seed": dict(counts, seconds=seed_seconds), "cdn_hits": cdn.hits, "endpoints": endpoints}
+
+def _compare(result: dict, baseline: dict) -> dict:
+    """Relative change (%) of p95 and rps per run/endpoint against a previous result."""
+    out = {}
+    for run, data in result["runs"].items():
+        old_run = baseline.get("runs", {}).get(run, {}).get("endpoints", {})
+        for name, cur in data["endpoints"].items():
+            old = old_run.get(name)
+            if not old:
+                continue
+            pct = lambda new, prev: round((new - prev) / prev * 100, 1) if prev else None  # noqa: E731
+            out.setdefault(run, {})[name] = {"p95_pct": pct(cur["p95_ms"], old["p95_ms"]),
+                                             "rps_pct": pct(cur["rps"], old["rps"])}
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", default="1000", help="comma separated; one seeded run per value")
+    ap.add_argument("--likes", type=int, default=10, help="likes per user")
+    ap.add_argument("--comments", type=int, default=20000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=5.0, help="seconds per endpoint")
+    ap.add_argument("--endpoints", default="", help="comma separated subset of: " + ",".join(ENDPOINTS))
+    ap.add_argument("--cdn-latency", type=float, default=0.0)
+    ap.add_argument("--rate-limits", action="store_true", help="keep the per-user rate limits")
+    ap.add_argument("--out", default="")
+    ap.add_argument("--baseline", default="")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        args.users = int(args.users)
+        print(json.dumps(_child(args)))
+        return
+
+    runs = {}
+    for users in [int(u) for u in args.users.split(",") if u]:
+        tmp = tempfile.mkdtemp(prefix="mangalair-api-bench-")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", RATE_LIMIT_BACKEND="memory",
+                   API_WORKERS="1")
+        cmd = [sys.executable, "-m", "bench.api_bench", "--child", "--users", str(users),
+               "--likes", str(args.likes), "--comments", str(args.comments),
+               "--concurrency", str(args.concurrency), "--duration", str(args.duration),
+               "--endpoints", args.endpoints, "--cdn-latency", str(args.cdn_latency)]
+        if args.rate_limits:
+            cmd.append("--rate-limits")
+        out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True)
+        runs[f"users={users}"] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    from backend.serialization import BACKEND
+    result = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "git": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip(),
+            "json": BACKEND,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "comments": args.comments,
+            "likes_per_user": args.likes,
+            "rate_limits": args.rate_limits,
+        },
+        "runs": runs,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            result["vs_baseline"] = _compare(result, json.load(f))
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Per-request cost of initData verification.
+
+    python -m bench.auth_bench [--n 20000]
+
+"cold" clears the verified-initData cache and the secret cache before every
+call (the old behaviour: derive secrets, parse, HMAC); "warm" replays the same
+header as a session does and is served from the cache.
+"""
+import argparse
+import json
+import timeit
+
+from backend import auth
+from bench.common import sign_init_data
+
+TOKEN = "123456:bench-token"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    args = ap.parse_args()
+
+    raw = sign_init_data({"id": 42, "first_name": "Bench", "username": "bench"}, TOKEN)
+
+    def cold():
+        auth.clear_verified_cache()
+        auth._secret_webappdata.cache_clear()
+        auth._secret_legacy.cache_clear()
+        auth.parse_and_verify_init_data(raw, TOKEN)
+
+    def warm():
+        auth.parse_and_verify_init_data(raw, TOKEN)
+
+    warm()
+    result = {}
+    for name, fn in (("cold", cold), ("warm", warm)):
+        total = min(timeit.repeat(fn, number=args.n, repeat=3))
+        result[name] = {"us_per_call": round(total / args.n * 1e6, 3)}
+    result["speedup"] = round(result["cold"]["us_per_call"] / result["warm"]["us_per_call"], 1)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
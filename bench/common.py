@@ -0,0 +1,17 @@
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+def sign_init_data(user: dict, bot_token: str, auth_date: int | None = None) -> str:
+    """Build a Telegram WebApp initData string signed the way the client receives it."""
+    pairs = {
+        "auth_date": str(auth_date or int(time.time())),
+        "query_id": f"AAH{user['id']}",
+        "user": json.dumps(user, ensure_ascii=False, separators=(",", ":")),
+    }
+    dcs = "\n".join(f"{k}={v}" for k, v in sorted(pairs.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
+    pairs["hash"] = hmac.new(secret, dcs.encode("utf-8"), hashlib.sha256).hexdigest()
+    return urlencode(pairs)
@@ -0,0 +1,96 @@
+"""SQLite throughput under a mixed read/write load, per pragma profile.
+
+    python -m bench.db_bench [--profiles off,wal] [--seconds 5] [--readers 8] [--writers 2]
+
+Each profile runs in its own interpreter (settings are read at import time)
+against a fresh database file: writers toggle likes and add comments through
+run_db(), readers list comments and like counts through run_db_read().
+Prints one JSON document with ops/s per profile.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+def _worker(seconds: float, readers: int, writers: int, users: int) -> dict:
+    from backend.db import init_db, run_db, run_db_read, shutdown_db
+    from backend.likes import toggle_like, count_likes
+    from backend.comments import bump_comment_count
+    from backend.models import Comment, User
+
+    init_db()
+    from backend.db import SessionLocal
+    db = SessionLocal()
+    db.add_all(User(tg_id=str(i), data_json="{}") for i in range(users))
+    db.add_all(Comment(series_key=f"sr_{i % 20}-s", chapter_id=f"ch_{i % 50}", tg_id=str(i % users), text="seed")
+               for i in range(20000))
+    db.commit()
+    db.close()
+
+    def write(db, tg_id, key):
+        toggle_like(db, tg_id, key)
+        c = Comment(series_key=key, chapter_id="ch_1", tg_id=tg_id, text="x")
+        db.add(c)
+        bump_comment_count(db, key, "ch_1")
+        db.commit()
+
+    def read(db, key):
+        db.execute(
+            Comment.__table__.select().where(Comment.series_key == key, Comment.chapter_id == "ch_1").limit(50)
+        ).all()
+        count_likes(db)
+
+    done = {"read": 0, "write": 0}
+
+    async def loop(kind):
+        rnd = random.Random()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            key = f"sr_{rnd.randrange(20)}-s"
+            if kind == "write":
+                await run_db(write, str(rnd.randrange(users)), key)
+            else:
+                await run_db_read(read, key)
+            done[kind] += 1
+
+    async def main():
+        await asyncio.gather(*[loop("read") for _ in range(readers)], *[loop("write") for _ in range(writers)])
+
+    asyncio.run(main())
+    shutdown_db()
+    return {k: round(v / seconds, 1) for k, v in done.items()}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profiles", default="off,wal")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(_worker(args.seconds, args.readers, args.writers, args.users)))
+        return
+
+    results = {}
+    for profile in args.profiles.split(","):
+        tmp = tempfile.mkdtemp(prefix="mangalair-bench-")
+        env = dict(os.environ, SQLITE_PROFILE=profile, DATABASE_URL=f"sqlite:///{tmp}/bench.db")
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.db_bench", "--child", "--seconds", str(args.seconds),
+             "--readers", str(args.readers), "--writers", str(args.writers), "--users", str(args.users)],
+            env=env, check=True, capture_output=True, text=True,
+        )
+        results[profile] = json.loads(out.stdout.strip().splitlines()[-1])
+    print(json.dumps({"readers": args.readers, "writers": args.writers, "seconds": args.seconds,
+                      "ops_per_s": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Local stand-in for PUBLIC_BASE (the static CDN with catalog and series JSON).
+
+Serves /catalog/index.json, /series/<sid>-<slug>/meta.json and
+/series/<sid>-<slug>/chapters/index.json for `series` generated series, with
+strong ETags and 304s on If-None-Match like the real CDN. Optional `latency`
+(seconds) is added to every response.
+
+    python -m bench.fake_cdn --port 8082 --series 500
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+GENRES = ["action", "drama", "fantasy", "romance", "comedy", "horror", "isekai", "slice of life"]
+
+def series_ref(i: int) -> tuple[str, str]:
+    return f"sr_{i}", f"series-{i}"
+
+def build_documents(series: int, chapters: int) -> dict[str, bytes]:
+    docs = {}
+    items = []
+    for i in range(series):
+        sid, slug = series_ref(i)
+        item = {"sid": sid, "slug": slug, "title": f"Серия {i}", "cover": f"/covers/{sid}.webp",
+                "genres": [GENRES[i % len(GENRES)], GENRES[(i * 3 + 1) % len(GENRES)]],
+                "status": "ongoing" if i % 3 else "completed", "chapters": chapters}
+        items.append(item)
+        base = f"/series/{sid}-{slug}/"
+        docs[base + "meta.json"] = {**item, "description": "Описание серии " * 20, "authors": [f"author {i % 50}"]}
+        docs[base + "chapters/index.json"] = {"chapters": [
+            {"id": f"ch_{n}", "number": n, "title": f"Глава {n}", "pages": 20 + n % 15} for n in range(1, chapters + 1)
+        ]}
+    docs["/catalog/index.json"] = {"items": items}
+    return {path: json.dumps(doc, ensure_ascii=False).encode("utf-8") for path, doc in docs.items()}
+
+class FakeCDN:
+    def __init__(self, series: int = 200, chapters: int = 50, latency: float = 0.0):
+        self.latency = latency
+        self.docs = build_documents(series, chapters)
+        self.etags = {path: '"' + hashlib.sha1(body).hexdigest() + '"' for path, body in self.docs.items()}
+        self.hits = {"200": 0, "304": 0, "404": 0}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self, port: int = 0) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _reply(self, status: int, body: bytes = b"", etag: str | None = None):
+                with fake._lock:
+                    fake.hits[str(status)] += 1
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                if status == 200:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                path = self.path.split("?", 1)[0]
+                body = fake.docs.get(path)
+                if body is None:
+                    return self._reply(404)
+                etag = fake.etags[path]
+                if self.headers.get("If-None-Match") == etag:
+                    return self._reply(304, etag=etag)
+                self._reply(200, body, etag)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8082)
+    ap.add_argument("--series", type=int, default=200)
+    ap.add_argument("--chapters", type=int, default=50)
+    ap.add_argument("--latency", type=float, default=0.0)
+    args = ap.parse_args()
+    fake = FakeCDN(args.series, args.chapters, args.latency)
+    print(fake.start(args.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
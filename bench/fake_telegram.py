@@ -0,0 +1,110 @@
+"""Minimal stand-in for the Telegram Bot API.
+
+Point the app at it with TELEGRAM_API_BASE=http://127.0.0.1:<port>. Handles
+getMe, setWebhook/deleteWebhook, getUpdates (always empty) and sendMessage,
+records every call, and can answer every `flood_every`-th sendMessage with
+429 retry_after (negative: only once) to exercise flood control.
+
+    python -m bench.fake_telegram --port 8081
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qsl
+
+class FakeTelegram:
+    def __init__(self, flood_every: int = 0, retry_after: int = 1, blocked: set | None = None):
+        self.calls: list[tuple[str, dict]] = []
+        self.sent: list[dict] = []
+        self.sent_at: list[tuple[int, float]] = []  # (chat id, monotonic time) per delivered message
+        self.attempts = 0
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.blocked = blocked or set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def handle(self, method: str, params: dict):
+        with self._lock:
+            self.calls.append((method, params))
+            if method == "getMe":
+                return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+            if method in ("setWebhook", "deleteWebhook", "close", "logOut"):
+                return 200, {"ok": True, "result": True}
+            if method == "getUpdates":
+                return 200, {"ok": True, "result": []}
+            if method == "sendMessage":
+                if params.get("chat_id") is None:  # e.g. a request cut short by a cancelled client
+                    return 400, {"ok": False, "error_code": 400, "description": "Bad Request: chat_id is empty"}
+                chat_id = int(params.get("chat_id"))
+                self.attempts += 1
+                if chat_id in self.blocked:
+                    return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+                if self.flood_every and self.attempts % abs(self.flood_every) == 0 and not params.get("_retried"):
+                    self.flood_every = 0 if self.flood_every < 0 else self.flood_every
+                    return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                 "parameters": {"retry_after": self.retry_after}}
+                msg = {"message_id": len(self.sent) + 1, "date": int(time.time()),
+                       "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+                self.sent.append(msg)
+                self.sent_at.append((chat_id, time.monotonic()))
+                return 200, {"ok": True, "result": msg}
+            return 200, {"ok": True, "result": True}
+
+    def start(self, port: int = 0) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body are separate writes
+
+            def log_message(self, *a):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8") if length else ""
+                ctype = self.headers.get("Content-Type") or ""
+                if "json" in ctype and body:
+                    params = json.loads(body)
+                else:
+                    params = dict(parse_qsl(body))
+                method = self.path.rstrip("/").rsplit("/", 1)[-1]
+                status, payload = fake.handle(method, params)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 256  # the notification bench opens many connections at once
+            daemon_threads = True
+
+        self._server = Server(("127.0.0.1", port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8081)
+    args = ap.parse_args()
+    fake = FakeTelegram()
+    print(fake.start(args.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
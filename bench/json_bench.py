@@ -0,0 +1,83 @@
+"""Encode/decode cost of a realistic account, stdlib json vs the fast path.
+
+    python -m bench.json_bench [--favorites 200] [--progress 500] [--likes 300] [--n 200]
+
+Measures the full /api/me payload (what FastJSONResponse renders), the decoded
+readProgress values as stored per row, and the profile blob written on every
+update: stdlib json.dumps vs backend.serialization vs schemas.Profile
+(validate + encode in one pass).
+"""
+import argparse
+import json
+import timeit
+
+from backend import serialization
+from backend.accounts import encode_profile
+from backend.schemas import Profile
+
+def make_account(favorites: int, progress: int, likes: int) -> dict:
+    return {
+        "username": "bench_reader",
+        "avatarUrl": "https://api.dicebear.com/7.x/thumbs/svg?seed=Bench",
+        "since": "2025-01-01T00:00:00",
+        "stats": {"chaptersRead": 12345, "minutesRead": 67890},
+        "prefs": {"direction": "manhwa", "continuous": True, "comments": "after"},
+        "favorites": [
+            {"sid": f"sr_{i}", "slug": f"series-{i}", "title": f"Серия номер {i}", "cover": f"/covers/{i}.webp",
+             "genres": ["action", "fantasy"], "addedAt": 1700000000 + i}
+            for i in range(favorites)
+        ],
+        "readProgress": {
+            f"sr_{i}-series-{i}": {"chapterId": f"ch_{i % 97}", "page": i % 40, "percent": (i % 100) / 100,
+                                   "updatedAt": 1700000000 + i}
+            for i in range(progress)
+        },
+        "likes": {f"sr_{i}-series-{i}": True for i in range(likes)},
+    }
+
+def per_call(fn, n: int) -> float:
+    return round(min(timeit.repeat(fn, number=n, repeat=3)) / n * 1e6, 2)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--favorites", type=int, default=200)
+    ap.add_argument("--progress", type=int, default=500)
+    ap.add_argument("--likes", type=int, default=300)
+    ap.add_argument("--n", type=int, default=200)
+    args = ap.parse_args()
+
+    account = make_account(args.favorites, args.progress, args.likes)
+    body = json.dumps({"ok": True, "account": account}, ensure_ascii=False)
+    profile = {k: v for k, v in account.items() if k not in ("likes", "favorites", "readProgress")}
+    rows = [serialization.dumps(v) for v in account["readProgress"].values()]
+
+    cases = {
+        "response_encode": {
+            "stdlib": lambda: json.dumps({"ok": True, "account": account}, ensure_ascii=False).encode("utf-8"),
+            "fast": lambda: serialization.dumpb({"ok": True, "account": account}),
+        },
+        "response_decode": {
+            "stdlib": lambda: json.loads(body),
+            "fast": lambda: serialization.loads(body),
+        },
+        "progress_rows_decode": {
+            "stdlib": lambda: [json.loads(r) for r in rows],
+            "fast": lambda: [serialization.loads(r) for r in rows],
+        },
+        "profile_encode": {
+            "stdlib": lambda: json.dumps(profile, ensure_ascii=False),
+            "fast": lambda: serialization.dumps(profile),
+            "pydantic_validated": lambda: Profile.model_validate(profile).model_dump_json(exclude_none=True),
+            "encode_profile": lambda: encode_profile(account),
+        },
+    }
+    result = {"backend": serialization.BACKEND, "response_bytes": len(body.encode("utf-8")), "us_per_call": {}}
+    for name, fns in cases.items():
+        timings = {impl: per_call(fn, args.n) for impl, fn in fns.items()}
+        if timings.get("fast"):
+            timings["speedup"] = round(timings["stdlib"] / timings["fast"], 1)
+        result["us_per_call"][name] = timings
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""New-chapter notification fan-out against bench.fake_telegram.
+
+    python -m bench.notify_bench [--recipients 100000] [--rate 3000] [--chat-rate 1]
+                                 [--restart-after 5] [--blocked 0.01] [--flood-every 0]
+                                 [--dispatchers 1] [--lease 30]
+
+Seeds `recipients` followers of one series into a fresh SQLite file, lets the
+chapter watcher see the chapters index grow by one chapter (which enqueues a
+notification job), then runs the dispatcher against the fake Bot API. With
+--restart-after the dispatcher is stopped after that many seconds and a new one
+(as after a process restart) resumes the job from its saved cursor.
+--dispatchers N runs N dispatchers at once, as N processes would; the lease
+lets only one of them send.
+
+Prints JSON: messages/s, delivered/duplicate/missing chats, blocked, 429s seen,
+the busiest one-second window overall and the shortest gap between two
+messages to the same chat.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+BOT_TOKEN = "123456:bench-token"
+SERIES_KEY = "sr_0-series-0"
+
+def _chapters(n: int) -> dict:
+    return {"chapters": [{"id": f"ch_{i}", "number": i, "title": f"Глава {i}"} for i in range(1, n + 1)]}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--recipients", type=int, default=100000)
+    ap.add_argument("--rate", type=float, default=3000.0, help="global messages/s (Telegram: ~30)")
+    ap.add_argument("--chat-rate", type=float, default=1.0)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--restart-after", type=float, default=0.0, help="seconds; 0 = no restart")
+    ap.add_argument("--blocked", type=float, default=0.0, help="share of recipients that blocked the bot")
+    ap.add_argument("--flood-every", type=int, default=0, help="fake 429 on every N-th sendMessage")
+    ap.add_argument("--dispatchers", type=int, default=1, help="concurrent dispatchers (processes)")
+    ap.add_argument("--lease", type=float, default=30.0)
+    args = ap.parse_args()
+
+    from bench.fake_telegram import FakeTelegram
+    blocked = set(range(1, int(args.recipients * args.blocked) + 1)) if args.blocked else set()
+    fake = FakeTelegram(flood_every=args.flood_every, retry_after=1, blocked=blocked)
+    tmp = tempfile.mkdtemp(prefix="mangalair-notify-bench-")
+    os.environ.update({"DATABASE_URL": f"sqlite:///{tmp}/bench.db", "BOT_TOKEN": BOT_TOKEN,
+                       "TELEGRAM_API_BASE": fake.start(), "PUBLIC_BASE": "http://cdn.invalid"})
+
+    from sqlalchemy import insert, select
+    from backend.db import init_db, SessionLocal, shutdown_db
+    from backend.models import Favorite, NotificationJob
+    from backend.notify import Dispatcher, record_chapters
+
+    init_db()
+    t0 = time.perf_counter()
+    db = SessionLocal()
+    rows = [{"tg_id": str(i), "series_key": SERIES_KEY, "position": 0, "item_json": "{}"}
+            for i in range(1, args.recipients + 1)]
+    for start in range(0, len(rows), 5000):
+        db.execute(insert(Favorite), rows[start:start + 5000])
+    db.commit()
+    record_chapters(db, SERIES_KEY, _chapters(10)["chapters"])  # baseline
+    job_id = record_chapters(db, SERIES_KEY, _chapters(11)["chapters"])
+    db.close()
+    seed_seconds = time.perf_counter() - t0
+
+    def make():
+        return Dispatcher(rate=args.rate, chat_rate=args.chat_rate, concurrency=args.concurrency,
+                          batch=args.batch, lease=args.lease, poll=0.2)
+
+    async def run() -> dict:
+        started = time.perf_counter()
+        runs = [make() for _ in range(max(1, args.dispatchers))]
+        for d in runs:
+            d.start()
+        if args.restart_after > 0:
+            await asyncio.sleep(args.restart_after)
+            leader = next((d for d in runs if d.leader), runs[0])
+            await leader.stop()
+            second = make()
+            second.start()
+            runs.append(second)
+        while True:
+            await asyncio.sleep(0.2)
+            with SessionLocal() as s:
+                status = s.execute(select(NotificationJob.status).where(NotificationJob.id == job_id)).scalar()
+            if status == "done":
+                break
+        elapsed = time.perf_counter() - started
+        for d in runs:
+            await d.stop()
+        return {"seconds": round(elapsed, 2), "dispatchers": [d.stats() for d in runs]}
+
+    result = asyncio.run(run())
+    shutdown_db()
+    fake.stop()
+
+    chats = [c for c, _ in fake.sent_at]
+    unique = set(chats)
+    per_second: dict = {}
+    last_by_chat: dict = {}
+    min_gap = None
+    for chat, ts in fake.sent_at:
+        per_second[int(ts)] = per_second.get(int(ts), 0) + 1
+        if chat in last_by_chat:
+            gap = ts - last_by_chat[chat]
+            min_gap = gap if min_gap is None else min(min_gap, gap)
+        last_by_chat[chat] = ts
+    expected = set(range(1, args.recipients + 1)) - blocked
+    with SessionLocal() as s:
+        job = s.get(NotificationJob, job_id)
+        job_row = {"status": job.status, "sent": job.sent, "failed": job.failed}
+    print(json.dumps({
+        "recipients": args.recipients,
+        "seed_seconds": round(seed_seconds, 2),
+        **result,
+        "messages_per_s": round(len(chats) / result["seconds"], 1) if result["seconds"] else 0.0,
+        "delivered_chats": len(unique),
+        "duplicates": len(chats) - len(unique),
+        "missing": len(expected - unique),
+        "blocked": len(blocked),
+        "flood_429": sum(d["flood_waits"] for d in result["dispatchers"]),
+        "max_per_second": max(per_second.values()) if per_second else 0,
+        "min_same_chat_gap_s": None if min_gap is None else round(min_gap, 3),
+        "job": job_row,
+    }, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
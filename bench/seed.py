@@ -0,0 +1,113 @@
+"""Fill the configured database with synthetic users, likes, favorites, progress and comments.
+
+    DATABASE_URL=sqlite:///./bench.db python -m bench.seed --users 10000 --likes 20 --comments 100000
+
+Deterministic for a given --seed. Series keys match bench.fake_cdn, counters
+(like_counts, comment_counts) are filled consistently with the rows. Comments
+are spread over `--threads` (series, chapter) pairs with a skew, so a few
+threads are large like in production.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from bench.fake_cdn import series_ref
+
+BATCH = 5000
+
+def _series_key(i: int) -> str:
+    sid, slug = series_ref(i)
+    return f"{sid}-{slug}"
+
+def _batched(db, model, rows):
+    for start in range(0, len(rows), BATCH):
+        db.execute(insert(model), rows[start:start + BATCH])
+
+def seed(users: int = 1000, likes: int = 10, favorites: int = 10, progress: int = 20, comments: int = 10000,
+         series: int = 200, chapters: int = 50, threads: int = 500, seed_value: int = 0) -> dict:
+    """Seed an empty, initialised database (init_db() must have run). Returns row counts."""
+    from backend.db import SessionLocal
+    from backend.models import User, Like, LikeCount, Favorite, ReadProgress, Comment, CommentCount
+
+    rnd = random.Random(seed_value)
+    db = SessionLocal()
+    try:
+        _batched(db, User, [
+            {"tg_id": str(i), "username": f"user{i}", "data_json": json.dumps({
+                "username": f"user{i}", "since": "2025-01-01T00:00:00",
+                "stats": {"chaptersRead": rnd.randrange(1000)},
+                "prefs": {"direction": "manhwa", "continuous": True, "comments": "after"},
+            })}
+            for i in range(users)
+        ])
+        like_rows, fav_rows, progress_rows = [], [], []
+        like_totals: dict[str, int] = {}
+        per_user = {"likes": min(likes, series), "favorites": min(favorites, series), "progress": min(progress, series)}
+        for u in range(users):
+            tg_id = str(u)
+            for s in rnd.sample(range(series), per_user["likes"]):
+                key = _series_key(s)
+                like_rows.append({"tg_id": tg_id, "series_key": key})
+                like_totals[key] = like_totals.get(key, 0) + 1
+            for pos, s in enumerate(rnd.sample(range(series), per_user["favorites"])):
+                sid, slug = series_ref(s)
+                fav_rows.append({"tg_id": tg_id, "series_key": f"{sid}-{slug}", "position": pos,
+                                 "item_json": json.dumps({"sid": sid, "slug": slug, "title": f"Серия {s}"},
+                                                         ensure_ascii=False)})
+            for s in rnd.sample(range(series), per_user["progress"]):
+                progress_rows.append({"tg_id": tg_id, "series_key": _series_key(s), "value_json": json.dumps(
+                    {"chapterId": f"ch_{rnd.randrange(1, chapters + 1)}", "page": rnd.randrange(30)})})
+        _batched(db, Like, like_rows)
+        _batched(db, LikeCount, [{"series_key": k, "count": n} for k, n in like_totals.items()])
+        _batched(db, Favorite, fav_rows)
+        _batched(db, ReadProgress, progress_rows)
+
+        # thread t has weight 1/(t+1): a handful of hot threads, a long tail
+        topics = [(_series_key(t % series), f"ch_{t // series % chapters + 1}") for t in range(threads)]
+        weights = [1.0 / (t + 1) for t in range(threads)]
+        start = datetime.now(timezone.utc) - timedelta(days=30)
+        comment_rows, comment_totals = [], {}
+        for n, (key, ch) in enumerate(rnd.choices(topics, weights, k=comments)):
+            tg_id = str(rnd.randrange(max(users, 1)))
+            comment_rows.append({"series_key": key, "chapter_id": ch, "tg_id": tg_id, "username": f"user{tg_id}",
+                                 "text": f"комментарий {n}", "created_at": start + timedelta(seconds=n)})
+            comment_totals[(key, ch)] = comment_totals.get((key, ch), 0) + 1
+        _batched(db, Comment, comment_rows)
+        _batched(db, CommentCount, [{"series_key": k, "chapter_id": ch, "count": c}
+                                    for (k, ch), c in comment_totals.items()])
+        db.commit()
+    finally:
+        db.close()
+    return {"users": users, "likes": len(like_rows), "favorites": len(fav_rows),
+            "read_progress": len(progress_rows), "comments": len(comment_rows)}
+
+def hot_threads(n: int, series: int = 200, chapters: int = 50) -> list[tuple[str, str]]:
+    """The n largest threads produced by seed() with the same series/chapters."""
+    return [(_series_key(t % series), f"ch_{t // series % chapters + 1}") for t in range(n)]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--likes", type=int, default=10, help="likes per user")
+    ap.add_argument("--favorites", type=int, default=10, help="favorites per user")
+    ap.add_argument("--progress", type=int, default=20, help="readProgress entries per user")
+    ap.add_argument("--comments", type=int, default=10000)
+    ap.add_argument("--series", type=int, default=200)
+    ap.add_argument("--chapters", type=int, default=50)
+    ap.add_argument("--threads", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    from backend.db import init_db
+    init_db()
+    t0 = time.perf_counter()
+    counts = seed(args.users, args.likes, args.favorites, args.progress, args.comments,
+                  args.series, args.chapters, args.threads, args.seed)
+    print(json.dumps({"seconds": round(time.perf_counter() - t0, 2), **counts}, indent=2))
+
+if __name__ == "__main__":
+    main()
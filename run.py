@@ -1,10 +1,19 @@
 import asyncio
+import multiprocessing
 import uvicorn
-from backend.app import app
 from backend.settings import settings
-from backend.bot import create_application, run_bot
+
+# Deployment modes:
+#   API_WORKERS=1, BOT_MODE=polling  -> API and bot polling share one process/loop (default)
+#   API_WORKERS=N, BOT_MODE=polling  -> N uvicorn workers + one separate polling process
+#   BOT_MODE=webhook                 -> webhook registered once here, every worker serves
+#                                       updates on WEBHOOK_PATH
+#   BOT_MODE=off                     -> API only (same as python -m backend.api_runner)
+# The schema is created/migrated once before the API starts (backend.api_runner.migrate).
 
 async def main():
+    from backend.app import app
+    from backend.bot import create_application, run_bot
     config = uvicorn.Config(app, host=getattr(settings, "HOST", "0.0.0.0"), port=int(getattr(settings, "PORT", 8000)))
     server = uvicorn.Server(config)
     bot_app = create_application()
@@ -17,8 +26,38 @@ async def main():
 
     await asyncio.gather(serve_api(), serve_bot())
 
+async def register_webhook():
+    from backend.bot import create_application, set_webhook
+    bot_app = create_application(webhook=True)
+    async with bot_app:
+        await set_webhook(bot_app)
+
+def _bot_process():
+    from backend.bot_runner import main as bot_main
+    bot_main([])
+
+def serve_split():
+    from backend.api_runner import serve
+    bot_proc = None
+    if settings.BOT_MODE == "polling":
+        bot_proc = multiprocessing.Process(target=_bot_process, name="mangalair-bot")
+        bot_proc.start()
+    elif settings.BOT_MODE == "webhook":
+        asyncio.run(register_webhook())
+    try:
+        serve(settings.API_WORKERS)
+    finally:
+        if bot_proc is not None and bot_proc.is_alive():
+            bot_proc.terminate()  # SIGTERM: run_polling stops cleanly
+            bot_proc.join(15)
+
 if __name__ == "__main__":
+    from backend.api_runner import migrate
+    migrate()
     try:
-        asyncio.run(main())
+        if settings.BOT_MODE == "polling" and settings.API_WORKERS <= 1:
+            asyncio.run(main())
+        else:
+            serve_split()
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# backend.settings reads the environment at import time, so point it at a
+# throwaway database before any test module imports the backend.
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='mangalair-tests-')}/test.db"
+os.environ.setdefault("BOT_TOKEN", "123456:test-token")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
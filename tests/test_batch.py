@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import app as app_module
+from backend.accounts import account_cache, encode_profile, load_account
+from backend.db import SessionLocal, init_db
+from backend.models import User
+from backend.writebehind import progress_buffer
+
+PROFILE = {"username": "batch", "stats": {"chaptersRead": 1}, "prefs": {"direction": "manhwa"}}
+BAD_PREFS = {"op": "prefs.patch", "prefs": {"direction": 5}}  # fails Profile validation on write
+
+@pytest.fixture
+def batch_user(request):
+    init_db()
+    tg_id = f"batch-{request.node.name}"  # likes/favorites rows are keyed by tg_id: one user per test
+    with SessionLocal() as db:
+        user = User(tg_id=tg_id, data_json=encode_profile(PROFILE))
+        db.add(user)
+        db.commit()
+        account = load_account(db, user)
+    app_module.app.dependency_overrides[app_module.require_user] = lambda: (user, account)
+    try:
+        yield tg_id
+    finally:
+        app_module.app.dependency_overrides.clear()
+        progress_buffer.take(tg_id)
+        account_cache.invalidate(tg_id)
+
+def _stored(tg_id):
+    with SessionLocal() as db:
+        return load_account(db, db.query(User).filter(User.tg_id == tg_id).one())
+
+def test_stale_expected_version_is_a_conflict_with_the_current_account(batch_user):
+    client = TestClient(app_module.app)
+    r = client.post("/api/me/batch", json={"expected_version": 0, "ops": [{"op": "like", "series": "sr_1-a"}]})
+    assert r.status_code == 200 and r.json()["version"] == 1
+    r = client.post("/api/me/batch", json={"expected_version": 0, "ops": [{"op": "like", "series": "sr_2-b"}]})
+    assert r.status_code == 409
+    body = r.json()
+    assert body["version"] == 1
+    assert body["account"]["likes"] == {"sr_1-a": True}
+    assert _stored(batch_user)["likes"] == {"sr_1-a": True}
+
+def test_failing_op_rolls_back_earlier_ops_and_the_version(batch_user):
+    client = TestClient(app_module.app)
+    ops = [{"op": "like", "series": "sr_1-a"},
+           {"op": "favorite.add", "item": {"sid": "sr_1", "slug": "a"}},
+           {"op": "progress.set", "series": "sr_1-a", "value": {"chapterId": "ch_2"}},
+           BAD_PREFS]
+    r = client.post("/api/me/batch", json={"ops": ops})
+    assert r.status_code == 422
+    account = _stored(batch_user)
+    assert account["version"] == 0
+    assert account["likes"] == {} and account["favorites"] == [] and account["readProgress"] == {}
+    assert account["prefs"]["direction"] == "manhwa"
+
+def test_buffered_progress_is_requeued_when_the_batch_fails(batch_user):
+    client = TestClient(app_module.app)
+    buffered = {"readProgress": {"sr_5-e": {"chapterId": "ch_3"}}, "stats": {"chaptersRead": 4}}
+    progress_buffer.add(batch_user, buffered)
+    r = client.post("/api/me/batch", json={"ops": [BAD_PREFS]})
+    assert r.status_code == 422
+    assert progress_buffer.take(batch_user) == buffered
+    assert _stored(batch_user)["readProgress"] == {}
+
+    progress_buffer.add(batch_user, buffered)
+    r = client.post("/api/me/batch", json={"expected_version": 7, "ops": []})
+    assert r.status_code == 409
+    assert progress_buffer.take(batch_user) == buffered
@@ -0,0 +1,39 @@
+import asyncio
+
+import httpx
+
+from backend.cache import UpstreamCache
+from backend.upstream import UpstreamClient
+
+BASE = "https://cdn.test"
+
+def test_purge_discards_only_fetches_under_the_prefix():
+    release = asyncio.Event()
+
+    async def handler(request):
+        await release.wait()
+        return httpx.Response(200, json={"path": request.url.path})
+
+    async def main():
+        client = UpstreamClient(retries=0, transport=httpx.MockTransport(handler))
+        cache = UpstreamCache(client=client)
+        purged_url = f"{BASE}/series/sr_1-a/meta.json"
+        other_url = f"{BASE}/series/sr_2-b/meta.json"
+        catalog_url = f"{BASE}/catalog/index.json"
+        try:
+            fetches = [asyncio.ensure_future(cache.get_json(u, 60)) for u in (purged_url, other_url, catalog_url)]
+            await asyncio.sleep(0.01)
+            cache.purge(f"{BASE}/series/sr_1-a/")
+            release.set()
+            await asyncio.gather(*fetches)
+            assert cache.stats["misses"] == 3
+            # the unrelated fetches were stored, the purged one was not
+            await cache.get_json(other_url, 60)
+            await cache.get_json(catalog_url, 60)
+            assert cache.stats["hits"] == 2
+            await cache.get_json(purged_url, 60)
+            assert cache.stats["misses"] == 4
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
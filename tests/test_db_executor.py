@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+from sqlalchemy import select
+
+from backend.db import init_db, run_db, run_db_read, shutdown_db
+from backend.models import User
+
+def test_event_loop_keeps_running_while_run_db_blocks():
+    init_db()
+    entered = threading.Event()
+    release = threading.Event()
+
+    def blocked_write(db):
+        db.add(User(tg_id="blocked-writer"))
+        db.flush()  # holds the SQLite write lock from here on
+        entered.set()
+        assert release.wait(10)
+        db.commit()
+        return "committed"
+
+    def find(db):
+        return db.execute(select(User.tg_id).where(User.tg_id == "blocked-writer")).scalar_one_or_none()
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        write = asyncio.create_task(run_db(blocked_write))
+        try:
+            while not entered.is_set():
+                await asyncio.sleep(0.005)
+            before = ticks
+            await asyncio.sleep(0.3)
+            assert ticks - before >= 10, "event loop stalled while the write was blocked"
+            assert not write.done()
+            release.set()
+            assert await asyncio.wait_for(write, 10) == "committed"
+            assert await run_db_read(find) == "blocked-writer"
+        finally:
+            release.set()
+            tick_task.cancel()
+
+    try:
+        asyncio.run(main())
+    finally:
+        shutdown_db()
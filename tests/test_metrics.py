@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+
+from backend.metrics import SQL_SECONDS, instrument_engine
+
+def test_failed_statements_are_timed_under_their_own_status():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "test")
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO t (id) VALUES (1)"))
+        for _ in range(3):
+            with pytest.raises(IntegrityError):
+                conn.execute(text("INSERT INTO t (id) VALUES (1)"))
+        conn.execute(text("SELECT id FROM t"))
+        leftovers = dict(conn.info)
+    assert SQL_SECONDS.count("test", "insert", "ok") == 1
+    assert SQL_SECONDS.count("test", "insert", "error") == 3
+    assert SQL_SECONDS.count("test", "select", "ok") == 1
+    assert leftovers == {}  # nothing accumulates on the pooled connection
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from collections import Counter
+
+import pytest
+from sqlalchemy import delete, insert, select, update
+
+from backend import notify
+from backend.db import SessionLocal, init_db, shutdown_db
+from backend.models import Favorite, Lease, NotificationJob, SeriesChapters
+from backend.notify import DISPATCHER_LEASE, Dispatcher, record_chapters
+from backend.settings import settings
+from bench.fake_telegram import FakeTelegram
+
+SERIES = "sr_notify-test"
+RECIPIENTS = 30
+SENT_BEFORE_429 = 12
+
+def _chapters(n):
+    return [{"id": f"ch_{i}", "number": i} for i in range(1, n + 1)]
+
+@pytest.fixture
+def fake(monkeypatch):
+    # the 13th sendMessage gets one 429 with retry_after=2: the lease is taken away during that pause
+    fake = FakeTelegram(flood_every=-(SENT_BEFORE_429 + 1), retry_after=2)
+    monkeypatch.setattr(settings, "TELEGRAM_API_BASE", fake.start())
+    yield fake
+    fake.stop()
+
+def _job(db, job_id):
+    return db.execute(select(NotificationJob).where(NotificationJob.id == job_id)).scalar_one()
+
+async def _until(predicate, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while not await predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+def test_to_check_chunks_large_key_lists(monkeypatch):
+    init_db()
+    monkeypatch.setattr(notify, "IN_CHUNK", 3)
+    keys = [f"sr_chunk{i}-x" for i in range(10)]
+    with SessionLocal() as db:
+        for key in keys[::2]:
+            db.add(Favorite(tg_id="chunk-user", series_key=key, position=0, item_json="{}"))
+        db.add(SeriesChapters(series_key=keys[2], chapter_ids_json="[]"))
+        db.commit()
+        assert notify._to_check(db, keys, []) == sorted([keys[0], keys[4], keys[6], keys[8]])
+        assert notify._to_check(db, keys, [keys[2]]) == sorted(keys[::2])
+
+def test_job_resumes_from_its_cursor_after_the_lease_is_lost(fake):
+    init_db()
+    with SessionLocal() as db:
+        db.execute(insert(Favorite), [{"tg_id": f"{i:04d}", "series_key": SERIES, "position": 0, "item_json": "{}"}
+                                      for i in range(1, RECIPIENTS + 1)])
+        db.commit()
+        record_chapters(db, SERIES, _chapters(3))
+        job_id = record_chapters(db, SERIES, _chapters(4))
+    assert job_id is not None
+
+    def steal(db):
+        # another dispatcher takes both leases, as after this one stalled past NOTIFY_LEASE
+        far = time.time() + 3600
+        db.execute(update(NotificationJob).where(NotificationJob.id == job_id).values(lease_owner="thief", lease_until=far))
+        db.execute(update(Lease).where(Lease.name == DISPATCHER_LEASE).values(owner="thief", until=far))
+        db.commit()
+
+    def give_up(db):
+        db.execute(update(NotificationJob).where(NotificationJob.id == job_id).values(lease_owner=None, lease_until=None))
+        db.execute(delete(Lease).where(Lease.name == DISPATCHER_LEASE))
+        db.commit()
+
+    async def main():
+        # one send at a time: every delivered message is on the saved cursor
+        first = Dispatcher(rate=1000, chat_rate=100, concurrency=1, batch=10, lease=0.6, poll=0.1)
+        first.start()
+
+        async def flooded():
+            return fake.attempts > SENT_BEFORE_429
+        await _until(flooded)
+        await notify.run_db(steal)
+
+        async def lost():
+            return first.stats_counts["leases_lost"] == 1
+        await _until(lost)
+        await first.stop()
+        with SessionLocal() as db:
+            cursor = _job(db, job_id).cursor
+        assert cursor == f"{SENT_BEFORE_429:04d}"
+
+        await notify.run_db(give_up)
+        second = Dispatcher(rate=1000, chat_rate=100, concurrency=4, batch=10, lease=5, poll=0.1)
+        second.start()
+
+        async def finished():
+            with SessionLocal() as db:
+                return _job(db, job_id).status == "done"
+        await _until(finished)
+        await second.stop()
+        return second.stats_counts["sent"]
+
+    try:
+        resent = asyncio.run(main())
+    finally:
+        shutdown_db()
+    delivered = Counter(str(m["chat"]["id"]).zfill(4) for m in fake.sent)
+    assert set(delivered) == {f"{i:04d}" for i in range(1, RECIPIENTS + 1)}
+    assert max(delivered.values()) == 1, "a recipient got the message twice"
+    assert resent == RECIPIENTS - SENT_BEFORE_429
+    with SessionLocal() as db:
+        job = _job(db, job_id)
+        assert job.sent == RECIPIENTS and job.cursor == f"{RECIPIENTS:04d}"
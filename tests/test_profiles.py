@@ -0,0 +1,34 @@
+from backend.accounts import decode_profile, encode_profile, repair_profile
+from backend.db import SessionLocal, init_db
+from backend.migrations import repair_profiles
+from backend.models import User
+from backend.serialization import dumps, loads
+
+LEGACY = {"username": "old", "stats": {"chaptersRead": "lots", "streak": 3},
+          "prefs": {"direction": "rtl", "continuous": "sometimes", "comments": "off"}}
+
+def test_repair_profile_drops_only_invalid_values():
+    profile = loads(dumps(LEGACY))
+    assert repair_profile(profile)
+    assert profile["stats"] == {"streak": 3}
+    assert profile["prefs"] == {"direction": "rtl", "comments": "off"}
+    assert not repair_profile(profile)
+    # a legacy stats that is not even an object falls back to the default
+    profile = {"stats": 12}
+    assert repair_profile(profile) and profile == {}
+
+def test_repaired_profiles_accept_writes():
+    init_db()
+    with SessionLocal() as db:
+        db.add(User(tg_id="legacy-stats", data_json=dumps(LEGACY)))
+        db.add(User(tg_id="valid-stats", data_json=dumps({"stats": {"chaptersRead": 7}})))
+        db.commit()
+        repair_profiles(db)
+        users = {u.tg_id: u for u in db.query(User).filter(User.tg_id.in_(["legacy-stats", "valid-stats"]))}
+    profile = decode_profile(users["legacy-stats"])
+    assert profile["stats"] == {"chaptersRead": 0, "streak": 3}
+    assert profile["prefs"]["direction"] == "rtl"
+    # a prefs-only change no longer trips over the stored stats
+    profile["prefs"] = {"direction": "ltr", "continuous": False, "comments": "after"}
+    assert loads(encode_profile(profile))["prefs"]["direction"] == "ltr"
+    assert decode_profile(users["valid-stats"])["stats"] == {"chaptersRead": 7}
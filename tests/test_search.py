@@ -0,0 +1,41 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import app as app_module
+from backend.search import FACET_MAX_VALUES, SearchIndex
+from backend.settings import settings
+
+ITEMS = {
+    "sr_1-a": {"sid": "sr_1", "slug": "a", "title": "Alpha", "genres": ["action"], "status": "ongoing", "tag": "t1"},
+    "sr_2-b": {"sid": "sr_2", "slug": "b", "title": "Beta", "genres": ["drama"], "status": "completed", "tag": "t2"},
+}
+
+@pytest.fixture
+def client(monkeypatch):
+    index = SearchIndex()
+    items = dict(ITEMS)
+    # enough distinct values to push "tag" over the facet threshold
+    for i in range(FACET_MAX_VALUES + 1):
+        items[f"sr_x{i}-x"] = {"sid": f"sr_x{i}", "slug": "x", "title": f"Extra {i}", "tag": f"x{i}"}
+    index.sync(items, {})
+
+    async def snapshot():
+        return b"", ""
+
+    monkeypatch.setattr(settings, "PUBLIC_BASE", "https://cdn.test")
+    monkeypatch.setattr(app_module, "search_index", index)
+    monkeypatch.setattr(app_module.catalog_snapshot, "get", snapshot)
+    return TestClient(app_module.app)
+
+def _keys(r):
+    assert r.status_code == 200, r.text
+    return [f"{it['sid']}-{it['slug']}" for it in r.json()["items"]]
+
+def test_search_ignores_auth_and_cache_buster_params(client):
+    r = client.get("/api/catalog/search", params={"genres": "action", "initData": "x", "_": "1700000000"})
+    assert _keys(r) == ["sr_1-a"]
+
+def test_search_still_filters_on_fields_over_the_facet_threshold(client):
+    r = client.get("/api/catalog/search", params={"tag": "t2"})
+    assert "tag" not in r.json()["facets"]
+    assert _keys(r) == ["sr_2-b"]
@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.upstream import UpstreamClient, UpstreamError
+
+URL = "https://cdn.test/catalog/index.json"
+
+def _client(handler, retries=2, per_host=4):
+    return UpstreamClient(retries=retries, backoff=0.001, per_host=per_host, transport=httpx.MockTransport(handler))
+
+def _run(client, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+def test_retries_5xx_then_succeeds():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"items": []})
+
+    client = _client(handler, retries=2)
+    assert _run(client, client.fetch_json(URL)) == {"items": []}
+    assert len(calls) == 3
+
+def test_404_is_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(404)
+
+    client = _client(handler, retries=3)
+    with pytest.raises(UpstreamError) as e:
+        _run(client, client.fetch_json(URL))
+    assert e.value.status == 404
+    assert len(calls) == 1
+
+def test_5xx_after_retry_budget_is_an_error():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(502)
+
+    client = _client(handler, retries=2)
+    with pytest.raises(UpstreamError) as e:
+        _run(client, client.fetch_json(URL))
+    assert e.value.status == 502
+    assert len(calls) == 3  # the first try plus two retries
+
+def test_transport_errors_after_retry_budget_become_502():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    client = _client(handler, retries=1)
+    with pytest.raises(UpstreamError) as e:
+        _run(client, client.fetch_json(URL))
+    assert e.value.status == 502
+    assert len(calls) == 2
+
+def test_per_host_concurrency_is_capped():
+    active = peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, json={"ok": True})
+
+    client = _client(handler, per_host=2)
+
+    async def many():
+        await asyncio.gather(*(client.fetch_json(f"{URL}?n={i}") for i in range(8)))
+        # another host has its own slots
+        await client.fetch_json("https://other.test/x.json")
+
+    _run(client, many())
+    assert peak == 2
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from telegram import Update
+
+from backend import app as app_module
+from backend.bot import create_application
+from backend.settings import settings
+
+SECRET = "test-webhook-secret"
+UPDATE = {"update_id": 1001, "message": {"message_id": 5, "date": 1700000000, "text": "/start",
+                                         "chat": {"id": 42, "type": "private"},
+                                         "from": {"id": 42, "is_bot": False, "first_name": "Test"}}}
+
+@pytest.fixture
+def webhook(monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_SECRET", SECRET)
+    # the application is never initialized: the route only feeds its update queue
+    bot_app = create_application(webhook=True)
+    monkeypatch.setattr(app_module.app.state, "bot", bot_app, raising=False)
+    return TestClient(app_module.app), bot_app
+
+def test_webhook_rejects_a_wrong_secret(webhook):
+    client, bot_app = webhook
+    for headers in ({}, {"X-Telegram-Bot-Api-Secret-Token": "guess"}):
+        r = client.post(settings.WEBHOOK_PATH, json=UPDATE, headers=headers)
+        assert r.status_code == 403
+    assert bot_app.update_queue.empty()
+
+def test_webhook_feeds_a_valid_update(webhook):
+    client, bot_app = webhook
+    r = client.post(settings.WEBHOOK_PATH, json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+    assert r.status_code == 200 and r.json() == {"ok": True}
+    update = bot_app.update_queue.get_nowait()
+    assert isinstance(update, Update)
+    assert update.update_id == 1001 and update.message.text == "/start"
+
+def test_webhook_mode_refuses_to_start_without_a_secret(monkeypatch):
+    monkeypatch.setattr(settings, "BOT_MODE", "webhook")
+    monkeypatch.setattr(settings, "WEBHOOK_SECRET", "")
+    with pytest.raises(RuntimeError, match="WEBHOOK_SECRET"):
+        asyncio.run(app_module.start_bot_webhook())